@@ -0,0 +1,76 @@
+import os, re
+from collections import Counter
+import numpy as np
+import polars as pl
+from ethics_bot.utils.constants import *
+
+# Corpora the suite runs against: the bundled Quran and Gita, or
+# "synth:<rows>" for a seeded synthetic corpus of any size. Synthetic verses
+# sample words from the bundled texts with their real frequencies, so
+# cleaning, VADER, NER and BM25 see a realistic Zipf vocabulary, and carry
+# the bracketed glosses and non-ASCII names clean_text has to strip.
+
+BASE_COLUMNS = ["tradition", "book", "chapter", "verse", "text", "lang", "source"]
+WORD = re.compile(r"[A-Za-z][A-Za-z']*")
+
+def vocabulary():
+    texts = []
+    if os.path.exists(QURAN_PICKTHALL_PATH):
+        with open(QURAN_PICKTHALL_PATH, encoding="utf-8") as f:
+            texts.extend(line.split("|", 2)[-1] for line in f if "|" in line)
+    gita = os.path.join(GITA_DATA, "gita_english_metadata.parquet")
+    if os.path.exists(gita):
+        texts.extend(pl.read_parquet(gita, columns=["text"])["text"].to_list())
+    counts = Counter(w for t in texts for w in WORD.findall(t))
+    words, freq = zip(*counts.most_common())
+    freq = np.array(freq, dtype=np.float64)
+    return np.array(words, dtype=object), freq / freq.sum()
+
+def synthetic(rows, seed=0, min_words=6, max_words=40, chunk=200_000):
+    rng = np.random.default_rng(seed)
+    words, p = vocabulary()
+    glosses = np.array(["[i.e. the believers]", "[of mankind]", "[O Muhammad]", "[in the Hereafter]"], dtype=object)
+    names = np.array(["Dhṛtarāṣṭra", "Kṛṣṇa", "Arjuna", "Ṣāliḥ", "Mūsā"], dtype=object)
+    frames = []
+    for lo in range(0, rows, chunk):
+        n = min(chunk, rows - lo)
+        # Fixed-width word grid, padded with "" past each verse's length
+        lengths = rng.integers(min_words, max_words + 1, size=n)
+        grid = words[rng.choice(len(words), size=(n, max_words), p=p)]
+        grid[np.arange(max_words) >= lengths[:, None]] = ""
+        extra = rng.random((n, 2))
+        grid[extra[:, 0] < 0.05, 0] = names[rng.integers(len(names), size=int((extra[:, 0] < 0.05).sum()))]
+        grid[extra[:, 1] < 0.10, min_words - 1] = glosses[rng.integers(len(glosses), size=int((extra[:, 1] < 0.10).sum()))]
+        cols = {f"w{j}": pl.Series(grid[:, j], dtype=pl.String) for j in range(max_words)}
+        ids = np.arange(lo, lo + n)
+        frames.append(pl.DataFrame(cols).select(
+            pl.lit("Synthetic").alias("tradition"),
+            pl.Series("book", ids // 5000 + 1, dtype=pl.Int64),
+            pl.Series("chapter", ids // 50 % 100 + 1, dtype=pl.Int64),
+            pl.Series("verse", ids % 50 + 1, dtype=pl.Int64),
+            pl.concat_str([pl.col(f"w{j}") for j in range(max_words)], separator=" ").str.strip_chars_end().alias("text"),
+            pl.lit("EN").alias("lang"),
+            pl.lit(f"synthetic seed={seed}").alias("source"),
+        ))
+    return pl.concat(frames) if frames else pl.DataFrame(schema={c: pl.String for c in BASE_COLUMNS})
+
+def bundled(name, logger):
+    if name == "quran":
+        from ethics_bot.scripts.process_texts import process_quran
+        return process_quran(logger, QURAN_PICKTHALL_PATH)
+    if name == "gita":
+        # process_gita needs the network, the shipped metadata has the same base columns
+        df = pl.read_parquet(os.path.join(GITA_DATA, "gita_english_metadata.parquet"))
+        return df.select([pl.col(c) for c in BASE_COLUMNS])
+    raise ValueError(f"Unknown corpus {name!r}, expected quran, gita or synth:<rows>")
+
+def load_corpus(name, logger, seed=0):
+    if name.startswith("synth:"):
+        return synthetic(int(name.split(":", 1)[1].replace("_", "")), seed)
+    return bundled(name, logger)
+
+def write_tanzil(df, path):
+    # Same corpus in the Tanzil "surah|ayah|text" layout process_quran reads
+    df.select(pl.format("{}|{}|{}", pl.col("chapter"), pl.col("verse"),
+                        pl.col("text").str.replace_all(r"\s+", " ")).alias("line")) \
+      .write_csv(path, include_header=False, quote_style="never")
@@ -0,0 +1,288 @@
+import argparse, json, os, platform, shutil, subprocess, sys, tempfile, time
+from importlib.metadata import PackageNotFoundError, version
+import numpy as np
+import polars as pl
+from ethics_bot.utils.common import (add_sentiments, build_faiss, clean_text, embed_text, encoder_name, enrichment_NER,
+                                     get_logger, search_faiss)
+from ethics_bot.utils.constants import *
+from ethics_bot.utils.instrument import peak_rss_bytes, span
+from ethics_bot.benchmarks.corpus import load_corpus, write_tanzil
+
+app_name = "benchmark_suite"
+
+# Each benchmark times one public function on one corpus, best of --repeat
+# runs, and records rows/sec. Model-bound stages (NER, embedding) only see
+# the first --model-rows rows; the index is still built at full corpus size
+# from those embeddings plus seeded noise, so build_faiss and search_faiss
+# scale with the corpus. Results land in logs/benchmarks/*.json.
+BENCHMARKS = ["process_quran", "clean_text", "add_sentiments", "enrichment_NER", "embed_text", "build_faiss",
+              "search_faiss"]
+VERSIONED = ["numpy", "polars", "faiss-cpu", "sentence-transformers", "torch", "spacy", "vaderSentiment"]
+
+class Skip(Exception):
+    pass
+
+def book_name(corpus):
+    return "bench_" + corpus.replace(":", "_")
+
+def register(book):
+    # Benchmark corpora live next to the real books so embed_text,
+    # build_faiss and the search engine find them by name
+    BOOK_DATA[book] = DATA_ROOT / book
+    TRADITIONS.setdefault(book, "Synthetic")
+    os.makedirs(BOOK_DATA[book], exist_ok=True)
+
+def environment(args):
+    versions = {}
+    for name in VERSIONED:
+        try:
+            versions[name] = version(name)
+        except PackageNotFoundError:
+            versions[name] = None
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                                text=True).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {"created": time.strftime("%Y-%m-%dT%H:%M:%S"), "git": commit, "python": platform.python_version(),
+            "platform": platform.platform(), "machine": platform.machine(), "cpu_count": os.cpu_count(),
+            "encoder": encoder_name(), "seed": args.seed, "repeat": args.repeat, "model_rows": args.model_rows,
+            "versions": versions}
+
+def expand_embeddings(book, rows, seed):
+    # Grow the embedded prefix to the full corpus: sampled prefix vectors
+    # plus seeded noise, re-normalised, written in blocks through a memmap
+    path = os.path.join(BOOK_DATA[book], f"{book}_embeddings.npy")
+    prefix = np.load(path)
+    if len(prefix) >= rows:
+        return
+    rng = np.random.default_rng(seed)
+    tmp = path + ".tmp.npy"
+    out = np.lib.format.open_memmap(tmp, mode="w+", dtype="float32", shape=(rows, prefix.shape[1]))
+    out[:len(prefix)] = prefix
+    for lo in range(len(prefix), rows, 65536):
+        hi = min(lo + 65536, rows)
+        block = prefix[rng.integers(len(prefix), size=hi - lo)] + rng.normal(scale=0.05, size=(hi - lo, prefix.shape[1]))
+        out[lo:hi] = block / np.linalg.norm(block, axis=1, keepdims=True)
+    out.flush()
+    del out
+    os.replace(tmp, path)
+
+class Context:
+    # Shared state for one corpus: the parsed frame, and what earlier
+    # benchmarks produced (clean_text output feeds the later stages)
+    def __init__(self, logger, corpus, df, args):
+        self.logger = logger
+        self.corpus = corpus
+        self.book = book_name(corpus)
+        self.df = df
+        self.args = args
+        self.clean = None
+        self.nlp = None
+        self.cleanup = None
+        register(self.book)
+
+    def cleaned(self):
+        if self.clean is None:
+            self.clean = clean_text(self.logger, self.df)
+        return self.clean
+
+    def model_slice(self):
+        return self.cleaned().head(self.args.model_rows) if self.args.model_rows else self.cleaned()
+
+    def queries(self, n):
+        # Leading words of seeded random verses, all distinct so no run is served from a cache
+        texts = self.cleaned()["clean_text"]
+        rng = np.random.default_rng(self.args.seed + 1)
+        picks = texts.gather(rng.choice(len(texts), size=min(n + 1, len(texts)), replace=False))
+        out = list(dict.fromkeys(" ".join(t.split()[:8]) for t in picks.to_list() if t))
+        return out[0], out[1:]
+
+def bench_process_quran(ctx):
+    from ethics_bot.scripts.process_texts import process_quran
+    path = QURAN_PICKTHALL_PATH
+    if ctx.corpus != "quran":
+        # Other corpora are parsed from a Tanzil-format dump of themselves
+        path = ctx.cleanup = tempfile.NamedTemporaryFile(suffix=".txt", delete=False).name
+        write_tanzil(ctx.df, path)
+    return lambda: process_quran(ctx.logger, path).height, {}
+
+def bench_clean_text(ctx):
+    return lambda: clean_text(ctx.logger, ctx.df).height, {}
+
+def bench_add_sentiments(ctx):
+    df = ctx.cleaned()
+    return lambda: add_sentiments(ctx.logger, df, processes=ctx.args.processes).height, {"processes": ctx.args.processes}
+
+def bench_enrichment_NER(ctx):
+    if ctx.nlp is None:
+        try:
+            import spacy
+            ctx.nlp = spacy.load('en_core_web_sm', disable=['lemmatizer', 'tagger', 'parser'])
+        except (ImportError, OSError) as e:
+            raise Skip(f"spaCy model unavailable: {e}")
+    df = ctx.model_slice()
+    return lambda: enrichment_NER(ctx.logger, ctx.nlp, df).height, {}
+
+def bench_embed_text(ctx):
+    df = ctx.model_slice()
+    batch_size = ctx.args.batch_size
+
+    def run():
+        embed_text(ctx.logger, df, ctx.book, batch_size)
+        return df.height
+    return run, {"batch_size": batch_size}
+
+def bench_build_faiss(ctx):
+    embeddings = os.path.join(BOOK_DATA[ctx.book], f"{ctx.book}_embeddings.npy")
+    if not os.path.exists(embeddings):
+        raise Skip("needs embed_text in the same run")
+    # Untimed setup: full-size vectors and metadata, no keys so every run is a full build
+    expand_embeddings(ctx.book, ctx.df.height, ctx.args.seed)
+    ctx.cleaned().write_parquet(os.path.join(BOOK_DATA[ctx.book], f"{ctx.book}_metadata.parquet"))
+    for name in (f"{ctx.book}_keys.npy", f"{ctx.book}_index.keys.npy"):
+        if os.path.exists(os.path.join(BOOK_DATA[ctx.book], name)):
+            os.remove(os.path.join(BOOK_DATA[ctx.book], name))
+
+    def run():
+        build_faiss(ctx.logger, ctx.book, spec=ctx.args.spec)
+        return ctx.df.height
+    return run, {"spec": ctx.args.spec}
+
+def bench_search_faiss(ctx):
+    if not os.path.exists(os.path.join(BOOK_DATA[ctx.book], f"{ctx.book}_index.faiss")):
+        raise Skip("needs build_faiss in the same run")
+    from ethics_bot.utils.search import get_engine
+    engine = get_engine(logger=ctx.logger)
+    warm, queries = ctx.queries(ctx.args.queries)
+    search_faiss(warm, ctx.book, k=ctx.args.k)  # model, index and metadata load
+    latencies = []
+
+    def run():
+        engine.query_cache.clear()
+        engine.result_cache.clear()
+        latencies.clear()
+        for query in queries:
+            start = time.perf_counter()
+            search_faiss(query, ctx.book, k=ctx.args.k)
+            latencies.append(time.perf_counter() - start)
+        return len(queries)
+
+    def stats():
+        ms = np.array(latencies) * 1000
+        return {"k": ctx.args.k, "p50_ms": round(float(np.percentile(ms, 50)), 3),
+                "p95_ms": round(float(np.percentile(ms, 95)), 3), "mean_ms": round(float(ms.mean()), 3)}
+    return run, stats
+
+def measure(ctx, name):
+    ctx.cleanup = None
+    try:
+        fn, extra = globals()[f"bench_{name}"](ctx)
+    except Skip as e:
+        ctx.logger.info(f"{ctx.corpus:16s} {name:16s} skipped: {e}")
+        return {"corpus": ctx.corpus, "benchmark": name, "skipped": str(e)}
+    runs = []
+    best_extra = {}
+    try:
+        for _ in range(ctx.args.repeat):
+            with span(f"bench_{name}", corpus=ctx.corpus) as s:
+                rows = fn()
+            runs.append(round(s.seconds, 6))
+            if s.seconds <= min(runs):
+                best_extra = extra() if callable(extra) else dict(extra)
+    finally:
+        if ctx.cleanup:
+            os.remove(ctx.cleanup)
+    sec = min(runs)
+    result = {"corpus": ctx.corpus, "benchmark": name, "rows": rows, "sec": sec, "runs": runs,
+              "rows_per_sec": round(rows / sec, 1) if sec else None, "peak_rss_mb": round(peak_rss_bytes() / 2**20, 1),
+              **best_extra}
+    ctx.logger.info(f"{ctx.corpus:16s} {name:16s} {rows:9d} rows | {sec:9.4f} s | {result['rows_per_sec']:12.1f} rows/sec")
+    return result
+
+def run_suite(logger, args):
+    results = []
+    for corpus in args.corpora:
+        df = load_corpus(corpus, logger, args.seed)
+        logger.info(f"{corpus}: {df.height} rows")
+        ctx = Context(logger, corpus, df, args)
+        try:
+            for name in args.benchmarks:
+                results.append(measure(ctx, name))
+        finally:
+            if not args.keep:
+                shutil.rmtree(BOOK_DATA[ctx.book], ignore_errors=True)
+    return {"environment": environment(args), "results": results}
+
+def compare(logger, base_path, new_path, threshold=0.10, min_sec=0.005, min_ms=0.5):
+    # A benchmark regresses when it is more than threshold slower and the
+    # gap is above min_sec (min_ms for per-query latency), so timer jitter
+    # on tiny runs is not reported
+    with open(base_path) as f:
+        base = json.load(f)
+    with open(new_path) as f:
+        new = json.load(f)
+    for key in ("cpu_count", "encoder", "model_rows", "seed"):
+        if base["environment"].get(key) != new["environment"].get(key):
+            logger.warning(f"{key} differs: {base['environment'].get(key)} vs {new['environment'].get(key)}")
+
+    before = {(r["corpus"], r["benchmark"]): r for r in base["results"] if "sec" in r}
+    regressions = []
+    logger.info(f"{'corpus':16s} {'benchmark':16s} {'metric':7s} {'base':>10s} {'new':>10s} {'change':>8s}")
+    for r in new["results"]:
+        old = before.get((r["corpus"], r["benchmark"]))
+        if old is None or "sec" not in r:
+            continue
+        for metric, floor in (("sec", min_sec), ("p95_ms", min_ms)):
+            if metric not in r or metric not in old or not old[metric]:
+                continue
+            change = r[metric] / old[metric] - 1
+            slower = change > threshold and r[metric] - old[metric] > floor
+            flag = "  REGRESSION" if slower else ("  faster" if change < -threshold else "")
+            logger.info(f"{r['corpus']:16s} {r['benchmark']:16s} {metric:7s} {old[metric]:10.4f} {r[metric]:10.4f} "
+                        f"{change:+8.1%}{flag}")
+            if slower:
+                regressions.append((r["corpus"], r["benchmark"], metric, change))
+    logger.info(f"{len(regressions)} regression(s) above {threshold:.0%}")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Seeded benchmark suite over ingest, embed, enrich, index and search")
+    sub = parser.add_subparsers(dest="command", required=True)
+    run = sub.add_parser("run", help="Run the suite and write a JSON result file")
+    run.add_argument("--corpora", nargs="+", default=["quran", "gita", "synth:10000"],
+                     help="quran, gita or synth:<rows> (10_000 up to 10_000_000)")
+    run.add_argument("--benchmarks", nargs="+", default=BENCHMARKS, choices=BENCHMARKS)
+    run.add_argument("--repeat", type=int, default=3)
+    run.add_argument("--seed", type=int, default=0)
+    run.add_argument("--model-rows", type=int, default=20000, help="Rows given to NER and embedding (0 = all)")
+    run.add_argument("--batch-size", type=int, default=64)
+    run.add_argument("--processes", type=int, default=1, help="add_sentiments worker processes")
+    run.add_argument("--spec", default="Flat", choices=list(INDEX_SPECS))
+    run.add_argument("--queries", type=int, default=200)
+    run.add_argument("--k", type=int, default=5)
+    run.add_argument("--out", default=None, help="Result file (default logs/benchmarks/<time>-<commit>.json)")
+    run.add_argument("--keep", action="store_true", help="Keep the data/bench_* artifacts")
+    cmp = sub.add_parser("compare", help="Flag regressions between two result files")
+    cmp.add_argument("base")
+    cmp.add_argument("new")
+    cmp.add_argument("--threshold", type=float, default=0.10, help="Relative slowdown that counts as a regression")
+    cmp.add_argument("--min-sec", type=float, default=0.005, help="Ignore slowdowns smaller than this")
+    cmp.add_argument("--min-ms", type=float, default=0.5, help="Same floor for p95 search latency")
+    args = parser.parse_args()
+
+    os.makedirs(LOGGER_PATH, exist_ok=True)
+    logger = get_logger(app_name, LOGGER_PATH / f'{app_name}')
+    if args.command == "compare":
+        sys.exit(1 if compare(logger, args.base, args.new, args.threshold, args.min_sec, args.min_ms) else 0)
+
+    report = run_suite(logger, args)
+    out = args.out or os.path.join(LOGGER_PATH, "benchmarks",
+                                   f"{time.strftime('%Y%m%d-%H%M%S')}-{report['environment']['git'] or 'nogit'}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    with open(out, "w") as f:
+        json.dump(report, f, indent=2)
+    logger.info(f"Results written to {out}")
+
+if __name__ == "__main__":
+    main()
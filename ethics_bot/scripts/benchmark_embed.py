@@ -0,0 +1,71 @@
+import argparse, glob, os, re, time
+import numpy as np
+import polars as pl
+from ethics_bot.utils.common import get_logger, encode_texts, load_encoder
+from ethics_bot.utils.constants import *
+
+app_name = "benchmark_embed"
+
+def logged_throughput():
+    # embed_text logs "Throughput: X verses/sec" on every pipeline run; the
+    # last one is today's number to beat.
+    pattern = re.compile(r"Throughput: ([\d.]+) verses/sec")
+    found = None
+    for path in sorted(glob.glob(str(LOGGER_PATH / "raw_to_embed_texts*")), key=os.path.getmtime):
+        with open(path, errors="ignore") as f:
+            for line in f:
+                m = pattern.search(line)
+                if m:
+                    found = float(m.group(1))
+    return found
+
+def load_texts(books, limit):
+    texts = []
+    for book in books:
+        path = os.path.join(BOOK_DATA[book], f"{book}_metadata.parquet")
+        if os.path.exists(path):
+            texts.extend(pl.read_parquet(path, columns=["clean_text"])["clean_text"].to_list())
+    return texts[:limit] if limit else texts
+
+def timed(fn):
+    start = time.perf_counter()
+    out = fn()
+    return out, time.perf_counter() - start
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Embedding throughput: corpus order vs length-sorted vs multi-process")
+    parser.add_argument("--books", nargs="+", default=list(BOOK_DATA))
+    parser.add_argument("--limit", type=int, default=0, help="Only embed the first N verses")
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--processes", type=int, nargs="+", default=[2, os.cpu_count()])
+    args = parser.parse_args()
+
+    logger = get_logger(app_name, LOGGER_PATH / f'{app_name}')
+    texts = load_texts(args.books, args.limit)
+    model = load_encoder()
+    model.encode(texts[:args.batch_size], batch_size=args.batch_size)  # warm up
+    logger.info(f"{len(texts)} verses, batch_size={args.batch_size}, {os.cpu_count()} cores")
+
+    def report(name, sec, cores, ref=None):
+        rate = len(texts) / sec
+        logger.info(f"{name:28s} {rate:9.1f} verses/sec | {rate / cores:8.1f} per core"
+                    + (f" | x{rate / ref:.2f} vs baseline" if ref else ""))
+        return rate
+
+    # Same call embed_text made before length bucketing
+    baseline, sec = timed(lambda: model.encode(texts, batch_size=args.batch_size, normalize_embeddings=True))
+    base_rate = report("corpus order, 1 process", sec, 1)
+
+    sorted_out, sec = timed(lambda: encode_texts(logger, model, texts, args.batch_size, 1))
+    report("length sorted, 1 process", sec, 1, base_rate)
+    assert np.allclose(sorted_out, baseline, atol=1e-4), "length sorting changed the embeddings"
+
+    for p in args.processes:
+        if p and p > 1:
+            out, sec = timed(lambda: encode_texts(logger, model, texts, args.batch_size, p))
+            report(f"length sorted, {p} processes", sec, p, base_rate)
+            assert np.allclose(out, baseline, atol=1e-4), "multi-process output order is unstable"
+
+    prior = logged_throughput()
+    if prior:
+        logger.info(f"Last logged embed_text throughput: {prior:.1f} verses/sec")
@@ -0,0 +1,88 @@
+import argparse, json, os, sys, time
+import numpy as np
+import polars as pl
+from ethics_bot.utils.common import get_logger
+from ethics_bot.utils.constants import *
+from ethics_bot.utils.encoder import load_encoder
+from ethics_bot.scripts.benchmark_search import QUERIES, percentile_ms
+
+app_name = "benchmark_encoder"
+
+# Minimum per-text cosine vs torch each backend must reach
+MIN_COSINE = {"onnx": 0.999, "onnx-int8": 0.97}
+
+def load_texts(books, limit):
+    texts = []
+    for book in books:
+        path = os.path.join(BOOK_DATA[book], f"{book}_metadata.parquet")
+        if os.path.exists(path):
+            texts.extend(pl.read_parquet(path, columns=["clean_text"])["clean_text"].fill_null("").to_list())
+    return texts[:limit] if limit else texts
+
+def bench_backend(logger, backend, texts, batch_size, single_runs):
+    start = time.perf_counter()
+    model = load_encoder(backend=backend)
+    load_sec = time.perf_counter() - start
+    model.encode(texts[:batch_size], batch_size=batch_size)  # warm up
+
+    single = []
+    for i in range(single_runs):
+        start = time.perf_counter()
+        model.encode([QUERIES[i % len(QUERIES)]], normalize_embeddings=True)
+        single.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    embeddings = model.encode(texts, batch_size=batch_size, normalize_embeddings=True)
+    batch_sec = time.perf_counter() - start
+    return embeddings, {
+        "backend": backend,
+        "load_sec": load_sec,
+        "single_p50_ms": percentile_ms(single, 50),
+        "single_p99_ms": percentile_ms(single, 99),
+        "batch_verses_per_sec": len(texts) / batch_sec,
+    }
+
+def recall_vs(reference, embeddings, k=10, n_queries=200):
+    # Do nearest neighbours over the corpus survive the backend change?
+    queries = np.arange(min(n_queries, len(reference)))
+    truth = np.argsort(-(reference[queries] @ reference.T), axis=1)[:, :k]
+    found = np.argsort(-(embeddings[queries] @ embeddings.T), axis=1)[:, :k]
+    return float(np.mean([len(set(f) & set(t)) / k for f, t in zip(found, truth)]))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Parity and speed of the torch / ONNX / int8 ONNX encoders")
+    parser.add_argument("--backends", nargs="+", default=list(ENCODER_BACKENDS), choices=ENCODER_BACKENDS)
+    parser.add_argument("--books", nargs="+", default=list(BOOK_DATA))
+    parser.add_argument("--limit", type=int, default=5000, help="Verses used for throughput and parity")
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--single-runs", type=int, default=200)
+    parser.add_argument("--out", help="Write results as JSON to this path")
+    args = parser.parse_args()
+
+    logger = get_logger(app_name, LOGGER_PATH / f'{app_name}')
+    texts = load_texts(args.books, args.limit)
+    logger.info(f"{len(texts)} verses, batch_size={args.batch_size}, {os.cpu_count()} cores")
+
+    reference, results, failed = None, [], []
+    for backend in ["torch"] + [b for b in args.backends if b != "torch"]:
+        embeddings, row = bench_backend(logger, backend, texts, args.batch_size, args.single_runs)
+        if reference is None:
+            reference = embeddings
+        else:
+            cosine = np.sum(reference * embeddings, axis=1)
+            row.update({"min_cosine": float(cosine.min()), "mean_cosine": float(cosine.mean()),
+                        "recall@10": recall_vs(reference, embeddings)})
+            if row["min_cosine"] < MIN_COSINE[backend]:
+                failed.append(backend)
+        parity = (f" | cosine vs torch min {row['min_cosine']:.4f} mean {row['mean_cosine']:.5f} "
+                  f"| recall@10 {row['recall@10']:.3f}") if "min_cosine" in row else ""
+        logger.info(f"{backend:10s} load {row['load_sec']:.2f} s | single p50 {row['single_p50_ms']:.2f} ms "
+                    f"p99 {row['single_p99_ms']:.2f} ms | batch {row['batch_verses_per_sec']:.1f} verses/sec{parity}")
+        results.append(row)
+
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(results, f, indent=2)
+    if failed:
+        logger.error(f"Parity below threshold for {failed} (thresholds {MIN_COSINE})")
+        sys.exit(1)
@@ -0,0 +1,78 @@
+import argparse, hashlib, json, tempfile, threading, time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import unquote, urlparse
+import requests
+from ethics_bot.utils.common import get_logger
+from ethics_bot.utils.constants import *
+from ethics_bot.utils.fetch import Fetcher
+from ethics_bot.scripts.process_texts import process_tanakh
+
+app_name = "benchmark_fetch"
+
+def standin_server(latency_ms, verses=25):
+    # Local stand-in for the Sefaria texts API: synthetic chapters, a fixed
+    # per-request delay to mimic the WAN round trip, and ETag revalidation.
+    hits = {"200": 0, "304": 0}
+    lock = threading.Lock()  # handlers run on one thread per request
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            time.sleep(latency_ms / 1000)
+            ref = unquote(urlparse(self.path).path.rsplit("/", 1)[-1])
+            body = json.dumps({"ref": ref, "text": [f"{ref}:{v} <i>verse</i> text" for v in range(1, verses + 1)]}).encode()
+            etag = '"' + hashlib.md5(body).hexdigest() + '"'
+            if self.headers.get("If-None-Match") == etag:
+                with lock:
+                    hits["304"] += 1
+                self.send_response(304)
+                self.send_header("ETag", etag)
+                self.end_headers()
+                return
+            with lock:
+                hits["200"] += 1
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.send_header("ETag", etag)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_address[1]}/api/texts/{{}}.{{}}?context=0&commentary=0&lang=en"
+    return server, url, hits
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Tanakh ingest against a local stand-in server: sequential vs pooled, cached, offline")
+    parser.add_argument("--latency-ms", type=float, default=50)
+    parser.add_argument("--workers", type=int, default=32)
+    parser.add_argument("--baseline-chapters", type=int, default=100,
+                        help="Chapters fetched sequentially for the baseline (extrapolated to all 929)")
+    args = parser.parse_args()
+
+    logger = get_logger(app_name, LOGGER_PATH / f'{app_name}')
+    server, url, hits = standin_server(args.latency_ms)
+    refs = [(book, ch) for book, n in TANAKH_CHAPTERS.items() for ch in range(1, n + 1)]
+
+    # What a plain requests.get loop over every chapter would cost
+    start = time.perf_counter()
+    for book, ch in refs[:args.baseline_chapters]:
+        requests.get(url.format(book.replace(" ", "_"), ch), timeout=30).json()
+    baseline = (time.perf_counter() - start) * len(refs) / args.baseline_chapters
+    logger.info(f"sequential requests.get      {baseline:7.2f} s (extrapolated from {args.baseline_chapters} chapters)")
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        for name, offline in (("pooled, cold cache", False), ("pooled, warm cache (304s)", False), ("offline", True)):
+            fetcher = Fetcher(logger, cache_dir=cache_dir, offline=offline, max_workers=args.workers)
+            before = dict(hits)
+            start = time.perf_counter()
+            df = process_tanakh(logger, fetcher, url=url)
+            sec = time.perf_counter() - start
+            served = {k: hits[k] - before[k] for k in hits}
+            logger.info(f"{name:28s} {sec:7.2f} s | {df.height} verses | server 200s {served['200']} "
+                        f"304s {served['304']} | x{baseline / sec:.0f} vs sequential")
+    server.shutdown()
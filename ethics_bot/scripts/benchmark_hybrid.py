@@ -0,0 +1,91 @@
+import argparse, json, os, time
+import numpy as np
+import polars as pl
+from ethics_bot.utils.common import get_logger
+from ethics_bot.utils.constants import *
+from ethics_bot.utils.bm25 import tokenize
+from ethics_bot.utils.search import SearchEngine
+
+app_name = "benchmark_hybrid"
+
+def make_queries(metadata, n, seed=0, max_df=3, context=3):
+    # Known-item queries built around rare terms (names, unusual words):
+    # a term found in at most max_df verses plus a few words of the target
+    # verse. Any verse containing the rare term counts as relevant.
+    rng = np.random.default_rng(seed)
+    texts = metadata["clean_text"].fill_null("").to_list()
+    docs = [tokenize(t) for t in texts]
+    postings = {}
+    for doc_id, tokens in enumerate(docs):
+        for token in set(tokens):
+            postings.setdefault(token, []).append(doc_id)
+    rare = sorted(t for t, ids in postings.items() if len(ids) <= max_df and len(t) >= 5 and not t.isdigit())
+    queries = []
+    for term in rng.permutation(rare)[:n]:
+        target = postings[term][0]
+        words = [w for w in docs[target] if w != term and len(w) > 3]
+        picked = [words[i] for i in sorted(rng.choice(len(words), size=min(context, len(words)), replace=False))] if words else []
+        queries.append({"term": term, "query": " ".join([term] + picked), "relevant": set(postings[term])})
+    return queries
+
+def score(found, queries, k):
+    hit, mrr = [], []
+    for ids, q in zip(found, queries):
+        ranks = [r for r, i in enumerate(ids[:k]) if i in q["relevant"]]
+        hit.append(1.0 if ranks else 0.0)
+        mrr.append(1.0 / (ranks[0] + 1) if ranks else 0.0)
+    return float(np.mean(hit)), float(np.mean(mrr))
+
+def bench_mode(engine, book, queries, k, hybrid, boost):
+    texts = [q["query"] for q in queries]
+    start = time.perf_counter()
+    df = engine.search_many(texts, book, k, hybrid=hybrid, boost=boost)
+    batch_sec = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for text in texts[:200]:
+        engine.search(text, book, k, hybrid=hybrid, boost=boost)
+    single_ms = (time.perf_counter() - start) / min(200, len(texts)) * 1000
+
+    found = [[] for _ in texts]
+    for query_id, row_id in df.select(["query_id", "row_id"]).iter_rows():
+        found[query_id].append(row_id)
+    hit, mrr = score(found, queries, k)
+    return {"qps_batch": len(texts) / batch_sec, "latency_ms": single_ms, f"hit@{k}": hit, f"mrr@{k}": mrr}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Dense-only vs BM25 + dense hybrid retrieval")
+    parser.add_argument("--books", nargs="+", default=list(BOOK_DATA) + [UNIFIED_BOOK])
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--boost", type=float, default=1.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", help="Write results as JSON to this path")
+    args = parser.parse_args()
+
+    logger = get_logger(app_name, LOGGER_PATH / f'{app_name}')
+    engine = SearchEngine(logger)
+    results = []
+    for book in args.books:
+        if not os.path.exists(os.path.join(DATA_ROOT, book, f'{book}_bm25.npz')):
+            logger.warning(f"No BM25 index for {book}, skipping (rebuild with build_faiss).")
+            continue
+        engine.load(book)
+        lexical = engine.bm25(book)
+        logger.info(f"{book}: BM25 {len(lexical.vocab)} terms, {lexical.nbytes() / 1e6:.2f} MB")
+        metadata = pl.read_parquet(os.path.join(DATA_ROOT, book, f'{book}_metadata.parquet'), columns=["clean_text"])
+        queries = make_queries(metadata, args.queries, args.seed)
+        engine.search_many([q["query"] for q in queries[:16]], book, args.k)  # warm up the encoder
+
+        dense = None
+        for name, hybrid, boost in (("dense", False, 0.0), ("hybrid", True, 0.0), ("hybrid+boost", True, args.boost)):
+            row = {"book": book, "mode": name, **bench_mode(engine, book, queries, args.k, hybrid, boost)}
+            dense = dense or row
+            overhead = row["latency_ms"] - dense["latency_ms"]
+            logger.info(f"{book:14s} {name:13s} hit@{args.k} {row[f'hit@{args.k}']:.3f} mrr@{args.k} {row[f'mrr@{args.k}']:.3f} "
+                        f"| {row['qps_batch']:8.0f} QPS | {row['latency_ms']:.3f} ms/query ({overhead:+.3f} ms vs dense)")
+            results.append(row)
+
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(results, f, indent=2)
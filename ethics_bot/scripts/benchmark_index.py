@@ -0,0 +1,121 @@
+import argparse, json, os, tempfile, time
+import numpy as np
+import faiss
+from ethics_bot.utils.common import get_logger
+from ethics_bot.utils.constants import *
+from ethics_bot.utils.indexing import *
+
+app_name = "benchmark_index"
+
+def load_embeddings(book):
+    embeddings = np.load(os.path.join(BOOK_DATA[book], f'{book}_embeddings.npy')).astype("float32")
+    faiss.normalize_L2(embeddings)
+    return embeddings
+
+def make_queries(embeddings, n, seed=0):
+    # Perturbed corpus vectors: close to real query distribution without
+    # needing the encoder, and reproducible across runs.
+    rng = np.random.default_rng(seed)
+    queries = embeddings[rng.choice(len(embeddings), size=min(n, len(embeddings)), replace=False)]
+    queries = queries + rng.normal(scale=0.05, size=queries.shape).astype("float32")
+    faiss.normalize_L2(queries)
+    return queries
+
+def recall_at_k(found, truth):
+    k = truth.shape[1]
+    return float(np.mean([len(set(f[:k]) & set(t)) / k for f, t in zip(found, truth)]))
+
+def sweep(spec):
+    # Operating points to try for the runtime knob of each index type
+    if "nprobe" in spec:
+        points = [{"nprobe": p} for p in sorted({1, 4, 16, 64, spec["nprobe"]}) if p <= spec["nlist"]]
+    elif "efSearch" in spec:
+        points = [{"efSearch": ef} for ef in sorted({16, 64, 256, spec["efSearch"]})]
+    else:
+        points = [{}]
+    # Lossy codes are measured with and without the exact float32 re-rank
+    if spec["type"] in ("IVFPQ", "SQfp16", "SQ8", "Binary"):
+        points = [{**p, "rerank": r} for p in points for r in sorted({0, spec.get("rerank") or 4})]
+    return points
+
+def bench_spec(logger, book, embeddings, queries, truth, spec, k):
+    spec = fit_spec(resolve_spec(spec), len(embeddings))
+    start = time.perf_counter()
+    index = make_index(embeddings.shape[1], spec)
+    if not index.is_trained:
+        index.train(embeddings)
+    add_vectors(index, spec, embeddings)
+    build_sec = time.perf_counter() - start
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "index.faiss")
+        write_index(index, path, spec)
+        size_mb = os.path.getsize(path) / 1e6
+
+    rows = []
+    for knobs in sweep(spec):
+        point = {**spec, **knobs}
+        apply_search_params(index, point)
+
+        def run(q):
+            fetch = k * point["rerank"] if point.get("rerank") else k
+            _, found = search_index(index, point, q, fetch)
+            return rerank(embeddings, q, found, k)[1] if point.get("rerank") else found
+
+        start = time.perf_counter()
+        found = run(queries)
+        batch_sec = time.perf_counter() - start
+
+        start = time.perf_counter()
+        for q in queries[:200]:
+            run(q[None, :])
+        single_ms = (time.perf_counter() - start) / min(200, len(queries)) * 1000
+
+        params = " ".join(p for p in (runtime_params(point), f"rerank={point['rerank']}" if point.get("rerank") else "") if p)
+        row = {
+            "book": book,
+            "index": factory_string(point),
+            "params": params,
+            f"recall@{k}": recall_at_k(found, truth),
+            "qps_batch": len(queries) / batch_sec,
+            "latency_ms": single_ms,
+            "build_sec": build_sec,
+            "size_mb": size_mb,
+            "bytes_per_vector": size_mb * 1e6 / len(embeddings),
+        }
+        logger.info(f"{book:14s} {row['index']:18s} {row['params']:22s} recall@{k} {row[f'recall@{k}']:.3f} "
+                    f"| {row['qps_batch']:9.0f} QPS | {single_ms:.3f} ms/query "
+                    f"| build {build_sec:.2f} s | {size_mb:.2f} MB ({row['bytes_per_vector']:.0f} B/vector)")
+        rows.append(row)
+    return rows
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Recall vs latency for FAISS index types")
+    parser.add_argument("--books", nargs="+", default=list(BOOK_DATA))
+    parser.add_argument("--specs", nargs="+", default=list(INDEX_SPECS))
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--queries", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", help="Write results as JSON to this path")
+    args = parser.parse_args()
+
+    logger = get_logger(app_name, LOGGER_PATH / f'{app_name}')
+    results = []
+    for book in args.books:
+        if not os.path.exists(os.path.join(BOOK_DATA[book], f'{book}_embeddings.npy')):
+            logger.warning(f"No embeddings for {book}, skipping.")
+            continue
+        embeddings = load_embeddings(book)
+        queries = make_queries(embeddings, args.queries, args.seed)
+
+        # Exact flat search is the ground truth every spec is scored against
+        flat = faiss.IndexFlatIP(embeddings.shape[1])
+        flat.add(embeddings)
+        _, truth = flat.search(queries, args.k)
+
+        for spec in args.specs:
+            results.extend(bench_spec(logger, book, embeddings, queries, truth, spec, args.k))
+
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(results, f, indent=2)
@@ -0,0 +1,62 @@
+import argparse, logging, os, time
+import polars as pl
+from ethics_bot.utils.common import get_logger
+from ethics_bot.utils.constants import *
+from ethics_bot.scripts.process_texts import PARSERS, parse_sources
+
+app_name = "benchmark_parse"
+
+def per_line_quran(path):
+    # The dict-per-verse loop process_quran used before the columnar path
+    records = []
+    with open(path, "r", encoding="utf-8") as f:
+        for raw_line in f:
+            line = raw_line.strip()
+            if not line or line.startswith("#"):
+                continue
+            parts = line.split("|", 2)
+            if len(parts) != 3:
+                continue
+            surah, ayah, text = parts
+            records.append({"tradition": "Islam", "book": int(surah), "chapter": int(surah), "verse": int(ayah),
+                            "text": text.strip(), "lang": "EN", "source": "Pickthall"})
+    return pl.DataFrame(records)
+
+def best_of(fn, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        out = fn()
+        best = min(best, time.perf_counter() - start)
+    return out, best
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Raw-text parsing throughput: per-line vs columnar vs process pool")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--copies", type=int, default=12, help="Files in the multi-file run (bundled files repeated)")
+    parser.add_argument("--processes", type=int, default=os.cpu_count())
+    args = parser.parse_args()
+
+    logger = get_logger(app_name, LOGGER_PATH / f'{app_name}')
+    quiet = logging.getLogger("process_texts")
+    sources = [("tanzil", str(QURAN_PICKTHALL_PATH)), ("tanzil_simple", str(QURAN_SIMPLE_PATH))]
+    if os.path.exists(BIBLE_PATH):
+        sources.append(("bible", str(BIBLE_PATH)))
+
+    def report(name, rows, sec, ref=None):
+        logger.info(f"{name:40s} {rows:7d} rows | {sec * 1000:8.2f} ms | {rows / sec:11.0f} rows/sec"
+                    + (f" | x{ref / sec:.1f}" if ref else ""))
+
+    df, base = best_of(lambda: per_line_quran(QURAN_PICKTHALL_PATH), args.repeat)
+    report("en.pickthall per-line dicts", df.height, base)
+    for kind, path in sources:
+        df, sec = best_of(lambda: PARSERS[kind](quiet, path), args.repeat)
+        report(f"{os.path.basename(path)} columnar", df.height, sec, base if kind == "tanzil" else None)
+
+    many = (sources * args.copies)[:max(args.copies, len(sources))]
+    frames, serial = best_of(lambda: parse_sources(quiet, many, processes=1), 1)
+    rows = sum(f.height for f in frames)
+    report(f"{len(many)} files, 1 process", rows, serial)
+    if args.processes and args.processes > 1:
+        _, pooled = best_of(lambda: parse_sources(quiet, many, processes=args.processes, min_pool_bytes=0), 1)
+        report(f"{len(many)} files, {args.processes} processes", rows, pooled, serial)
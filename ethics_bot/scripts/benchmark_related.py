@@ -0,0 +1,117 @@
+import argparse, json, os, shutil, tempfile, time
+import multiprocessing as mp
+import numpy as np
+from ethics_bot.utils.common import get_logger
+from ethics_bot.utils.constants import *
+
+app_name = "benchmark_related"
+
+# Verse counts of the three corpora, used for synthetic stand-ins
+CORPUS_ROWS = {"bible": 31102, "quran_english": 6236, "gita_english": 701}
+
+def corpus_embeddings(logger, books, workdir, dim=384, seed=0):
+    # Real embeddings where they exist, else seeded unit vectors of the real
+    # corpus size; all written to workdir and memory-mapped like the real job
+    rng = np.random.default_rng(seed)
+    paths = {}
+    for book in books:
+        path = os.path.join(BOOK_DATA[book], f'{book}_embeddings.npy')
+        if not os.path.exists(path):
+            logger.info(f"{book}: no embeddings, using {CORPUS_ROWS[book]} synthetic rows")
+            x = rng.standard_normal((CORPUS_ROWS[book], dim), dtype=np.float32)
+            x /= np.linalg.norm(x, axis=1, keepdims=True)
+            path = os.path.join(workdir, f'{book}_embeddings.npy')
+            np.save(path, x)
+        paths[book] = path
+    return paths
+
+def join_worker(paths, k, block, threads, root, results):
+    # Fresh process per run so ru_maxrss is this join's peak alone
+    from ethics_bot.utils.build_index import build_related
+    from ethics_bot.utils.instrument import peak_rss_bytes
+    logger = get_logger(app_name, LOGGER_PATH / f'{app_name}')
+    base = peak_rss_bytes()
+    embeddings = {b: np.load(p, mmap_mode="r") for b, p in paths.items()}
+    start = time.perf_counter()
+    graph = build_related(logger, k=k, block=block, threads=threads, root=root, embeddings=embeddings)
+    seconds = time.perf_counter() - start
+    results.put({"seconds": seconds, "peak_rss_mb": peak_rss_bytes() / 1e6, "join_rss_mb": (peak_rss_bytes() - base) / 1e6,
+                 "graph_mb": graph.nbytes() / 1e6, "edges": graph.meta["nnz"]})
+
+def run_join(paths, k, block, threads, root):
+    ctx = mp.get_context("spawn")
+    results = ctx.Queue()
+    p = ctx.Process(target=join_worker, args=(paths, k, block, threads, root, results))
+    p.start()
+    out = results.get()
+    p.join()
+    return out
+
+def lookup_us(root, n=10_000, seed=0):
+    from ethics_bot.utils.related import RelatedGraph
+    graph = RelatedGraph.load(root)
+    rng = np.random.default_rng(seed)
+    picks = [(graph.corpora[c], int(r)) for c, r in zip(*graph.locate(rng.integers(0, graph.meta["n"], n)))]
+    start = time.perf_counter()
+    for book, row in picks:
+        ids, scores = graph.neighbours(book, row)
+        graph.locate(ids)
+    return (time.perf_counter() - start) / n * 1e6
+
+def naive_seconds(paths, k, sample=500, seed=0):
+    # Baseline: one FAISS query per verse against each other corpus,
+    # timed on a sample and extrapolated to every verse
+    import faiss
+    embeddings = {b: np.load(p, mmap_mode="r") for b, p in paths.items()}
+    indexes = {}
+    for b, x in embeddings.items():
+        indexes[b] = faiss.IndexFlatIP(x.shape[1])
+        indexes[b].add(np.ascontiguousarray(x, dtype=np.float32))
+    rng = np.random.default_rng(seed)
+    total = 0.0
+    for source, x in embeddings.items():
+        rows = rng.choice(len(x), size=min(sample, len(x)), replace=False)
+        start = time.perf_counter()
+        for r in rows:
+            q = np.ascontiguousarray(x[r:r + 1], dtype=np.float32)
+            for target, index in indexes.items():
+                if target != source:
+                    index.search(q, k)
+        total += (time.perf_counter() - start) / len(rows) * len(x)
+    return total
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Blocked cross-corpus k-NN join: time, memory and graph size")
+    parser.add_argument("--books", nargs="+", default=list(TRADITIONS), choices=list(BOOK_DATA))
+    parser.add_argument("--k", type=int, default=RELATED_K)
+    parser.add_argument("--blocks", type=int, nargs="+", default=[1024, 4096, RELATED_BLOCK, 32768])
+    parser.add_argument("--threads", type=int, help="FAISS OpenMP threads (default: all cores)")
+    parser.add_argument("--naive-sample", type=int, default=500, help="Verses per corpus for the per-verse baseline (0 skips it)")
+    parser.add_argument("--out", help="Write results as JSON to this path")
+    args = parser.parse_args()
+
+    logger = get_logger(app_name, LOGGER_PATH / f'{app_name}')
+    workdir = tempfile.mkdtemp(prefix="related_bench_")
+    try:
+        paths = corpus_embeddings(logger, args.books, workdir)
+        rows = sum(np.load(p, mmap_mode="r").shape[0] for p in paths.values())
+        results = []
+        for block in args.blocks:
+            root = os.path.join(workdir, f"graph_{block}")
+            result = {"block": block, **run_join(paths, args.k, block, args.threads, root)}
+            result["lookup_us"] = lookup_us(root)
+            logger.info(f"block {block:6d}: {result['seconds']:7.2f} sec | peak RSS {result['peak_rss_mb']:7.1f} MB "
+                        f"(join +{result['join_rss_mb']:.1f} MB) | graph {result['graph_mb']:.1f} MB, "
+                        f"{result['edges']} edges | lookup {result['lookup_us']:.1f} us")
+            results.append(result)
+        naive = naive_seconds(paths, args.k, args.naive_sample) if args.naive_sample else None
+        if naive:
+            best = min(r["seconds"] for r in results)
+            logger.info(f"per-verse search baseline: ~{naive:.1f} sec for {rows} verses "
+                        f"({naive / best:.1f}x the best blocked join)")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump({"rows": rows, "k": args.k, "runs": results, "naive_seconds": naive}, f, indent=2)
@@ -0,0 +1,63 @@
+import argparse, os, time
+import numpy as np
+from ethics_bot.utils.common import get_logger
+from ethics_bot.utils.constants import *
+from ethics_bot.utils.search import SearchEngine
+
+app_name = "benchmark_search"
+
+QUERIES = [
+    "is lying ever justified",
+    "killing in self-defense",
+    "forgiveness of those who wrong you",
+    "duty to parents",
+    "charity to the poor",
+    "murder and killing",
+    "honesty in trade",
+    "anger and patience",
+]
+
+def percentile_ms(samples, q):
+    return float(np.percentile(samples, q)) * 1000
+
+def bench_book(logger, book, warm_runs):
+    if not os.path.exists(os.path.join(BOOK_DATA[book], f'{book}_index.faiss')):
+        logger.warning(f"No index for {book}, run build_faiss first. Skipping.")
+        return None
+
+    # Cold: a fresh engine per call is what the old search_faiss paid every time
+    start = time.perf_counter()
+    SearchEngine().search(QUERIES[0], book, k=5)
+    cold = time.perf_counter() - start
+
+    # Warm with caches off (encode + search every time), then with the query
+    # embedding cache only, then with both caches, over repeated questions
+    warm = {}
+    for name, sizes in (("warm", (0, 0)), ("embed-cached", (10_000, 0)), ("result-cached", (10_000, 10_000))):
+        engine = SearchEngine(query_cache_size=sizes[0], result_cache_size=sizes[1]).warmup([book])
+        engine.search(QUERIES[0], book, k=5)
+        samples = []
+        for i in range(warm_runs):
+            start = time.perf_counter()
+            engine.search(QUERIES[i % len(QUERIES)], book, k=5)
+            samples.append(time.perf_counter() - start)
+        warm[name] = samples
+
+    stats = {"cold_ms": cold * 1000}
+    for name, samples in warm.items():
+        stats[f"{name}_p50_ms"] = percentile_ms(samples, 50)
+        stats[f"{name}_p99_ms"] = percentile_ms(samples, 99)
+    logger.info(f"{book}: cold {stats['cold_ms']:.1f} ms | speedup x{stats['cold_ms'] / stats['warm_p50_ms']:.0f} warm")
+    for name in warm:
+        logger.info(f"{book}: {name:13s} p50 {stats[f'{name}_p50_ms']:.3f} ms | p99 {stats[f'{name}_p99_ms']:.3f} ms")
+    return stats
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Cold vs warm search latency per corpus")
+    parser.add_argument("--books", nargs="+", default=list(BOOK_DATA))
+    parser.add_argument("--warm-runs", type=int, default=100)
+    args = parser.parse_args()
+
+    logger = get_logger(app_name, LOGGER_PATH / f'{app_name}')
+    for book in args.books:
+        bench_book(logger, book, args.warm_runs)
@@ -0,0 +1,106 @@
+import argparse, json, os, time
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from ethics_bot.utils.common import build_faiss, build_partitions, get_logger, partition_book
+from ethics_bot.utils.constants import *
+from ethics_bot.utils.shards import ShardedSearch, ShardServer, shard_plan
+from ethics_bot.benchmarks.corpus import synthetic
+from ethics_bot.benchmarks.suite import register
+
+app_name = "benchmark_shards"
+
+# Latency and throughput of scatter-gather search as the same corpora are
+# spread over more shard processes, against one process searching them all.
+# Queries are pre-encoded unit vectors: the coordinator encodes once per
+# query whatever the shard count, so the encoder would only add a constant.
+
+def make_corpus(logger, book, rows, dim, seed, spec):
+    # Seeded synthetic verses and clustered unit vectors, rebuilt only when
+    # the stored corpus has a different size
+    register(book)
+    path = os.path.join(BOOK_DATA[book], f'{book}_embeddings.npy')
+    if os.path.exists(os.path.join(BOOK_DATA[book], f'{book}_index.faiss')) and np.load(path, mmap_mode="r").shape == (rows, dim):
+        return
+    rng = np.random.default_rng(seed)
+    metadata = synthetic(rows, seed)
+    metadata.with_columns(metadata["text"].alias("clean_text")).write_parquet(
+        os.path.join(BOOK_DATA[book], f'{book}_metadata.parquet'))
+    centers = rng.standard_normal((64, dim), dtype=np.float32)
+    x = centers[rng.integers(64, size=rows)] + rng.standard_normal((rows, dim), dtype=np.float32)
+    np.save(path, x / np.linalg.norm(x, axis=1, keepdims=True))
+    build_faiss(logger, book, spec)
+
+def make_books(logger, layout, corpora, rows, dim, seed, spec):
+    if layout == "corpora":
+        books = [f"bench_shard{i}" for i in range(corpora)]
+        for i, book in enumerate(books):
+            make_corpus(logger, book, rows, dim, seed + i, spec)
+        return books
+    # One large corpus hash-partitioned into `corpora` parts
+    book = "bench_shard_all"
+    make_corpus(logger, book, rows * corpora, dim, seed, spec)
+    books = [partition_book(book, part, corpora) for part in range(corpora)]
+    if not all(os.path.exists(os.path.join(DATA_ROOT, b, f'{b}_index.faiss')) for b in books):
+        build_partitions(logger, book, corpora, spec)
+    return books
+
+class Local(ShardServer):
+    # Baseline: the same search and merge in one process, no transport
+    def search_vectors(self, queries, qvecs, k):
+        return self.search(queries, qvecs, k), []
+
+def measure(searcher, qvecs, k, clients):
+    latencies = []
+    for q in qvecs:
+        start = time.perf_counter()
+        searcher.search_vectors(["q"], q[None], k)
+        latencies.append(time.perf_counter() - start)
+
+    def one(q):
+        return searcher.search_vectors(["q"], q[None], k)[1]
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(clients) as pool:
+        missing = sum(len(m) for m in pool.map(one, qvecs))
+    seconds = time.perf_counter() - start
+    return {"p50_ms": float(np.percentile(latencies, 50)) * 1000, "p99_ms": float(np.percentile(latencies, 99)) * 1000,
+            "qps": len(qvecs) / seconds, "missing": missing}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Scatter-gather search latency and throughput vs shard count")
+    parser.add_argument("--layout", default="corpora", choices=["corpora", "partitions"],
+                        help="Separate corpora, or hash partitions of one large corpus")
+    parser.add_argument("--corpora", type=int, default=8, help="Books (or partitions) to spread over the shards")
+    parser.add_argument("--rows", type=int, default=20_000, help="Verses per book")
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--spec", default="Flat", choices=list(INDEX_SPECS))
+    parser.add_argument("--shards", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--clients", type=int, default=8, help="Concurrent callers for the throughput run")
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", help="Write results as JSON to this path")
+    args = parser.parse_args()
+
+    logger = get_logger(app_name, LOGGER_PATH / f'{app_name}')
+    books = make_books(logger, args.layout, args.corpora, args.rows, args.dim, args.seed, args.spec)
+    rng = np.random.default_rng(args.seed + 1)
+    qvecs = rng.standard_normal((args.queries, args.dim), dtype=np.float32)
+    qvecs /= np.linalg.norm(qvecs, axis=1, keepdims=True)
+
+    results = {"single_process": measure(Local(books), qvecs, args.k, args.clients)}
+    logger.info(f"single process: p50 {results['single_process']['p50_ms']:.2f} ms | "
+                f"p99 {results['single_process']['p99_ms']:.2f} ms | {results['single_process']['qps']:.0f} qps")
+    for n in args.shards:
+        with ShardedSearch(shard_plan(books, n), timeout=30) as sharded:
+            sharded.search_vectors(["q"], qvecs[:1], args.k)  # warm up the connections
+            stats = measure(sharded, qvecs, args.k, args.clients)
+        results[f"shards_{n}"] = stats
+        logger.info(f"{n:2d} shards: p50 {stats['p50_ms']:.2f} ms | p99 {stats['p99_ms']:.2f} ms | "
+                    f"{stats['qps']:.0f} qps | {stats['missing']} shard answers missed")
+    logger.info(f"{os.cpu_count()} cores, {len(books)} books x {args.rows} verses")
+
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump({"cpu_count": os.cpu_count(), "books": books, "rows": args.rows, "k": args.k,
+                       "clients": args.clients, "results": results}, f, indent=2)
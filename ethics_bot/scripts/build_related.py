@@ -0,0 +1,19 @@
+import argparse
+from ethics_bot.utils.common import get_logger
+from ethics_bot.utils.constants import *
+from ethics_bot.utils.build_index import build_related
+
+app_name = "build_related"
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Precompute the cross-scripture related-verses graph")
+    parser.add_argument("--books", nargs="+", default=list(TRADITIONS), choices=list(BOOK_DATA))
+    parser.add_argument("--k", type=int, default=RELATED_K, help="Neighbours kept per verse in each other corpus")
+    parser.add_argument("--same-corpus", action="store_true", help="Also link verses within their own corpus")
+    parser.add_argument("--min-score", type=float, help="Drop neighbours below this cosine similarity")
+    parser.add_argument("--block", type=int, default=RELATED_BLOCK, help="Rows per query/target block (memory bound)")
+    parser.add_argument("--threads", type=int, help="FAISS OpenMP threads (default: all cores)")
+    args = parser.parse_args()
+
+    logger = get_logger(app_name, LOGGER_PATH / f'{app_name}')
+    build_related(logger, args.books, args.k, args.same_corpus, args.min_score, args.block, args.threads)
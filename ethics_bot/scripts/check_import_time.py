@@ -0,0 +1,64 @@
+import argparse, subprocess, sys
+from ethics_bot.utils.common import get_logger
+from ethics_bot.utils.constants import *
+
+app_name = "check_import_time"
+
+# Cold-import budget per entry point: cumulative -X importtime of the module
+# (best of --repeat fresh interpreters), plus heavy packages it must not load
+# at import time. A search worker needs FAISS and the encoder wrapper, never
+# torch, VADER or spaCy until a model is actually used.
+MODEL_STACK = ["torch", "sentence_transformers", "transformers", "sklearn", "vaderSentiment", "spacy", "keybert",
+               "bertopic"]
+BUDGETS = {
+    "ethics_bot.utils.common": (20, MODEL_STACK + ["faiss", "polars", "numpy"]),
+    "ethics_bot.utils.log": (100, MODEL_STACK + ["faiss", "polars", "numpy"]),
+    "ethics_bot.utils.enrich": (800, MODEL_STACK + ["faiss"]),
+    "ethics_bot.utils.embedding": (800, MODEL_STACK + ["faiss"]),
+    "ethics_bot.utils.search": (1000, MODEL_STACK),
+    "ethics_bot.service.app": (1500, MODEL_STACK),
+    "ethics_bot.scripts.process_texts": (1000, MODEL_STACK + ["faiss"]),
+}
+
+def import_profile(module):
+    # Rows of (self_us, cumulative_us, dotted name) from a fresh interpreter
+    out = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"], capture_output=True,
+                         text=True, cwd=ROOT)
+    if out.returncode:
+        raise RuntimeError(f"import {module} failed:\n{out.stderr[-2000:]}")
+    rows = []
+    for line in out.stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        self_us, cum_us, name = line[len("import time:"):].split("|")
+        rows.append((int(self_us), int(cum_us), name.strip()))
+    return rows
+
+def check(logger, module, budget_ms, forbidden, repeat=3, scale=1.0, top=5):
+    best, rows = None, []
+    for _ in range(repeat):
+        profile = import_profile(module)
+        ms = next(cum for _, cum, name in profile if name == module) / 1000
+        if best is None or ms < best:
+            best, rows = ms, profile
+    loaded = {name.split(".")[0] for _, _, name in rows}
+    banned = sorted(loaded & set(forbidden))
+    over = best > budget_ms * scale
+    status = "FAIL" if over or banned else "ok"
+    logger.info(f"{status:4s} {module:36s} {best:8.1f} ms (budget {budget_ms * scale:.0f} ms)"
+                + (f" | imports {', '.join(banned)}" if banned else ""))
+    if over or banned:
+        for self_us, cum_us, name in sorted(rows, key=lambda r: -r[0])[:top]:
+            logger.info(f"     {name:40s} self {self_us / 1000:8.1f} ms | cumulative {cum_us / 1000:8.1f} ms")
+    return not (over or banned)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fail when an entry point's cold import exceeds its -X importtime budget")
+    parser.add_argument("--modules", nargs="+", default=list(BUDGETS), choices=list(BUDGETS))
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--scale", type=float, default=1.0, help="Multiply every budget (slow CI machines)")
+    args = parser.parse_args()
+
+    logger = get_logger(app_name, LOGGER_PATH / f'{app_name}')
+    results = [check(logger, m, *BUDGETS[m], repeat=args.repeat, scale=args.scale) for m in args.modules]
+    sys.exit(0 if all(results) else 1)
@@ -1,44 +1,53 @@
-import logging, requests, time, os, spacy
-from functools import wraps
+import argparse, os
 import numpy as np
 import polars as pl
-from logging.handlers import RotatingFileHandler
-from colorama import Fore, Style
-import xml.etree.ElementTree as ET 
-from sentence_transformers import SentenceTransformer
-from vaderSentiment.vaderSentiment import SentimentIntensityAnalyzer
-from bertopic import BERTopic
-from keybert import KeyBERT
-from typing import List, Dict
-from ethics_bot.utils.common import *
+from ethics_bot.utils.common import (EmbeddingCache, add_sentiments, build_faiss, build_unified_faiss, enrichment_NER,
+                                     get_logger, get_topics, load_encoder)
 from ethics_bot.utils.constants import *
 
 app_name = "enrich_texts"
-logger = get_logger(__file__, LOGGER_PATH / f'{app_name}')
 
-df_bible = pl.read_parquet(os.path.join(BIBLE_DATA, "bible_metadata.parquet"))
-df_quran = pl.read_parquet(os.path.join(QURAN_DATA, "quran_english_metadata.parquet"))
-df_gita = pl.read_parquet(os.path.join(GITA_DATA, "gita_english_metadata.parquet"))
-
-df_bible = add_sentiments(logger, df_bible)
-df_quran = add_sentiments(logger, df_quran)
-df_gita = add_sentiments(logger, df_gita)
-
-nlp = spacy.load('en_core_web_sm', disable=['lemmatizer', 'tagger', 'parser'])
-
-df_bible = enrichment_NER(logger, nlp, df_bible)
-df_quran = enrichment_NER(logger, nlp, df_quran)
-df_gita = enrichment_NER(logger, nlp, df_gita)
-
-kw_model = KeyBERT(model='all-MiniLM-L6-v2')
-df_bible = get_topics(logger, df_bible, kw_model)
-df_quran = get_topics(logger, df_quran, kw_model)
-df_gita = get_topics(logger, df_gita, kw_model)
-
-df_bible.write_parquet(os.path.join(BIBLE_DATA, "bible_metadata.parquet"))
-df_quran.write_parquet(os.path.join(QURAN_DATA, "quran_english_metadata.parquet"))
-df_gita.write_parquet(os.path.join(GITA_DATA, "gita_english_metadata.parquet"))
-
-build_faiss(logger, 'bible')
-build_faiss(logger, 'quran_english')
-build_faiss(logger, 'gita_english')
\ No newline at end of file
+def main():
+    parser = argparse.ArgumentParser(description="Add sentiment, NER and keyword columns to every corpus")
+    parser.add_argument("--processes", type=int, default=1, help="VADER and spaCy worker processes (1 = single process)")
+    args = parser.parse_args()
+
+    import spacy
+    from keybert import KeyBERT
+    logger = get_logger(__file__, LOGGER_PATH / f'{app_name}')
+
+    df_bible = pl.read_parquet(os.path.join(BIBLE_DATA, "bible_metadata.parquet"))
+    df_quran = pl.read_parquet(os.path.join(QURAN_DATA, "quran_english_metadata.parquet"))
+    df_gita = pl.read_parquet(os.path.join(GITA_DATA, "gita_english_metadata.parquet"))
+
+    df_bible = add_sentiments(logger, df_bible, processes=args.processes)
+    df_quran = add_sentiments(logger, df_quran, processes=args.processes)
+    df_gita = add_sentiments(logger, df_gita, processes=args.processes)
+
+    nlp = spacy.load('en_core_web_sm', disable=['lemmatizer', 'tagger', 'parser'])
+
+    df_bible = enrichment_NER(logger, nlp, df_bible, n_process=args.processes)
+    df_quran = enrichment_NER(logger, nlp, df_quran, n_process=args.processes)
+    df_gita = enrichment_NER(logger, nlp, df_gita, n_process=args.processes)
+
+    # Verse embeddings from raw_to_embed_texts double as KeyBERT doc embeddings,
+    # candidate phrases are embedded once per corpus
+    kw_model = KeyBERT(model=load_encoder())
+    cache = EmbeddingCache()
+    df_bible = get_topics(logger, df_bible, kw_model, np.load(os.path.join(BIBLE_DATA, "bible_embeddings.npy"), mmap_mode="r"), book='bible', cache=cache)
+    df_quran = get_topics(logger, df_quran, kw_model, np.load(os.path.join(QURAN_DATA, "quran_english_embeddings.npy"), mmap_mode="r"), book='quran_english', cache=cache)
+    df_gita = get_topics(logger, df_gita, kw_model, np.load(os.path.join(GITA_DATA, "gita_english_embeddings.npy"), mmap_mode="r"), book='gita_english', cache=cache)
+
+    df_bible.write_parquet(os.path.join(BIBLE_DATA, "bible_metadata.parquet"))
+    df_quran.write_parquet(os.path.join(QURAN_DATA, "quran_english_metadata.parquet"))
+    df_gita.write_parquet(os.path.join(GITA_DATA, "gita_english_metadata.parquet"))
+
+    build_faiss(logger, 'bible', incremental=True)
+    build_faiss(logger, 'quran_english', incremental=True)
+    build_faiss(logger, 'gita_english', incremental=True)
+    build_unified_faiss(logger)
+
+# VADER and spaCy workers re-import this module under spawn/forkserver; the
+# guard keeps them from re-running the whole job
+if __name__ == "__main__":
+    main()
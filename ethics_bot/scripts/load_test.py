@@ -0,0 +1,63 @@
+import argparse, random, threading, time
+import numpy as np
+import requests
+from concurrent.futures import ThreadPoolExecutor
+from ethics_bot.utils.common import get_logger
+from ethics_bot.utils.constants import *
+from ethics_bot.scripts.benchmark_search import QUERIES
+
+app_name = "load_test"
+
+def worker(url, book, k, deadline, seed):
+    rng = random.Random(seed)
+    session = requests.Session()
+    latencies, errors = [], 0
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        try:
+            resp = session.post(f"{url}/search", json={"query": rng.choice(QUERIES), "book": book, "k": k}, timeout=10)
+            resp.raise_for_status()
+            latencies.append(time.perf_counter() - start)
+        except requests.RequestException:
+            errors += 1
+    return latencies, errors
+
+def run(logger, url, book, k, concurrency, duration):
+    deadline = time.perf_counter() + duration
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        futures = [pool.submit(worker, url, book, k, deadline, seed) for seed in range(concurrency)]
+        results = [f.result() for f in futures]
+    elapsed = time.perf_counter() - start
+
+    latencies = np.array([l for lats, _ in results for l in lats]) * 1000
+    errors = sum(e for _, e in results)
+    if not len(latencies):
+        logger.error(f"No successful requests ({errors} errors)")
+        return None
+
+    stats = {
+        "concurrency": concurrency,
+        "requests": int(len(latencies)),
+        "errors": errors,
+        "qps": len(latencies) / elapsed,
+        "p50_ms": float(np.percentile(latencies, 50)),
+        "p99_ms": float(np.percentile(latencies, 99)),
+    }
+    logger.info(f"c={concurrency}: {stats['qps']:.1f} QPS | p50 {stats['p50_ms']:.1f} ms "
+                f"| p99 {stats['p99_ms']:.1f} ms | {stats['requests']} ok, {errors} errors")
+    return stats
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load test a running search service")
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--book", default="gita_english")
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--duration", type=float, default=10.0)
+    args = parser.parse_args()
+
+    logger = get_logger(app_name, LOGGER_PATH / f'{app_name}')
+    logger.info(f"Health: {requests.get(f'{args.url}/health', timeout=10).json()}")
+    for c in args.concurrency:
+        run(logger, args.url, args.book, args.k, c, args.duration)
@@ -0,0 +1,63 @@
+import argparse, os
+import multiprocessing as mp
+import numpy as np
+from ethics_bot.utils.common import get_logger
+from ethics_bot.utils.constants import *
+
+app_name = "measure_rss"
+
+def memory_kb():
+    # Pss splits shared pages between the processes mapping them, so the sum
+    # over workers is the real host footprint; Rss double counts.
+    stats = {}
+    with open("/proc/self/smaps_rollup") as f:
+        for line in f:
+            parts = line.split()
+            if parts[0] in ("Rss:", "Pss:", "Anonymous:", "Shared_Clean:"):
+                stats[parts[0][:-1]] = int(parts[1])
+    return stats
+
+def worker(books, mmap, results, release):
+    from ethics_bot.utils.indexing import search_index
+    from ethics_bot.utils.search import SearchEngine
+    engine = SearchEngine(mmap=mmap)
+    for book in books:
+        index, _ = engine.load(book)
+        # A query touches the stored vectors, like a worker that has served
+        # traffic; search_index binarizes the query for Binary specs
+        search_index(index, engine.specs[book], np.ones((1, index.d), dtype="float32"), 1)
+    results.put((os.getpid(), memory_kb()))
+    release.wait()
+
+def measure(logger, books, workers, mmap):
+    ctx = mp.get_context("spawn")
+    results, release = ctx.Queue(), ctx.Event()
+    procs = [ctx.Process(target=worker, args=(books, mmap, results, release)) for _ in range(workers)]
+    for p in procs:
+        p.start()
+    # All workers stay alive until everyone has reported, so shared pages are
+    # counted while they really are shared.
+    stats = [results.get() for _ in procs]
+    release.set()
+    for p in procs:
+        p.join()
+
+    label = "mmap" if mmap else "heap"
+    for pid, s in stats:
+        logger.info(f"[{label}] pid {pid}: Rss {s['Rss'] / 1024:.1f} MB | Pss {s['Pss'] / 1024:.1f} MB "
+                    f"| Anonymous {s['Anonymous'] / 1024:.1f} MB | Shared_Clean {s['Shared_Clean'] / 1024:.1f} MB")
+    total = sum(s["Pss"] for _, s in stats) / 1024
+    logger.info(f"[{label}] {workers} workers: total Pss {total:.1f} MB")
+    return total
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Per-worker memory with heap vs mmap index loading")
+    parser.add_argument("--books", nargs="+", default=list(BOOK_DATA))
+    parser.add_argument("--workers", type=int, default=4)
+    args = parser.parse_args()
+
+    logger = get_logger(app_name, LOGGER_PATH / f'{app_name}')
+    books = [b for b in args.books if os.path.exists(os.path.join(DATA_ROOT, b, f'{b}_index.faiss'))]
+    heap = measure(logger, books, args.workers, mmap=False)
+    mapped = measure(logger, books, args.workers, mmap=True)
+    logger.info(f"Total Pss: heap {heap:.1f} MB -> mmap {mapped:.1f} MB")
@@ -0,0 +1,289 @@
+import argparse, glob, hashlib, json, os, shutil
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+import numpy as np
+import polars as pl
+from ethics_bot.utils.common import (EmbeddingCache, KEY_DTYPE, add_sentiments, build_faiss, build_partitions,
+                                     build_passages, build_unified_faiss, clean_text, embed_chunk, encoder_name, enrichment_NER,
+                                     get_logger, get_topics, keyword_vocabulary, load_encoder)
+from ethics_bot.utils.constants import *
+from ethics_bot.utils.atomic import replacing, save_npy
+from ethics_bot.utils.instrument import configure, span
+from ethics_bot.scripts.process_texts import process_bible, process_quran, process_gita
+
+# parse -> clean -> embed -> enrich -> index, one corpus at a time. Every
+# stage reads the previous stage's partitions and writes its own, one chunk
+# at a time, under data/<book>/pipeline/<stage>/part-NNNNN.*. A partition is
+# renamed into place only once complete, so a rerun skips finished chunks and
+# resumes from the first missing one.
+
+app_name = "pipeline"
+STAGES = ["parse", "clean", "embed", "enrich", "index"]
+PARSERS = {
+    'bible': lambda logger: process_bible(logger, BIBLE_PATH),
+    'quran_english': lambda logger: process_quran(logger, QURAN_PICKTHALL_PATH),
+    'gita_english': lambda logger: process_gita(logger),
+}
+
+class Timings:
+    # Wall time and rows per (book, stage), summed over chunks. Each timed
+    # block is also an instrument span, so traces nest pipeline -> stage -> chunk.
+    def __init__(self):
+        self.sec = defaultdict(float)
+        self.rows = defaultdict(int)
+
+    @contextmanager
+    def stage(self, book, stage, rows=0, name=None, **attrs):
+        with span(name or stage, rows=rows or None, book=book, stage=stage, **attrs) as s:
+            yield s
+        self.sec[(book, stage)] += s.seconds
+        self.rows[(book, stage)] += rows
+
+    def report(self, logger, path=None):
+        logger.info(f"{'book':14s} {'stage':7s} {'sec':>9s} {'rows':>8s} {'rows/sec':>10s}")
+        for (book, stage), sec in self.sec.items():
+            rows = self.rows[(book, stage)]
+            rate = f"{rows / sec:10.1f}" if rows and sec else f"{'-':>10s}"
+            logger.info(f"{book:14s} {stage:7s} {sec:9.2f} {rows:8d} {rate}")
+        if path:
+            with open(path, "w") as f:
+                json.dump([{"book": b, "stage": s, "sec": round(sec, 4), "rows": self.rows[(b, s)]}
+                           for (b, s), sec in self.sec.items()], f, indent=2)
+
+def stage_dir(book, stage):
+    return os.path.join(BOOK_DATA[book], "pipeline", stage)
+
+def part_path(book, stage, i, ext="parquet"):
+    return os.path.join(stage_dir(book, stage), f"part-{i:05d}.{ext}")
+
+def parts(book, stage, ext="parquet"):
+    return sorted(p for p in glob.glob(os.path.join(stage_dir(book, stage), f"part-*.{ext}"))
+                  if not p.endswith(f".keys.{ext}"))
+
+def atomic_write(path, write):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with replacing(path) as tmp, open(tmp, "wb") as f:
+        write(f)
+
+def fingerprint(df, chunk_size):
+    h = hashlib.blake2b(digest_size=16)
+    h.update(str(chunk_size).encode())
+    # Switching encoder backend invalidates the embed checkpoints too
+    h.update(encoder_name().encode())
+    for text in df["text"].to_list():
+        h.update(str(text).encode("utf-8"))
+        h.update(b"\0")
+    return h.hexdigest()
+
+def run_parse(logger, book, chunk_size, timings):
+    # The parsers read a whole source file; everything downstream sees only
+    # chunk_size rows at a time.
+    with timings.stage(book, "parse"):
+        df = PARSERS[book](logger)
+        manifest_path = os.path.join(BOOK_DATA[book], "pipeline", "manifest.json")
+        manifest = {"fingerprint": fingerprint(df, chunk_size), "chunk_size": chunk_size, "rows": df.height,
+                    "chunks": -(-df.height // chunk_size)}
+        if os.path.exists(manifest_path):
+            with open(manifest_path) as f:
+                if json.load(f).get("fingerprint") != manifest["fingerprint"]:
+                    logger.info(f"{book}: source, chunk size or encoder changed, discarding old checkpoints")
+                    shutil.rmtree(os.path.join(BOOK_DATA[book], "pipeline"))
+        for i in range(manifest["chunks"]):
+            if not os.path.exists(part_path(book, "parse", i)):
+                chunk = df.slice(i * chunk_size, chunk_size)
+                atomic_write(part_path(book, "parse", i), chunk.write_parquet)
+        atomic_write(manifest_path, lambda f: f.write(json.dumps(manifest).encode()))
+    timings.rows[(book, "parse")] += df.height
+    logger.info(f"{book}: {df.height} rows in {manifest['chunks']} chunks of {chunk_size}")
+
+def run_chunks(logger, book, stage, source, timings, fn, ext="parquet"):
+    # Apply fn to each finished source partition whose output is missing
+    done = 0
+    with span(stage, book=book):
+        for i, src in enumerate(parts(book, source)):
+            if os.path.exists(part_path(book, stage, i, ext)):
+                continue
+            df = pl.read_parquet(src)
+            with timings.stage(book, stage, df.height, name="chunk", chunk=i):
+                fn(i, df)
+            done += 1
+    logger.info(f"{book}: {stage} wrote {done} chunks, skipped {len(parts(book, source)) - done} already done")
+
+def run_clean(logger, book, timings):
+    def clean(i, df):
+        df = clean_text(logger, df)
+        atomic_write(part_path(book, "clean", i), df.write_parquet)
+    run_chunks(logger, book, "clean", "parse", timings, clean)
+
+def run_embed(logger, book, timings, models, cache, batch_size, processes):
+    def embed(i, df):
+        embeddings, keys = embed_chunk(logger, df["clean_text"].to_list(), batch_size, cache, processes,
+                                       lambda: models.sentence_model)
+        # Keys before vectors: the vectors file is the partition's done marker
+        atomic_write(part_path(book, "embed", i, "keys.npy"), lambda f: np.save(f, np.array(keys, dtype=KEY_DTYPE)))
+        atomic_write(part_path(book, "embed", i, "npy"), lambda f: np.save(f, embeddings))
+    run_chunks(logger, book, "embed", "clean", timings, embed, "npy")
+
+def run_enrich(logger, book, timings, models, cache, ner_processes, sentiment_processes):
+    vocabulary = None
+    # One VADER pool for every chunk of the run; it only spawns its workers
+    # on the first chunk that needs them. spaCy's nlp.pipe starts (and loads
+    # the model into) a fresh pool per call, so NER stays single-process
+    # unless --ner-processes asks otherwise.
+    pool = ProcessPoolExecutor(max_workers=sentiment_processes) if sentiment_processes > 1 else None
+
+    def enrich(i, df):
+        nonlocal vocabulary
+        if vocabulary is None:
+            # Candidate phrases are fitted on the whole corpus; only the
+            # clean_text column is read for it.
+            texts = pl.concat([pl.read_parquet(p, columns=["clean_text"]) for p in parts(book, "clean")])
+            texts = [t if isinstance(t, str) else "" for t in texts["clean_text"].to_list()]
+            vocabulary = keyword_vocabulary(logger, models.keyword_model, texts, book, cache)
+        df = add_sentiments(logger, df, pool=pool)
+        df = enrichment_NER(logger, models.nlp, df, n_process=ner_processes)
+        embeddings = np.load(part_path(book, "embed", i, "npy"), mmap_mode="r")
+        df = get_topics(logger, df, models.keyword_model, embeddings, vocabulary=vocabulary)
+        atomic_write(part_path(book, "enrich", i), df.write_parquet)
+    try:
+        run_chunks(logger, book, "enrich", "clean", timings, enrich)
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+def complete_parts(book, stage, chunks, ext="parquet"):
+    # All of a stage's partitions, or an error: stitching a partial set would
+    # misalign FAISS rows and metadata rows
+    found = parts(book, stage, ext)
+    if len(found) != chunks:
+        raise RuntimeError(f"{book}: {stage} has {len(found)} of {chunks} partitions, rerun the {stage} stage "
+                           f"before indexing")
+    return found
+
+def run_index(logger, book, timings, spec):
+    # Stitch the partitions into the files build_faiss and the search engine
+    # read, streaming vectors into a memmap and rows through a lazy scan.
+    with open(os.path.join(BOOK_DATA[book], "pipeline", "manifest.json")) as f:
+        manifest = json.load(f)
+    vector_parts = complete_parts(book, "embed", manifest["chunks"], "npy")
+    # Enrichment is optional, but a partly enriched corpus is an error
+    stage = "enrich" if parts(book, "enrich") else "clean"
+    if stage == "clean":
+        logger.info(f"{book}: no enrich partitions, indexing clean metadata")
+    metadata_parts = complete_parts(book, stage, manifest["chunks"])
+    rows = sum(np.load(p, mmap_mode="r").shape[0] for p in vector_parts)
+    if rows != manifest["rows"]:
+        raise RuntimeError(f"{book}: embed partitions hold {rows} rows, the manifest {manifest['rows']}")
+    with timings.stage(book, "index", rows):
+        d = np.load(vector_parts[0], mmap_mode="r").shape[1]
+        # A running search service may have the old embeddings mapped
+        with replacing(os.path.join(BOOK_DATA[book], f"{book}_embeddings.npy")) as tmp:
+            out = np.lib.format.open_memmap(tmp, mode="w+", dtype="float32", shape=(rows, d))
+            lo = 0
+            for p in vector_parts:
+                vectors = np.load(p, mmap_mode="r")
+                out[lo:lo + len(vectors)] = vectors
+                lo += len(vectors)
+            out.flush()
+            del out
+        keys = np.concatenate([np.load(p[:-len("npy")] + "keys.npy") for p in vector_parts])
+        save_npy(os.path.join(BOOK_DATA[book], f"{book}_keys.npy"), keys)
+        pl.scan_parquet(metadata_parts).sink_parquet(os.path.join(BOOK_DATA[book], f"{book}_metadata.parquet"))
+        build_faiss(logger, book, spec, incremental=True)
+
+class Models:
+    # Loaded on first use, so a resumed run that only has indexing left never
+    # loads torch or spaCy.
+    def __init__(self):
+        self._sentence_model = None
+        self._keyword_model = None
+        self._nlp = None
+
+    @property
+    def sentence_model(self):
+        if self._sentence_model is None:
+            self._sentence_model = load_encoder()
+        return self._sentence_model
+
+    @property
+    def keyword_model(self):
+        if self._keyword_model is None:
+            from keybert import KeyBERT
+            self._keyword_model = KeyBERT(model=self.sentence_model)
+        return self._keyword_model
+
+    @property
+    def nlp(self):
+        if self._nlp is None:
+            import spacy
+            self._nlp = spacy.load('en_core_web_sm', disable=['lemmatizer', 'tagger', 'parser'])
+        return self._nlp
+
+def run(logger, books, stages=STAGES, chunk_size=5000, batch_size=64, processes=None, ner_processes=None,
+        spec="Flat", restart=False, passages=False, partitions=0, sentiment_processes=None):
+    timings = Timings()
+    models = Models()
+    cache = EmbeddingCache()
+    with span("pipeline", logger, books=",".join(books)):
+        run_books(logger, books, stages, chunk_size, batch_size, processes, ner_processes, sentiment_processes, spec,
+                  restart, passages, partitions, timings, models, cache)
+    timings.report(logger, LOGGER_PATH / f"{app_name}_timings.json")
+    return timings
+
+def run_books(logger, books, stages, chunk_size, batch_size, processes, ner_processes, sentiment_processes, spec,
+              restart, passages, partitions, timings, models, cache):
+    for book in books:
+        if restart:
+            shutil.rmtree(os.path.join(BOOK_DATA[book], "pipeline"), ignore_errors=True)
+        if "parse" in stages:
+            run_parse(logger, book, chunk_size, timings)
+        if "clean" in stages:
+            run_clean(logger, book, timings)
+        if "embed" in stages:
+            run_embed(logger, book, timings, models, cache, batch_size, processes)
+        if "enrich" in stages:
+            run_enrich(logger, book, timings, models, cache, ner_processes or 1,
+                       sentiment_processes or os.cpu_count() or 1)
+        if "index" in stages:
+            run_index(logger, book, timings, spec)
+        if "index" in stages and passages:
+            with timings.stage(book, "passage"):
+                build_passages(logger, book, batch_size=batch_size, cache=cache, processes=processes, spec=spec)
+        if "index" in stages and partitions > 1:
+            with timings.stage(book, "partition"):
+                build_partitions(logger, book, partitions, spec=spec)
+    if "index" in stages and all(os.path.exists(os.path.join(BOOK_DATA[b], f"{b}_embeddings.npy")) for b in TRADITIONS):
+        with timings.stage(UNIFIED_BOOK, "index"):
+            build_unified_faiss(logger, spec=spec)
+
+def main():
+    parser = argparse.ArgumentParser(description="Chunked, resumable parse -> clean -> embed -> enrich -> index pipeline")
+    parser.add_argument("--books", nargs="+", default=list(BOOK_DATA), choices=list(BOOK_DATA))
+    parser.add_argument("--stages", nargs="+", default=STAGES, choices=STAGES)
+    parser.add_argument("--chunk-size", type=int, default=5000, help="Rows per checkpointed partition")
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--processes", type=int, default=None, help="Embedding worker processes")
+    parser.add_argument("--ner-processes", type=int, default=1,
+                        help="spaCy processes per enrich chunk (each chunk starts its own pool)")
+    parser.add_argument("--sentiment-processes", type=int, default=None,
+                        help="VADER worker processes, one pool for the whole run (default: all cores)")
+    parser.add_argument("--spec", default="Flat", choices=list(INDEX_SPECS))
+    parser.add_argument("--restart", action="store_true", help="Discard checkpoints and start over")
+    parser.add_argument("--passages", action="store_true",
+                        help=f"Also build the '<book>{PASSAGE_SUFFIX}' index of {PASSAGE_SIZE}-verse windows")
+    parser.add_argument("--partitions", type=int, default=0,
+                        help=f"Also hash-partition each book into N '<book>{PARTITION_INFIX}<i>of<N>' shard indexes")
+    parser.add_argument("--trace", default=None, help="Append one JSON line per finished span to this file")
+    parser.add_argument("--profile", nargs="+", default=None,
+                        help="Span names to cProfile (e.g. embed_text chunk), or 'all'; dumps go to logs/profiles")
+    args = parser.parse_args()
+
+    os.makedirs(LOGGER_PATH, exist_ok=True)
+    configure(trace=args.trace, profile=args.profile)
+    logger = get_logger(app_name, LOGGER_PATH / f'{app_name}')
+    run(logger, args.books, args.stages, args.chunk_size, args.batch_size, args.processes, args.ner_processes,
+        args.spec, args.restart, args.passages, args.partitions, args.sentiment_processes)
+
+if __name__ == "__main__":
+    main()
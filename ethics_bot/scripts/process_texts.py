@@ -1,94 +1,70 @@
-import re, requests
+import json, logging, multiprocessing, os, re
+from urllib.parse import quote
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
 import polars as pl
-from ethics_bot.utils.common import *
+from ethics_bot.utils.log import timeit
 from ethics_bot.utils.constants import *
+from ethics_bot.utils.fetch import get_fetcher
 
 RE_START = re.compile(r"\*\*\* START OF", re.IGNORECASE)
 RE_END = re.compile(r"\*\*\* END OF", re.IGNORECASE)
 RE_VERSE = re.compile(r"^(\d+):(\d+)\s+(.*)$")
 
+def read_lines(path):
+    # One read + one split in C, instead of a Python iteration per line
+    with open(path, "r", encoding="utf-8") as f:
+        return pl.Series("line", f.read().splitlines()).str.strip_chars()
+
 @timeit
 def process_bible(logger, path):
-    in_text = False
-    current_book = None
-    current_chapter = None
-    current_verse = None
-    current_text = []
-    records = []
-
-    with open(path, "r", encoding="utf-8") as f:
-        for raw in f:
-            line = raw.strip()
-
-            # --- Skip everything before "*** START" ---
-            if not in_text:
-                if RE_START.search(line):
-                    in_text = True
-                continue
-
-            # --- Stop at "*** END" ---
-            if RE_END.search(line):
-                break
-
-            # --- Check for a book header (exact match) ---
-            if line in BIBLE_BOOK_MAPPING:
-                # commit previous verse
-                if current_book and current_verse and current_text:
-                    records.append({
-                        "book": current_book,
-                        "chapter": int(current_chapter),
-                        "verse": int(current_verse),
-                        "text": " ".join(current_text).strip(),
-                    })
-
-                current_book = BIBLE_BOOK_MAPPING[line]
-                current_chapter = None
-                current_verse = None
-                current_text = []
-                continue
-
-            # --- Check for verse pattern: "X:Y text" ---
-            m = RE_VERSE.match(line)
-            if m:
-                chapter, verse, text = m.groups()
-
-                # commit previous verse
-                if current_book and current_verse is not None:
-                    records.append({
-                        "book": current_book,
-                        "chapter": int(current_chapter),
-                        "verse": int(current_verse),
-                        "text": " ".join(current_text).strip(),
-                    })
-
-                current_chapter = chapter
-                current_verse = verse
-                current_text = [text.strip()]
-                continue
-
-            # --- Continuation line ---
-            if line and current_text is not None:
-                current_text.append(line)
-
-    # --- Final commit ---
-    if current_book and current_verse and current_text:
-        records.append({
-            "book": current_book,
-            "chapter": int(current_chapter),
-            "verse": int(current_verse),
-            "text": " ".join(current_text).strip(),
-        })
-
-    df = pl.DataFrame(records)
+    lines = read_lines(path)
+
+    # Body sits between the "*** START" and "*** END" marker lines
+    start = lines.str.contains(f"(?i){RE_START.pattern}").arg_true()
+    end = lines.str.contains(f"(?i){RE_END.pattern}").arg_true()
+    lo = start[0] + 1 if len(start) else lines.len()
+    end = end.filter(end >= lo)
+    hi = end[0] if len(end) else lines.len()
+    df = pl.DataFrame(lines.slice(lo, hi - lo)).filter(pl.col("line") != "")
+
+    verse = pl.col("line").str.extract_groups(RE_VERSE.pattern)
+    df = df.with_columns(
+        pl.col("line").replace_strict(BIBLE_BOOK_MAPPING, default=None).alias("header"),
+        verse.struct.field("1").cast(pl.Int64).alias("chapter"),
+        verse.struct.field("2").cast(pl.Int64).alias("verse"),
+        verse.struct.field("3").str.strip_chars().alias("first"),
+    ).with_columns(
+        # Verse lines contribute the text after "X:Y", others the whole line
+        pl.coalesce("first", "line").alias("piece"),
+        # Every header or verse line opens a segment; continuation lines join it
+        (pl.col("header").is_not_null() | pl.col("verse").is_not_null()).cum_sum().alias("segment"),
+        pl.col("header").forward_fill().alias("book"),
+    )
+
+    df = (
+        df.filter(pl.col("segment") > 0)
+          .group_by("segment", maintain_order=True)
+          .agg(
+              pl.col("book").first(),
+              pl.col("chapter").first(),
+              pl.col("verse").first(),
+              pl.col("header").first().is_null().alias("is_verse"),
+              pl.col("piece").str.join(" ").alias("text"),
+          )
+          # Text after a book header but before its first verse is dropped
+          .filter(pl.col("is_verse") & pl.col("book").is_not_null())
+          .select(["book", "chapter", "verse", pl.col("text").str.strip_chars()])
+    )
     logger.info(f"Parsed {df.height} verses across {df['book'].n_unique()} books.")
     return df
 
-def get_raw_bible(logger):
-    resp = requests.get(GUTENBERG_KJV_URL)
+def get_raw_bible(logger, fetcher=None):
+    text = (fetcher or get_fetcher(logger)).get_text(GUTENBERG_KJV_URL)
 
     try:
         with open(BIBLE_PATH, 'w', encoding='utf-8') as file:
-            file.write(resp.text)
+            file.write(text)
             logger.info(f'Successfully written to {BIBLE_PATH}')
     except Exception as e:
         logger.error(f"Exception {e} while writing to {BIBLE_PATH}")
@@ -96,43 +72,72 @@ def get_raw_bible(logger):
 
 @timeit
 def process_quran(logger, file_path, source="Pickthall"):
-    records = []
-
-    with open(file_path, "r", encoding="utf-8") as f:
-        for raw_line in f:
-            line = raw_line.strip()
-
-            # Skip blank lines or comments
-            if not line or line.startswith("#"):
-                continue
-
-            parts = line.split("|", 2)
-            if len(parts) != 3:
-                logger.info(f"⚠️ Skipping malformed line: {line}")
-                continue
-
-            surah, ayah, text = parts
-            records.append({
-                "tradition": "Islam",
-                "book": int(surah),
-                "chapter": int(surah),
-                "verse": int(ayah),
-                "text": text.strip(),
-                "lang": "EN",
-                "source": source,
-            })
-    
-    logger.info("Processed Quran Pickthall!")
-
-    return pl.DataFrame(records)
+    # Tanzil "surah|ayah|text" lines, split column-wise
+    df = pl.DataFrame(read_lines(file_path)).filter(
+        (pl.col("line") != "") & ~pl.col("line").str.starts_with("#")
+    )
+    parts = pl.col("line").str.splitn("|", 3)
+    df = df.select(
+        parts.struct.field("field_0").str.strip_chars().cast(pl.Int64, strict=False).alias("surah"),
+        parts.struct.field("field_1").str.strip_chars().cast(pl.Int64, strict=False).alias("ayah"),
+        parts.struct.field("field_2").str.strip_chars().alias("text"),
+        pl.col("line"),
+    )
+    malformed = df.filter(pl.any_horizontal(pl.col("surah", "ayah", "text").is_null()))
+    for line in malformed["line"].head(10):
+        logger.info(f"⚠️ Skipping malformed line: {line}")
+    if malformed.height:
+        logger.info(f"Skipped {malformed.height} malformed lines")
+
+    df = df.filter(pl.all_horizontal(pl.col("surah", "ayah", "text").is_not_null())).select(
+        pl.lit("Islam").alias("tradition"),
+        pl.col("surah").alias("book"),
+        pl.col("surah").alias("chapter"),
+        pl.col("ayah").alias("verse"),
+        pl.col("text"),
+        pl.lit("EN").alias("lang"),
+        pl.lit(source).alias("source"),
+    )
+    logger.info(f"Processed Quran {source}!")
 
+    return df
 
 @timeit
-def process_gita(logger):
-    resp = requests.get(GITA_LINK)
-    logger.info(f'Status code: {resp.status_code}')
+def process_quran_simple(logger, file_path=QURAN_SIMPLE_PATH, source="Tanzil Simple Clean", lang="AR"):
+    # One ayah per line with no numbering; the position in QURAN_AYAH_COUNTS
+    # gives surah and ayah.
+    lines = pl.DataFrame(read_lines(file_path)).filter(
+        (pl.col("line") != "") & ~pl.col("line").str.starts_with("#")
+    )["line"]
+    counts = np.asarray(QURAN_AYAH_COUNTS)
+    if lines.len() != counts.sum():
+        raise ValueError(f"{file_path} has {lines.len()} ayat, expected {counts.sum()}")
+    surah = np.repeat(np.arange(1, len(counts) + 1), counts)
+    ayah = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts) + 1
+
+    df = pl.DataFrame({"surah": surah, "ayah": ayah, "text": lines}).select(
+        pl.lit("Islam").alias("tradition"),
+        pl.col("surah").cast(pl.Int64).alias("book"),
+        pl.col("surah").cast(pl.Int64).alias("chapter"),
+        pl.col("ayah").cast(pl.Int64).alias("verse"),
+        pl.col("text"),
+        pl.lit(lang).alias("lang"),
+        pl.lit(source).alias("source"),
+    )
+    logger.info(f"Processed Quran {source}: {df.height} ayat")
+    return df
 
-    df = pl.DataFrame(resp.json())
+@timeit
+def process_gita(logger, fetcher=None):
+    body = (fetcher or get_fetcher(logger)).get(GITA_LINK)
+    logger.info(f'Loaded {GITA_LINK}')
+    # Keep a data/raw copy, which offline mode serves through RAW_MIRROR
+    try:
+        with open(GITA_PATH, 'wb') as file:
+            file.write(body)
+    except Exception as e:
+        logger.error(f"Exception {e} while writing to {GITA_PATH}")
+    df = pl.DataFrame(json.loads(body))
 
     df_filtered = df.filter(pl.col('language_id') == 1).filter(pl.col('author_id') == 19).sort("verse_id")
     author_name = df_filtered.select(pl.col('authorName').unique()).item()
@@ -167,4 +172,69 @@ def process_gita(logger):
 
     logger.info(f"Processed Gita rows: {df_filtered.height}")
 
-    return df_filtered    
\ No newline at end of file
+    return df_filtered    
+
+def sefaria_verses(page):
+    # Chapter "text" is a list of verse strings; tolerate a bare string or
+    # nested lists from odd refs
+    text = page.get("text", [])
+    if isinstance(text, str):
+        return [text]
+    return [" ".join(v) if isinstance(v, list) else v for v in text]
+
+@timeit
+def process_tanakh(logger, fetcher=None, url=TANAKH_URL, chapters=TANAKH_CHAPTERS):
+    # One Sefaria request per chapter (929 of them), issued concurrently
+    # through the fetch layer so reruns are cached revalidations.
+    fetcher = fetcher or get_fetcher(logger)
+    refs = [(book, ch) for book, n in chapters.items() for ch in range(1, n + 1)]
+    pages = fetcher.get_many([url.format(quote(book.replace(" ", "_")), ch) for book, ch in refs], parse=json.loads)
+
+    books, chapter_col, verse_col, texts = [], [], [], []
+    for (book, ch), page in zip(refs, pages):
+        verses = sefaria_verses(page)
+        books.extend([book] * len(verses))
+        chapter_col.extend([ch] * len(verses))
+        verse_col.extend(range(1, len(verses) + 1))
+        texts.extend(verses)
+
+    df = pl.DataFrame({"book": books, "chapter": chapter_col, "verse": verse_col, "text": texts}).select(
+        pl.lit("Judaism").alias("tradition"),
+        pl.col("book"),
+        pl.col("chapter").cast(pl.Int64),
+        pl.col("verse").cast(pl.Int64),
+        # Sefaria English carries inline HTML (footnotes, italics)
+        pl.col("text").str.replace_all(r"<[^>]+>", "").str.strip_chars(),
+        pl.lit("EN").alias("lang"),
+        pl.lit("Sefaria").alias("source"),
+    )
+    logger.info(f"Processed Tanakh: {df.height} verses in {len(refs)} chapters ({fetcher.stats})")
+    return df
+
+PARSERS = {
+    "bible": process_bible,
+    "tanzil": process_quran,
+    "tanzil_simple": process_quran_simple,
+}
+
+def parse_source(kind, path, kwargs=None):
+    # Pool worker: loggers do not pickle, so each worker logs under its own name
+    return PARSERS[kind](logging.getLogger("process_texts"), path, **(kwargs or {}))
+
+@timeit
+def parse_sources(logger, sources, processes=None, min_pool_bytes=32_000_000):
+    # sources: (kind, path[, kwargs]) per file, e.g. one per translation.
+    # Files are independent, so they parse in parallel once there is enough
+    # input to amortise starting the workers.
+    sources = [(s[0], s[1], s[2] if len(s) > 2 else None) for s in sources]
+    processes = min(processes or os.cpu_count() or 1, len(sources))
+    if sum(os.path.getsize(s[1]) for s in sources) < min_pool_bytes:
+        processes = 1
+    if processes > 1:
+        # spawn, not fork: a forked child can inherit Polars' thread pool locks held
+        with ProcessPoolExecutor(max_workers=processes, mp_context=multiprocessing.get_context("spawn")) as pool:
+            frames = list(pool.map(parse_source, *zip(*sources)))
+    else:
+        frames = [parse_source(*s) for s in sources]
+    logger.info(f"Parsed {len(sources)} files ({sum(f.height for f in frames)} rows) on {processes} processes")
+    return frames
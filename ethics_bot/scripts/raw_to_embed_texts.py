@@ -1,24 +1,31 @@
-import logging, requests, time, os
-from functools import wraps
-import numpy as np
-import polars as pl
-from logging.handlers import RotatingFileHandler
-from colorama import Fore, Style
-import xml.etree.ElementTree as ET 
-from sentence_transformers import SentenceTransformer
+import argparse
 from ethics_bot.utils.constants import *
-from ethics_bot.utils.common import *
-from ethics_bot.scripts.process_texts import *
+from ethics_bot.utils.common import EmbeddingCache, clean_and_embed_text, get_logger
+from ethics_bot.scripts.process_texts import process_bible, process_gita, process_quran
 
 app_name = "raw_to_embed_texts"
-logger = get_logger(__file__, LOGGER_PATH / f'{app_name}')
 
-df_bible = process_bible(logger, BIBLE_PATH)
-df_bible.head()
-clean_and_embed_text(logger, df_bible, 'bible')
-df_quran = process_quran(logger, QURAN_PICKTHALL_PATH)
-df_quran.head()
-clean_and_embed_text(logger, df_quran, 'quran_english')
-df_gita = process_gita(logger)
-df_gita.head()
-clean_and_embed_text(logger, df_gita, 'gita_english')
\ No newline at end of file
+def main():
+    parser = argparse.ArgumentParser(description="Parse, clean and embed every corpus")
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--processes", type=int, default=1,
+                        help="Embedding worker processes (1 = single process)")
+    args = parser.parse_args()
+
+    logger = get_logger(__file__, LOGGER_PATH / f'{app_name}')
+    cache = EmbeddingCache()
+
+    df_bible = process_bible(logger, BIBLE_PATH)
+    df_bible.head()
+    clean_and_embed_text(logger, df_bible, 'bible', cache, args.batch_size, args.processes)
+    df_quran = process_quran(logger, QURAN_PICKTHALL_PATH)
+    df_quran.head()
+    clean_and_embed_text(logger, df_quran, 'quran_english', cache, args.batch_size, args.processes)
+    df_gita = process_gita(logger)
+    df_gita.head()
+    clean_and_embed_text(logger, df_gita, 'gita_english', cache, args.batch_size, args.processes)
+
+# The embedding pool spawns workers that re-import this module; the guard
+# keeps them from re-running the whole job
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,25 @@
+import argparse, os, sys
+from ethics_bot.utils.common import get_logger
+from ethics_bot.utils.constants import *
+from ethics_bot.utils.shards import ShardServer, listen, shard_books
+
+app_name = "shard_worker"
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve a set of books as one shard for ShardedSearch coordinators")
+    parser.add_argument("--books", nargs="+", default=None,
+                        help="Books or partitions to serve (default: every built corpus, partitions preferred)")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=SHARD_PORT)
+    parser.add_argument("--threads", type=int, help="FAISS OpenMP threads (default: all cores)")
+    parser.add_argument("--no-mmap", action="store_true", help="Read indexes into memory instead of mapping them")
+    args = parser.parse_args()
+
+    logger = get_logger(app_name, LOGGER_PATH / f'{app_name}')
+    authkey = os.environ.get("ETHICS_BOT_SHARD_KEY")
+    if not authkey:
+        logger.error("Set ETHICS_BOT_SHARD_KEY to the key shared with the coordinator")
+        sys.exit(1)
+    server = ShardServer(args.books or shard_books(), not args.no_mmap, args.threads, logger)
+    logger.info(f"Serving {server.info()} on {args.host}:{args.port}")
+    listen(server, (args.host, args.port), authkey.encode(), logger)
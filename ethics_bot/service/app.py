@@ -0,0 +1,184 @@
+import argparse, os
+from contextlib import asynccontextmanager
+from typing import List, Optional, Tuple
+from fastapi import FastAPI, HTTPException, Query
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import PlainTextResponse
+from pydantic import BaseModel, Field
+from ethics_bot.utils.common import get_logger
+from ethics_bot.utils.constants import *
+from ethics_bot.utils.instrument import gauge, peak_rss_bytes, prometheus_text
+from ethics_bot.utils.search import get_engine
+from ethics_bot.utils.shards import ShardedSearch
+from ethics_bot.service.batcher import MicroBatcher
+
+app_name = "search_service"
+logger = get_logger(app_name, LOGGER_PATH / f'{app_name}')
+
+MAX_BATCH = int(os.environ.get("ETHICS_BOT_MAX_BATCH", 64))
+MAX_WAIT_MS = float(os.environ.get("ETHICS_BOT_MAX_WAIT_MS", 5))
+MMAP = os.environ.get("ETHICS_BOT_MMAP", "1") != "0"
+QUERY_CACHE = int(os.environ.get("ETHICS_BOT_QUERY_CACHE", QUERY_CACHE_SIZE))
+RESULT_CACHE = int(os.environ.get("ETHICS_BOT_RESULT_CACHE", RESULT_CACHE_SIZE))
+RESULT_TTL = float(os.environ.get("ETHICS_BOT_RESULT_TTL", RESULT_CACHE_TTL))
+METRICS = os.environ.get("ETHICS_BOT_METRICS", "1") != "0"
+# Sharded search: a number of local shard processes, or comma-separated
+# host:port addresses of shard_worker processes. Unset = off.
+SHARDS = os.environ.get("ETHICS_BOT_SHARDS", "")
+SHARD_TIMEOUT_SEC = float(os.environ.get("ETHICS_BOT_SHARD_TIMEOUT", SHARD_TIMEOUT))
+
+def available_books():
+    books = os.environ.get("ETHICS_BOT_BOOKS")
+    books = books.split(",") if books else list(BOOK_DATA) + [f"{b}{PASSAGE_SUFFIX}" for b in BOOK_DATA] + [UNIFIED_BOOK]
+    return [b for b in books if os.path.exists(os.path.join(DATA_ROOT, b, f'{b}_index.faiss'))]
+
+engine = get_engine(logger, mmap=MMAP, query_cache_size=QUERY_CACHE, result_cache_size=RESULT_CACHE, result_ttl=RESULT_TTL)
+batcher = MicroBatcher(engine, max_batch=MAX_BATCH, max_wait_ms=MAX_WAIT_MS)
+sharded = None
+
+def start_shards():
+    if SHARDS.isdigit():
+        return ShardedSearch.local(int(SHARDS), logger=logger, timeout=SHARD_TIMEOUT_SEC, engine=engine)
+    return ShardedSearch(SHARDS.split(","), logger, SHARD_TIMEOUT_SEC, engine)
+
+@asynccontextmanager
+async def lifespan(app):
+    global sharded
+    # With shards on, the books live in the shard processes; this process
+    # only encodes, unless ETHICS_BOT_BOOKS asks for local books too
+    local = available_books() if not SHARDS or os.environ.get("ETHICS_BOT_BOOKS") else []
+    await run_in_threadpool(engine.warmup, local)
+    if SHARDS:
+        sharded = await run_in_threadpool(start_shards)
+    await batcher.start()
+    logger.info(f"Serving {list(engine.indexes)} (max_batch={MAX_BATCH}, max_wait_ms={MAX_WAIT_MS})"
+                + (f", {len(sharded.shards)} shards" if sharded else ""))
+    yield
+    await batcher.stop()
+    if sharded:
+        sharded.close()
+
+app = FastAPI(title="ethics_bot retrieval", lifespan=lifespan)
+
+class Filters(BaseModel):
+    traditions: Optional[List[str]] = None
+    books: Optional[List[str]] = None
+    chapters: Optional[Tuple[int, int]] = None
+    hybrid: bool = False
+    boost: float = Field(0.0, ge=0)
+
+class SearchRequest(Filters):
+    query: str
+    book: str = "gita_english"
+    k: int = Field(5, ge=1, le=100)
+
+class BatchSearchRequest(Filters):
+    queries: List[str]
+    book: str = "gita_english"
+    k: int = Field(5, ge=1, le=100)
+
+class ShardedSearchRequest(Filters):
+    query: str
+    k: int = Field(5, ge=1, le=100)
+    corpora: Optional[List[str]] = None
+
+def filters_of(req):
+    return req.model_dump(include={"traditions", "books", "chapters", "hybrid", "boost"})
+
+def check_book(book):
+    if book not in engine.indexes:
+        raise HTTPException(status_code=404, detail=f"Unknown book {book!r}, available: {list(engine.indexes)}")
+
+@app.post("/search")
+async def search(req: SearchRequest):
+    check_book(req.book)
+    return {"results": await batcher.submit(req.query, req.book, req.k, **filters_of(req))}
+
+@app.post("/search/batch")
+async def search_batch(req: BatchSearchRequest):
+    # Already a batch: skip the batcher and go straight to search_many
+    check_book(req.book)
+    df = await run_in_threadpool(engine.search_many, req.queries, req.book, req.k, **filters_of(req))
+    results = [[] for _ in req.queries]
+    for hit in df.select(["query_id"] + engine.hit_columns(req.book)).iter_rows(named=True):
+        results[hit.pop("query_id")].append(hit)
+    return {"results": results}
+
+@app.post("/search/sharded")
+async def search_sharded(req: ShardedSearchRequest):
+    # Global top-k over every shard (or the shards holding `corpora`);
+    # missing_shards names shards that failed or timed out
+    if sharded is None:
+        raise HTTPException(status_code=404, detail="Sharded search is off (set ETHICS_BOT_SHARDS)")
+    try:
+        hits, missing = await run_in_threadpool(sharded.search, req.query, req.k, req.corpora, **filters_of(req))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"results": hits, "missing_shards": missing}
+
+@app.get("/verse")
+async def verse(ref: str, book: Optional[str] = None, window: int = Query(0, ge=0, le=50)):
+    # Direct lookup ("John 3:16", "Quran 2:255", "Genesis 1:1-5") with optional context verses
+    try:
+        return {"results": await run_in_threadpool(engine.get_verse, ref, book, window)}
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except (KeyError, FileNotFoundError):
+        raise HTTPException(status_code=404, detail=f"No verse matches {ref!r}")
+
+@app.get("/related")
+async def related(ref: str, book: Optional[str] = None, k: int = Query(5, ge=1, le=RELATED_K),
+                  corpora: Optional[List[str]] = Query(None)):
+    # Precomputed parallels of a verse in the other scriptures (build_related)
+    def lookup():
+        verse = engine.get_verse(ref, book)[0]
+        return {"verse": verse, "results": engine.related(verse, k=k, corpora=corpora)}
+    try:
+        return await run_in_threadpool(lookup)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"No verse matches {ref!r} in the related graph")
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="No related graph, run build_related first")
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+@app.get("/health")
+async def health():
+    return {
+        "status": "ok",
+        "model_loaded": engine._model is not None,
+        # list() snapshots the dict in one step; a reload may swap entries meanwhile
+        "books": {book: index.ntotal for book, index in list(engine.indexes.items())},
+        "queue_depth": batcher.queue.qsize() if batcher.queue else 0,
+        "batches": batcher.batches,
+        "batched_requests": batcher.requests,
+        "caches": engine.cache_stats(),
+        "shards": sharded.stats() if sharded else None,
+    }
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    # Prometheus scrape target: span latencies, counters and gauges from the
+    # instrument registry, plus point-in-time service state set just before rendering.
+    if not METRICS:
+        raise HTTPException(status_code=404, detail="Metrics disabled (ETHICS_BOT_METRICS=0)")
+    gauge("queue_depth", batcher.queue.qsize() if batcher.queue else 0)
+    gauge("batches", batcher.batches)
+    gauge("batched_requests", batcher.requests)
+    gauge("model_loaded", int(engine._model is not None))
+    gauge("peak_rss_bytes", peak_rss_bytes())  # hot per-query spans no longer sample it
+    for name, stats in engine.cache_stats().items():
+        for key in ("size", "hits", "misses", "hit_rate", "evictions", "expirations"):
+            gauge(f"cache_{name}_{key}", stats[key])
+    return PlainTextResponse(prometheus_text(), media_type="text/plain; version=0.0.4")
+
+if __name__ == "__main__":
+    import uvicorn
+    parser = argparse.ArgumentParser(description="Run the retrieval service")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=1)
+    args = parser.parse_args()
+    uvicorn.run("ethics_bot.service.app:app", host=args.host, port=args.port, workers=args.workers)
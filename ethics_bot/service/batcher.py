@@ -0,0 +1,110 @@
+import asyncio
+from collections import defaultdict
+from ethics_bot.utils.instrument import incr, span
+
+def filter_key(filters):
+    return tuple(sorted((name, tuple(value) if isinstance(value, (list, tuple)) else value)
+                        for name, value in filters.items() if value is not None))
+
+class MicroBatcher:
+    # Collects concurrent /search requests for up to max_wait_ms (or max_batch
+    # requests) and serves them with one encode and one index.search per book.
+    def __init__(self, engine, max_batch=64, max_wait_ms=5):
+        self.engine = engine
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000
+        self.queue = None
+        self._task = None
+        self.batches = 0
+        self.requests = 0
+
+    async def start(self):
+        self.queue = asyncio.Queue()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def submit(self, query, book, k=5, **filters):
+        # Cached answers never enter the queue. Only a dict lookup here: the
+        # freshness check may reload a book, which belongs in the executor.
+        hits = self.engine.cached_results(query, book, k, filters)
+        if hits is not None:
+            return hits
+        fut = asyncio.get_running_loop().create_future()
+        await self.queue.put((query, book, k, filters, fut))
+        return await fut
+
+    async def _collect(self):
+        loop = asyncio.get_running_loop()
+        batch = [await self.queue.get()]
+        deadline = loop.time() + self.max_wait
+        while len(batch) < self.max_batch:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._collect()
+            pending = [item for item in batch if not item[-1].done()]
+            if not pending:
+                continue
+            try:
+                # Model and FAISS calls release the GIL; keep them off the event loop
+                results = await loop.run_in_executor(None, self._process, pending)
+            except Exception as e:
+                for *_, fut in pending:
+                    if not fut.done():
+                        fut.set_exception(e)
+                continue
+
+            self.batches += 1
+            self.requests += len(pending)
+            for (*_, fut), result in zip(pending, results):
+                if not fut.done():
+                    fut.set_result(result)
+
+    def _process(self, batch):
+        incr("queries", len(batch))
+        # Reload rebuilt books before taking the read lock a reload waits on
+        for book in {book for _, book, *_ in batch}:
+            self.engine.check_fresh(book)
+        with self.engine.lock.read(), span("batch", rows=len(batch), hot=True):
+            return self._search_batch(batch)
+
+    def _search_batch(self, batch):
+        queries = [query for query, *_ in batch]
+        qvecs = self.engine.encode(queries)
+
+        # Requests sharing a book, k and filter set share one index.search.
+        # k stays in the key: rerank specs shortlist k * rerank candidates, so
+        # a larger k could change a smaller request's hits (and its cache entry)
+        groups = defaultdict(list)
+        for pos, (_, book, k, filters, _) in enumerate(batch):
+            groups[(book, k, filter_key(filters))].append(pos)
+
+        results = [None] * len(batch)
+        for (book, k, _), positions in groups.items():
+            filters = batch[positions[0]][3]
+            group_queries = [queries[pos] for pos in positions]
+            distances, indices = self.engine.search_vectors(qvecs[positions], book, k, queries=group_queries, **filters)
+            df = self.engine.join_results(group_queries, book, distances, indices)
+            for query_id, hits in df.partition_by("query_id", as_dict=True).items():
+                pos = positions[query_id[0]]
+                results[pos] = hits.select(self.engine.hit_columns(book)).to_dicts()
+                self.engine.store_results(queries[pos], book, k, filters, results[pos])
+
+        return [r if r is not None else [] for r in results]
@@ -0,0 +1,25 @@
+import os
+from contextlib import contextmanager
+import numpy as np
+
+# Files that readers memory-map (FAISS indexes, embeddings, the related
+# graph) are written to a sibling temp file and renamed over the old one. A
+# process that has the old file mapped keeps its inode; truncating and
+# rewriting it in place kills that process with SIGBUS.
+
+@contextmanager
+def replacing(path):
+    # Yields the temp path to write; it replaces `path` only on success
+    path = str(path)
+    tmp = os.path.join(os.path.dirname(path), f".{os.path.basename(path)}.{os.getpid()}.tmp")
+    try:
+        yield tmp
+        os.replace(tmp, path)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+def save_npy(path, array):
+    # np.save to a file object: given a name it would append ".npy" to the temp path
+    with replacing(path) as tmp, open(tmp, "wb") as f:
+        np.save(f, array)
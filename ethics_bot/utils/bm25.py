@@ -0,0 +1,120 @@
+import re
+import numpy as np
+from ethics_bot.utils.constants import *
+
+TOKEN = re.compile(r"[a-z0-9]+")
+
+def tokenize(text):
+    return TOKEN.findall(text.lower()) if isinstance(text, str) else []
+
+def csr_postings(docs, vocab):
+    # docs are token lists; returns (indptr, doc_ids, counts) sorted by term
+    # then doc, built from flat arrays rather than per-term Python lists.
+    term_ids, doc_ids = [], []
+    for doc_id, tokens in enumerate(docs):
+        for token in tokens:
+            term_ids.append(vocab.setdefault(token, len(vocab)))
+            doc_ids.append(doc_id)
+    n_docs = max(len(docs), 1)
+    pairs = np.asarray(term_ids, dtype=np.int64) * n_docs + np.asarray(doc_ids, dtype=np.int64)
+    pairs, counts = np.unique(pairs, return_counts=True)
+    terms = pairs // n_docs
+    indptr = np.zeros(len(vocab) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(terms, minlength=len(vocab)), out=indptr[1:])
+    return indptr, (pairs % n_docs).astype(np.int32), counts.astype(np.float32)
+
+class BM25Index:
+    # Inverted index over clean_text with the BM25 term weight precomputed per
+    # posting, so a query is a few array slices and one scatter-add. A second,
+    # unweighted postings list holds the NER/keyword terms used for boosting.
+    def __init__(self, terms, indptr, doc_ids, weights, entity_terms, entity_indptr, entity_doc_ids, n_docs):
+        self.vocab = {t: i for i, t in enumerate(terms)}
+        self.indptr = indptr
+        self.doc_ids = doc_ids
+        self.weights = weights
+        self.entity_vocab = {t: i for i, t in enumerate(entity_terms)}
+        self.entity_indptr = entity_indptr
+        self.entity_doc_ids = entity_doc_ids
+        self.n_docs = int(n_docs)
+
+    @classmethod
+    def build(cls, texts, entities=None, k1=BM25_K1, b=BM25_B):
+        docs = [tokenize(t) for t in texts]
+        vocab = {}
+        indptr, doc_ids, tf = csr_postings(docs, vocab)
+        doc_len = np.array([len(d) for d in docs], dtype=np.float32)
+        avgdl = doc_len.mean() if len(docs) and doc_len.mean() > 0 else 1.0
+        df = np.diff(indptr).astype(np.float32)
+        idf = np.log1p((len(docs) - df + 0.5) / (df + 0.5))
+        norm = k1 * (1 - b + b * doc_len[doc_ids] / avgdl)
+        weights = (np.repeat(idf, np.diff(indptr)) * tf * (k1 + 1) / (tf + norm)).astype(np.float32)
+
+        entity_vocab = {}
+        entity_docs = [sorted({t for e in (ents if ents is not None else []) for t in tokenize(e)})
+                       for ents in (entities if entities is not None else [[]] * len(docs))]
+        entity_indptr, entity_doc_ids, _ = csr_postings(entity_docs, entity_vocab)
+        return cls(list(vocab), indptr, doc_ids, weights, list(entity_vocab), entity_indptr, entity_doc_ids, len(docs))
+
+    def save(self, path):
+        np.savez(path, terms=np.array(list(self.vocab), dtype=str), indptr=self.indptr, doc_ids=self.doc_ids,
+                 weights=self.weights, entity_terms=np.array(list(self.entity_vocab), dtype=str),
+                 entity_indptr=self.entity_indptr, entity_doc_ids=self.entity_doc_ids, n_docs=self.n_docs)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as z:
+            return cls(z["terms"].tolist(), z["indptr"], z["doc_ids"], z["weights"], z["entity_terms"].tolist(),
+                       z["entity_indptr"], z["entity_doc_ids"], z["n_docs"])
+
+    def nbytes(self):
+        return sum(a.nbytes for a in (self.indptr, self.doc_ids, self.weights, self.entity_indptr, self.entity_doc_ids))
+
+    def scores(self, query):
+        scores = np.zeros(self.n_docs, dtype=np.float32)
+        for term in set(tokenize(query)):
+            t = self.vocab.get(term)
+            if t is not None:
+                lo, hi = self.indptr[t], self.indptr[t + 1]
+                # A doc appears once per term, so fancy += does not drop hits
+                scores[self.doc_ids[lo:hi]] += self.weights[lo:hi]
+        return scores
+
+    def search(self, queries, k, mask=None):
+        distances = np.full((len(queries), k), -np.inf, dtype=np.float32)
+        indices = np.full((len(queries), k), -1, dtype=np.int64)
+        for qi, query in enumerate(queries):
+            scores = self.scores(query)
+            if mask is not None:
+                scores[~mask] = 0
+            hits = np.flatnonzero(scores)
+            if len(hits) > k:
+                hits = hits[np.argpartition(-scores[hits], k - 1)[:k]]
+            hits = hits[np.argsort(-scores[hits], kind="stable")]
+            distances[qi, :len(hits)] = scores[hits]
+            indices[qi, :len(hits)] = hits
+        return distances, indices
+
+    def entity_matches(self, query):
+        # Doc ids whose NER/keyword terms contain any query term
+        found = []
+        for term in set(tokenize(query)):
+            t = self.entity_vocab.get(term)
+            if t is not None:
+                found.append(self.entity_doc_ids[self.entity_indptr[t]:self.entity_indptr[t + 1]])
+        return np.unique(np.concatenate(found)) if found else np.empty(0, dtype=np.int32)
+
+def rrf_fuse(rankings, k, rrf_k=RRF_K, boost_ids=None, boost=0.0):
+    # rankings: id arrays, best first, -1 padded. Each contributes
+    # 1 / (rrf_k + rank); boosted ids get boost more first-rank credit.
+    ids = np.concatenate([r[r != -1] for r in rankings])
+    credit = np.concatenate([1.0 / (rrf_k + 1 + np.flatnonzero(r != -1)) for r in rankings])
+    ids, inverse = np.unique(ids, return_inverse=True)
+    fused = np.bincount(inverse, weights=credit, minlength=len(ids))
+    if boost and boost_ids is not None and len(boost_ids):
+        fused += boost * np.isin(ids, boost_ids) / (rrf_k + 1)
+    order = np.argsort(-fused, kind="stable")[:k]
+    scores = np.full(k, -np.inf, dtype=np.float32)
+    out = np.full(k, -1, dtype=np.int64)
+    scores[:len(order)] = fused[order]
+    out[:len(order)] = ids[order]
+    return scores, out
@@ -0,0 +1,316 @@
+import json, os, shutil, sys, time, zlib
+import numpy as np
+import polars as pl
+from ethics_bot.utils.constants import *
+from ethics_bot.utils.indexing import *
+from ethics_bot.utils.atomic import replacing, save_npy
+from ethics_bot.utils.bm25 import BM25Index
+from ethics_bot.utils.references import ReferenceIndex
+from ethics_bot.utils.related import RelatedGraph, knn_join
+from ethics_bot.utils.instrument import span
+from ethics_bot.utils.log import timeit
+
+def write_faiss(logger, sources, index_path, spec="Flat", chunk_size=65536):
+    # sources are (possibly mmapped) embedding arrays, added chunk by chunk so
+    # peak memory stays at one chunk rather than a full float32 copy.
+    n = sum(len(e) for e in sources)
+    spec = fit_spec(resolve_spec(spec), n)
+    d = sources[0].shape[1]
+    logger.info(f"Embedding dimension: {d}")
+
+    logger.info(f"Creating FAISS {factory_string(spec)} index (cosine similarity)...")
+    start = time.perf_counter()
+    index = make_index(d, spec)
+
+    if not index.is_trained:
+        sample = training_sample(sources, min(n, 100_000))
+        logger.info(f"Training on {len(sample)} vectors...")
+        index.train(sample)
+
+    logger.info("Adding vectors to index...")
+    for embeddings in sources:
+        for lo in range(0, len(embeddings), chunk_size):
+            add_vectors(index, spec, unit_rows(embeddings[lo:lo + chunk_size]))
+    spec["build_sec"] = round(time.perf_counter() - start, 4)
+    spec["ntotal"] = index.ntotal
+
+    logger.info(f"Saving FAISS index to {index_path}...")
+    write_index(index, index_path, spec)
+    save_spec(index_path, spec)
+    return index
+
+def add_faiss_delta(logger, embeddings, index_path, spec, keys, built_keys, chunk_size=65536):
+    # Rows appended since the last build are added to the existing index.
+    # Anything else (edited or removed rows, new spec) needs a full rebuild.
+    n_old = len(built_keys)
+    if n_old > len(keys) or not np.array_equal(keys[:n_old], built_keys):
+        logger.info("Existing rows changed since the last build, rebuilding from scratch")
+        return None
+    saved_spec = load_spec(index_path)
+    if saved_spec["type"] != resolve_spec(spec)["type"]:
+        logger.info(f"Index type changed from {saved_spec['type']}, rebuilding from scratch")
+        return None
+    index = read_index(index_path, saved_spec, mmap=False)
+    if index.ntotal != n_old:
+        return None
+
+    for lo in range(n_old, len(embeddings), chunk_size):
+        add_vectors(index, saved_spec, unit_rows(embeddings[lo:lo + chunk_size]))
+    logger.info(f"Added {index.ntotal - n_old} new vectors to existing index")
+
+    saved_spec["ntotal"] = index.ntotal
+    write_index(index, index_path, saved_spec)
+    save_spec(index_path, saved_spec)
+    return index
+
+def entity_terms(metadata):
+    # Per-row NER + keyword strings, the terms hybrid search can boost on
+    cols = [c for c in ("ner", "keywords") if c in metadata.columns]
+    if not cols:
+        return None
+    return [[e for values in row if values for e in values] for row in zip(*(metadata[c].to_list() for c in cols))]
+
+def write_bm25(logger, texts, entities, path):
+    start = time.perf_counter()
+    lexical = BM25Index.build(texts, entities)
+    lexical.save(path)
+    logger.info(f"BM25 index: {len(lexical.vocab)} terms, {len(lexical.doc_ids)} postings, "
+                f"{lexical.nbytes() / 1e6:.2f} MB in {time.perf_counter() - start:.2f} sec")
+    return lexical
+
+@timeit
+def build_bm25(logger, book):
+    metadata = pl.read_parquet(os.path.join(BOOK_DATA[book], f'{book}_metadata.parquet'))
+    text_col = "clean_text" if "clean_text" in metadata.columns else "text"
+    return write_bm25(logger, metadata[text_col].to_list(), entity_terms(metadata),
+                      os.path.join(BOOK_DATA[book], f'{book}_bm25.npz'))
+
+@timeit
+def build_refs(logger, book, metadata=None):
+    # (book, chapter, verse) -> row id and chapter spans for get_verse/expand
+    if metadata is None:
+        metadata = pl.read_parquet(os.path.join(BOOK_DATA[book], f'{book}_metadata.parquet'),
+                                   columns=["book", "chapter", "verse"])
+    refs = ReferenceIndex.build(metadata["book"].to_list(), metadata["chapter"].to_numpy(), metadata["verse"].to_numpy())
+    refs.save(os.path.join(BOOK_DATA[book], f'{book}_refs.npz'))
+    logger.info(f"Reference index: {len(refs.books)} books, {len(refs.run_start)} chapters, "
+                f"{refs.nbytes() / 1e6:.2f} MB")
+    return refs
+
+def passage_book(book):
+    return f"{book}{PASSAGE_SUFFIX}"
+
+@timeit
+def build_passages(logger, book, size=PASSAGE_SIZE, stride=PASSAGE_STRIDE, batch_size=64, cache=None, processes=None,
+                   spec="Flat"):
+    # Optional passage-level corpus: windows of `size` consecutive verses
+    # (never crossing a chapter) embedded as one text, stored as its own
+    # searchable book '<book>_passages' whose rows keep the verse span.
+    from ethics_bot.utils.embedding import embed_chunk
+    metadata = pl.read_parquet(os.path.join(BOOK_DATA[book], f'{book}_metadata.parquet'))
+    refs = ReferenceIndex.build(metadata["book"].to_list(), metadata["chapter"].to_numpy(), metadata["verse"].to_numpy())
+    spans = refs.passages(size, stride)
+    lo = np.array([s for s, _ in spans], dtype=np.int64)
+    hi = np.array([e for _, e in spans], dtype=np.int64)
+    texts = metadata["clean_text"].to_list()
+    passage_texts = [" ".join(texts[s:e]) for s, e in spans]
+    logger.info(f"{book}: {len(spans)} passages of up to {size} verses (stride {stride})")
+
+    passages = metadata.select([
+        pl.col("tradition") if "tradition" in metadata.columns else pl.lit(TRADITIONS.get(book), dtype=pl.String).alias("tradition"),
+        pl.col("book"),
+        pl.col("chapter"),
+        pl.col("verse"),
+    ]).select(pl.all().gather(lo)).with_columns(
+        pl.Series("verse_end", metadata["verse"].to_numpy()[hi - 1]),
+        pl.Series("row_start", lo),
+        pl.Series("row_end", hi),
+        pl.Series("clean_text", passage_texts, dtype=pl.String),
+    )
+    embeddings, _ = embed_chunk(logger, passage_texts, batch_size, cache, processes)
+
+    out = passage_book(book)
+    os.makedirs(os.path.join(DATA_ROOT, out), exist_ok=True)
+    save_npy(os.path.join(DATA_ROOT, out, f"{out}_embeddings.npy"), embeddings)
+    passages.write_parquet(os.path.join(DATA_ROOT, out, f"{out}_metadata.parquet"))
+    index = write_faiss(logger, [embeddings], os.path.join(DATA_ROOT, out, f"{out}_index.faiss"), spec)
+    write_bm25(logger, passage_texts, None, os.path.join(DATA_ROOT, out, f"{out}_bm25.npz"))
+    invalidate_engine(out)
+    logger.info(f"Done! Total passages = {index.ntotal}")
+
+def partition_book(book, part, parts):
+    return f"{book}{PARTITION_INFIX}{part}of{parts}"
+
+def partition_of(metadata, parts):
+    # Stable part per verse: a hash of its reference, not its row position,
+    # so re-parsing or appending to a corpus leaves existing verses in place
+    keys = metadata.select(pl.format("{}|{}|{}", "book", "chapter", "verse")).to_series().to_list()
+    return np.array([zlib.crc32(key.encode()) % parts for key in keys], dtype=np.int32)
+
+@timeit
+def build_partitions(logger, book, parts, spec="Flat"):
+    # Hash-partition a corpus into `parts` books '<book>_part<i>of<n>', each
+    # a regular searchable book whose rows keep their source row id, so
+    # shards of one large corpus can live in different worker processes.
+    metadata = pl.read_parquet(os.path.join(BOOK_DATA[book], f'{book}_metadata.parquet'))
+    embeddings = np.load(os.path.join(BOOK_DATA[book], f'{book}_embeddings.npy'), mmap_mode="r")
+    if "tradition" not in metadata.columns:
+        metadata = metadata.with_columns(pl.lit(TRADITIONS.get(book), dtype=pl.String).alias("tradition"))
+    assignment = partition_of(metadata, parts)
+    entities = entity_terms(metadata)
+    for part in range(parts):
+        rows = np.flatnonzero(assignment == part)
+        out = partition_book(book, part, parts)
+        logger.info(f"{out}: {len(rows)} of {metadata.height} verses")
+        os.makedirs(os.path.join(DATA_ROOT, out), exist_ok=True)
+        subset = np.ascontiguousarray(embeddings[rows])
+        save_npy(os.path.join(DATA_ROOT, out, f"{out}_embeddings.npy"), subset)
+        part_metadata = metadata[rows].with_columns(pl.Series("source_row", rows, dtype=pl.Int64))
+        part_metadata.write_parquet(os.path.join(DATA_ROOT, out, f"{out}_metadata.parquet"))
+        write_faiss(logger, [subset], os.path.join(DATA_ROOT, out, f"{out}_index.faiss"), spec)
+        write_bm25(logger, part_metadata["clean_text"].to_list(), entities and [entities[r] for r in rows],
+                   os.path.join(DATA_ROOT, out, f"{out}_bm25.npz"))
+        invalidate_engine(out)
+
+@timeit
+def build_related(logger, books=tuple(TRADITIONS), k=RELATED_K, same_corpus=False, min_score=None, block=RELATED_BLOCK,
+                  threads=None, root=RELATED_DATA, embeddings=None):
+    # Blocked all-pairs join of every corpus against every other one (and
+    # itself when same_corpus) over the stored embeddings, written as one CSR
+    # graph: each verse keeps its top k per target corpus, best first overall.
+    # embeddings (book -> array) overrides the stored ones, e.g. benchmarks.
+    import faiss
+    if threads:
+        faiss.omp_set_num_threads(threads)
+    if embeddings is None:
+        embeddings = {}
+        for b in books:
+            path = os.path.join(BOOK_DATA[b], f'{b}_embeddings.npy')
+            if not os.path.exists(path):
+                logger.warning(f"No embeddings for {b}, leaving it out of the related graph")
+                continue
+            embeddings[b] = np.load(path, mmap_mode="r")
+    books = list(embeddings)
+    sizes = [len(e) for e in embeddings.values()]
+    offsets = dict(zip(books, np.cumsum([0] + sizes[:-1]).tolist()))
+    n = sum(sizes)
+    os.makedirs(root, exist_ok=True)
+    paths = RelatedGraph.paths(root)
+    indptr = np.zeros(n + 1, dtype=np.int64)
+    nnz = 0
+    with open(paths["ids.bin"] + ".tmp", "wb") as ids_out, open(paths["scores.bin"] + ".tmp", "wb") as scores_out:
+        for source in books:
+            targets = [t for t in books if t != source or same_corpus]
+            if not targets:
+                continue
+            with span("related_join", logger, rows=len(embeddings[source]), source=source, targets=",".join(targets)):
+                # One generator per target, advanced in lockstep over the source's query blocks
+                joins = [knn_join(embeddings[source], embeddings[t], k, block, block, exclude_self=t == source)
+                         for t in targets]
+                for parts in zip(*joins):
+                    qlo = parts[0][0]
+                    D = np.hstack([d for _, d, _ in parts])
+                    I = np.hstack([i + offsets[t] for t, (_, _, i) in zip(targets, parts)])
+                    order = np.argsort(-D, axis=1, kind="stable")
+                    D = np.take_along_axis(D, order, axis=1)
+                    I = np.take_along_axis(I, order, axis=1)
+                    keep = np.ones(D.shape, dtype=bool) if min_score is None else D >= min_score
+                    I[keep].astype(np.int32).tofile(ids_out)
+                    D[keep].astype(np.float16).tofile(scores_out)
+                    gid = offsets[source] + qlo
+                    indptr[gid + 1:gid + 1 + len(D)] = nnz + np.cumsum(keep.sum(axis=1))
+                    nnz += int(keep.sum())
+            # Sources without targets keep empty rows
+            indptr[offsets[source] + len(embeddings[source]) + 1:] = nnz
+    meta = {"corpora": list(books), "offsets": [offsets[b] for b in books], "rows": sizes, "n": n, "nnz": nnz, "k": k,
+            "same_corpus": same_corpus, "min_score": min_score}
+    # Readers keep the old graph mapped: every file is replaced, none rewritten
+    with open(paths["indptr.npy"] + ".tmp", "wb") as f:
+        np.save(f, indptr)
+    os.replace(paths["indptr.npy"] + ".tmp", paths["indptr.npy"])
+    os.replace(paths["ids.bin"] + ".tmp", paths["ids.bin"])
+    os.replace(paths["scores.bin"] + ".tmp", paths["scores.bin"])
+    with open(paths["meta.json"] + ".tmp", "w") as f:
+        json.dump(meta, f)
+    os.replace(paths["meta.json"] + ".tmp", paths["meta.json"])
+    search = sys.modules.get("ethics_bot.utils.search")
+    if search is not None and search._ENGINE is not None:
+        search._ENGINE.graph = None
+    logger.info(f"Related graph: {n} verses, {nnz} edges, {(indptr.nbytes + nnz * 6) / 1e6:.1f} MB")
+    return RelatedGraph.load(root)
+
+def invalidate_engine(book):
+    # Called once a book's files are all written. The stamp marks the build
+    # complete for other processes; a search engine running in this process
+    # drops the rebuilt book and its caches now.
+    write_stamp(os.path.join(DATA_ROOT, book, f'{book}_index.faiss'))
+    search = sys.modules.get("ethics_bot.utils.search")
+    if search is not None and search._ENGINE is not None:
+        search._ENGINE.invalidate(book)
+
+@timeit
+def build_faiss(logger, book, spec="Flat", incremental=False):
+    embeddings_file = os.path.join(BOOK_DATA[book], f'{book}_embeddings.npy')
+    index_path = os.path.join(BOOK_DATA[book], f'{book}_index.faiss')
+    keys_path = os.path.join(BOOK_DATA[book], f'{book}_keys.npy')
+    built_keys_path = os.path.join(BOOK_DATA[book], f'{book}_index.keys.npy')
+    logger.info("Loading embeddings...")
+    embeddings = np.load(embeddings_file, mmap_mode="r")
+
+    index = None
+    if incremental and all(os.path.exists(p) for p in (index_path, keys_path, built_keys_path)):
+        index = add_faiss_delta(logger, embeddings, index_path, spec, np.load(keys_path), np.load(built_keys_path))
+    if index is None:
+        index = write_faiss(logger, [embeddings], index_path, spec)
+    # Remember which verse contents the index holds for the next incremental build
+    if os.path.exists(keys_path):
+        shutil.copyfile(keys_path, built_keys_path)
+    # Lexical postings and the verse-reference index sit next to the FAISS index
+    build_bm25(logger, book)
+    build_refs(logger, book)
+    invalidate_engine(book)
+
+    logger.info(f"Done! Total vectors = {index.ntotal}")
+
+@timeit
+def build_unified_faiss(logger, books=TRADITIONS, spec="Flat"):
+    # One index over every corpus; ids follow the row order of
+    # unified_metadata.parquet so a single search returns the global top-k.
+    os.makedirs(UNIFIED_DATA, exist_ok=True)
+    embeddings = []
+    refs = []
+    entities = []
+    for book in books:
+        logger.info(f"Adding {book} to unified index...")
+        embeddings.append(np.load(os.path.join(BOOK_DATA[book], f'{book}_embeddings.npy'), mmap_mode="r"))
+        metadata = pl.read_parquet(os.path.join(BOOK_DATA[book], f'{book}_metadata.parquet'))
+
+        refs.append(metadata.select([
+            pl.lit(book).alias("corpus"),
+            pl.int_range(pl.len(), dtype=pl.Int32).alias("row_id"),
+            pl.col("tradition") if "tradition" in metadata.columns else pl.lit(TRADITIONS[book]).alias("tradition"),
+            pl.col("book").cast(pl.String),
+            pl.col("chapter").cast(pl.Int32),
+            pl.col("verse").cast(pl.Int32),
+            pl.col("clean_text"),
+        ]))
+        entities.extend(entity_terms(metadata) or [[]] * metadata.height)
+
+    index_path = os.path.join(UNIFIED_DATA, f'{UNIFIED_BOOK}_index.faiss')
+    index = write_faiss(logger, embeddings, index_path, spec)
+    if resolve_spec(spec).get("rerank"):
+        # Re-ranking reads exact vectors by unified id
+        with replacing(os.path.join(UNIFIED_DATA, f'{UNIFIED_BOOK}_embeddings.npy')) as tmp:
+            out = np.lib.format.open_memmap(tmp, mode="w+", dtype="float32",
+                                            shape=(index.ntotal, embeddings[0].shape[1]))
+            lo = 0
+            for emb in embeddings:
+                out[lo:lo + len(emb)] = emb
+                lo += len(emb)
+            out.flush()
+            del out
+    refs = pl.concat(refs)
+    refs.write_parquet(os.path.join(UNIFIED_DATA, f'{UNIFIED_BOOK}_metadata.parquet'))
+    write_bm25(logger, refs["clean_text"].to_list(), entities, os.path.join(UNIFIED_DATA, f'{UNIFIED_BOOK}_bm25.npz'))
+    invalidate_engine(UNIFIED_BOOK)
+    logger.info(f"Done! Total vectors = {index.ntotal}")
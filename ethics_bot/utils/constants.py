@@ -14,9 +14,86 @@ QURAN_PICKTHALL_PATH = RAW_PATH / 'en.pickthall.txt'
 QURAN_SIMPLE_PATH = RAW_PATH / 'quran-simple-clean.txt'
 TANAKH_URL = 'https://www.sefaria.org/api/texts/{}.{}?context=0&commentary=0&lang=en'
 GITA_LINK = 'https://raw.githubusercontent.com/gita/gita/refs/heads/main/data/translation.json'
+GITA_PATH = RAW_PATH / 'gita_translation.json'
+# Fetch layer: HTTP content cache, and the data/raw copies offline mode serves
+FETCH_CACHE_PATH = DATA_ROOT / 'cache' / 'http'
+RAW_MIRROR = {
+    GUTENBERG_KJV_URL: BIBLE_PATH,
+    TANZIL_PICKTHALL_URL: QURAN_PICKTHALL_PATH,
+    GITA_LINK: GITA_PATH,
+}
 BIBLE_DATA = DATA_ROOT / 'bible'
 QURAN_DATA = DATA_ROOT / 'quran_english'
 GITA_DATA = DATA_ROOT / 'gita_english'
+EMBED_MODEL = 'all-MiniLM-L6-v2'
+EMBED_CACHE_PATH = DATA_ROOT / 'cache' / 'embeddings'
+# Encoder runtime: 'torch', 'onnx' or 'onnx-int8' (dynamic int8 quantization).
+# ETHICS_BOT_ENCODER overrides it; ONNX exports are kept under ENCODER_PATH.
+EMBED_BACKEND = 'torch'
+ENCODER_BACKENDS = ('torch', 'onnx', 'onnx-int8')
+ENCODER_PATH = DATA_ROOT / 'models'
+BOOK_DATA = {
+    'bible': BIBLE_DATA,
+    'quran_english': QURAN_DATA,
+    'gita_english': GITA_DATA,
+}
+TRADITIONS = {
+    'bible': 'Christianity',
+    'quran_english': 'Islam',
+    'gita_english': 'Hinduism',
+}
+UNIFIED_BOOK = 'unified'
+UNIFIED_DATA = DATA_ROOT / UNIFIED_BOOK
+# Defaults for build_faiss(spec=...). M is HNSW links per node for HNSW and
+# PQ sub-quantizers for IVFPQ.
+INDEX_SPECS = {
+    'Flat': {'type': 'Flat'},
+    'IVFFlat': {'type': 'IVFFlat', 'nlist': 256, 'nprobe': 16},
+    'IVFPQ': {'type': 'IVFPQ', 'nlist': 256, 'nprobe': 16, 'M': 48, 'nbits': 8},
+    'HNSW': {'type': 'HNSW', 'M': 32, 'efConstruction': 200, 'efSearch': 64},
+    # Compact codes; rerank fetches rerank*k candidates and re-scores them
+    # exactly against the float32 embeddings (0 = no re-rank).
+    'SQfp16': {'type': 'SQfp16', 'rerank': 0},
+    'SQ8': {'type': 'SQ8', 'rerank': 4},
+    'Binary': {'type': 'Binary', 'rerank': 10},
+}
+# Lexical side of hybrid search: BM25 parameters, candidates fetched from
+# each retriever and the reciprocal-rank-fusion constant.
+BM25_K1 = 1.2
+BM25_B = 0.75
+HYBRID_FETCH = 100
+RRF_K = 60
+# SearchEngine caches: normalized query -> embedding (LRU) and
+# (query, book, k, filters) -> hits (LRU + TTL seconds). 0 disables.
+QUERY_CACHE_SIZE = 10_000
+RESULT_CACHE_SIZE = 10_000
+RESULT_CACHE_TTL = 300
+# Verse references: corpus-level names accepted in place of a book name
+# ("Quran 2:255", "Gita 2:47"), and the optional passage index of PASSAGE_SIZE
+# consecutive verses every PASSAGE_STRIDE verses, searched as '<book>_passages'.
+REF_ALIASES = {
+    'quran': 'quran_english',
+    'koran': 'quran_english',
+    'surah': 'quran_english',
+    'sura': 'quran_english',
+    'gita': 'gita_english',
+    'bhagavad gita': 'gita_english',
+    'bg': 'gita_english',
+}
+PASSAGE_SIZE = 4
+PASSAGE_STRIDE = 2
+PASSAGE_SUFFIX = '_passages'
+# Precomputed "related verses" graph: RELATED_K neighbours per verse in every
+# other corpus, from a blocked all-pairs join over RELATED_BLOCK-row blocks.
+RELATED_DATA = DATA_ROOT / 'related'
+RELATED_K = 10
+RELATED_BLOCK = 8192
+# Sharded search: a large corpus can be hash-partitioned into books
+# '<book>_part<i>of<n>'; shards that miss SHARD_TIMEOUT seconds are left out
+# of the merged result. Remote shard workers listen on SHARD_PORT.
+PARTITION_INFIX = '_part'
+SHARD_TIMEOUT = 2.0
+SHARD_PORT = 7100
 
 
 BIBLE_BOOK_MAPPING = {
@@ -91,6 +168,17 @@ BIBLE_BOOK_MAPPING = {
     "The Revelation of Saint John the Divine": "Revelation",
 }
 
+# Ayat per surah (Hafs numbering, 6236 total); used to number Tanzil texts
+# that carry one ayah per line without surah|ayah prefixes.
+QURAN_AYAH_COUNTS = [
+    7, 286, 200, 176, 120, 165, 206, 75, 129, 109, 123, 111, 43, 52, 99, 128, 111, 110, 98, 135,
+    112, 78, 118, 64, 77, 227, 93, 88, 69, 60, 34, 30, 73, 54, 45, 83, 182, 88, 75, 85,
+    54, 53, 89, 59, 37, 35, 38, 29, 18, 45, 60, 49, 62, 55, 78, 96, 29, 22, 24, 13,
+    14, 11, 11, 18, 12, 12, 30, 52, 52, 44, 28, 28, 20, 56, 40, 31, 50, 40, 46, 42,
+    29, 19, 36, 25, 22, 17, 19, 26, 30, 20, 15, 21, 11, 8, 8, 19, 5, 8, 8, 11,
+    11, 8, 3, 9, 5, 4, 7, 3, 6, 3, 5, 4, 5, 6,
+]
+
 TANAKH_BOOKS = [
     "Genesis", "Exodus", "Leviticus", "Numbers", "Deuteronomy",
     "Joshua", "Judges", "Ruth",
@@ -104,6 +192,20 @@ TANAKH_BOOKS = [
     "Nahum", "Habakkuk", "Zephaniah", "Haggai", "Zechariah", "Malachi"
 ]
 
+# Chapters per book in Jewish numbering (929 total), e.g. Joel 4, Malachi 3
+TANAKH_CHAPTERS = {
+    "Genesis": 50, "Exodus": 40, "Leviticus": 27, "Numbers": 36, "Deuteronomy": 34,
+    "Joshua": 24, "Judges": 21, "Ruth": 4,
+    "I Samuel": 31, "II Samuel": 24,
+    "I Kings": 22, "II Kings": 25,
+    "I Chronicles": 29, "II Chronicles": 36,
+    "Ezra": 10, "Nehemiah": 13, "Esther": 10,
+    "Job": 42, "Psalms": 150, "Proverbs": 31, "Ecclesiastes": 12, "Song of Songs": 8,
+    "Isaiah": 66, "Jeremiah": 52, "Lamentations": 5, "Ezekiel": 48, "Daniel": 12,
+    "Hosea": 14, "Joel": 4, "Amos": 9, "Obadiah": 1, "Jonah": 4, "Micah": 7,
+    "Nahum": 3, "Habakkuk": 3, "Zephaniah": 3, "Haggai": 2, "Zechariah": 14, "Malachi": 3,
+}
+
 # if __name__ == "__main__":
 #     for name, value in list(globals().items()):
 #         if isinstance(value, Path):
@@ -0,0 +1,101 @@
+import hashlib, json, os, re
+import numpy as np
+from ethics_bot.utils.constants import *
+from ethics_bot.utils.encoder import encoder_name
+
+KEY_DTYPE = np.dtype("S16")
+
+def text_key(model_name, text):
+    return hashlib.blake2b(f"{model_name}\0{text}".encode("utf-8"), digest_size=16).digest()
+
+class EmbeddingCache:
+    # Content-addressed store of (model, clean_text) -> embedding. Each put
+    # appends an immutable shard pair (keys + vectors); shards are mmapped on
+    # load so a warm cache costs little memory.
+    def __init__(self, model_name=None, root=EMBED_CACHE_PATH):
+        self.model_name = model_name or encoder_name()
+        self.dir = os.path.join(root, re.sub(r"[^A-Za-z0-9_.-]", "_", self.model_name))
+        os.makedirs(self.dir, exist_ok=True)
+        self.shards = []
+        self.lookup = {}
+        for name in sorted(os.listdir(self.dir)):
+            if name.endswith(".keys.npy"):
+                self._open_shard(name[:-len(".keys.npy")])
+
+    def _open_shard(self, stem):
+        keys = np.load(os.path.join(self.dir, f"{stem}.keys.npy"))
+        vectors = np.load(os.path.join(self.dir, f"{stem}.npy"), mmap_mode="r")
+        shard = len(self.shards)
+        self.shards.append((stem, vectors))
+        for row, key in enumerate(keys.tolist()):
+            # numpy strips trailing NUL bytes from S16 values; restore them
+            # so a digest ending in \x00 still matches text_key()
+            self.lookup[key.ljust(KEY_DTYPE.itemsize, b"\0")] = (shard, row)
+
+    def __len__(self):
+        return len(self.lookup)
+
+    def keys(self, texts):
+        return [text_key(self.model_name, t) for t in texts]
+
+    def get_many(self, keys):
+        d = self.shards[0][1].shape[1] if self.shards else 0
+        vectors = np.zeros((len(keys), d), dtype="float32")
+        locs = np.array([self.lookup.get(key, (-1, -1)) for key in keys], dtype=np.int64).reshape(-1, 2)
+        hit = locs[:, 0] >= 0
+        # One fancy-index gather per shard instead of a row copy per hit
+        for shard in np.unique(locs[hit, 0]):
+            rows = locs[:, 0] == shard
+            vectors[rows] = self.shards[shard][1][locs[rows, 1]]
+        return vectors, hit
+
+    def put_many(self, keys, vectors):
+        new = {}
+        for key, vec in zip(keys, vectors):
+            if key not in self.lookup:
+                new[key] = vec
+        if not new:
+            return 0
+        stem = self._next_stem()
+        # Vectors first, keys last: a shard only counts once its keys exist
+        self._atomic_save(f"{stem}.npy", np.stack(list(new.values())).astype("float32"))
+        self._atomic_save(f"{stem}.keys.npy", np.array(list(new), dtype=KEY_DTYPE))
+        self._open_shard(stem)
+        return len(new)
+
+    def _next_stem(self):
+        last = max((int(stem.split("-")[1]) for stem, _ in self.shards), default=-1)
+        return f"shard-{last + 1:05d}"
+
+    def _atomic_save(self, name, arr):
+        tmp = os.path.join(self.dir, f".{name}.tmp")
+        with open(tmp, "wb") as f:
+            np.save(f, arr)
+        os.replace(tmp, os.path.join(self.dir, name))
+
+    def compact(self):
+        # Merge all shards into one so load time stays flat over many runs
+        if len(self.shards) < 2:
+            return
+        keys = list(self.lookup)
+        vectors = np.stack([self.shards[s][1][r] for s, r in self.lookup.values()])
+        old = [stem for stem, _ in self.shards]
+        stem = self._next_stem()
+        self.shards, self.lookup = [], {}
+        self._atomic_save(f"{stem}.npy", vectors)
+        self._atomic_save(f"{stem}.keys.npy", np.array(keys, dtype=KEY_DTYPE))
+        for s in old:
+            os.remove(os.path.join(self.dir, f"{s}.keys.npy"))
+            os.remove(os.path.join(self.dir, f"{s}.npy"))
+        self._open_shard(stem)
+
+    def throughput(self):
+        path = os.path.join(self.dir, "stats.json")
+        if not os.path.exists(path):
+            return None
+        with open(path) as f:
+            return json.load(f).get("verses_per_sec")
+
+    def record_throughput(self, verses_per_sec):
+        with open(os.path.join(self.dir, "stats.json"), "w") as f:
+            json.dump({"verses_per_sec": verses_per_sec}, f)
@@ -0,0 +1,108 @@
+import os, time
+import numpy as np
+from ethics_bot.utils.constants import *
+from ethics_bot.utils.atomic import save_npy
+from ethics_bot.utils.embed_cache import KEY_DTYPE, text_key
+from ethics_bot.utils.encoder import encoder_name, load_encoder
+from ethics_bot.utils.enrich import clean_text
+from ethics_bot.utils.instrument import span, incr, gauge
+from ethics_bot.utils.log import timeit
+
+def encode_texts(logger, model, texts, batch_size=64, processes=None):
+    # Sort by token length so each padded batch holds similar lengths (long
+    # Bible verses no longer pad short ayat), encode, then restore order.
+    lengths = [len(ids) for ids in model.tokenizer(texts, truncation=True)["input_ids"]]
+    order = np.argsort(lengths, kind="stable")
+    sorted_texts = [texts[i] for i in order]
+
+    # Stored unit-norm so build_faiss can add straight from a mmapped .npy
+    if processes and processes > 1:
+        logger.info(f"Encoding {len(texts)} texts on {processes} processes (batch_size={batch_size})")
+        # Split the cores between workers instead of every worker's torch
+        # pool claiming all of them
+        threads = os.environ.get("OMP_NUM_THREADS")
+        os.environ["OMP_NUM_THREADS"] = str(max(1, (os.cpu_count() or 1) // processes))
+        try:
+            pool = model.start_multi_process_pool(["cpu"] * processes)
+        finally:
+            if threads is None:
+                os.environ.pop("OMP_NUM_THREADS")
+            else:
+                os.environ["OMP_NUM_THREADS"] = threads
+        try:
+            # Contiguous chunks of the sorted list keep buckets intact per worker
+            chunk_size = max(batch_size, -(-len(texts) // (processes * 4)))
+            encoded = model.encode_multi_process(sorted_texts, pool, batch_size=batch_size,
+                                                 chunk_size=chunk_size, normalize_embeddings=True)
+        finally:
+            model.stop_multi_process_pool(pool)
+    else:
+        encoded = model.encode(sorted_texts, batch_size=batch_size, show_progress_bar=True,
+                               normalize_embeddings=True)
+
+    embeddings = np.empty((len(texts), encoded.shape[1]), dtype="float32")
+    embeddings[order] = encoded
+    return embeddings
+
+def embed_chunk(logger, texts, batch_size=64, cache=None, processes=None, model=None):
+    keys = [text_key(encoder_name(), t) for t in texts]
+
+    # Only verses whose (model, clean_text) is not cached go through the model
+    if cache is not None and len(cache):
+        embeddings, hit = cache.get_many(keys)
+    else:
+        embeddings, hit = None, np.zeros(len(texts), dtype=bool)
+    misses = np.flatnonzero(~hit)
+
+    logger.info(f"Generating verse embeddings for {len(misses)} of {len(texts)} verses")
+    if len(misses):
+        # model may also be a zero-argument loader, so all-hit chunks never load it
+        if model is None:
+            model = load_encoder()
+        elif not hasattr(model, "encode"):
+            model = model()
+    start = time.time()
+    if len(misses):
+        # Repeated verses (refrains, duplicated ayat) are encoded once
+        unique = list(dict.fromkeys(texts[i] for i in misses))
+        with span("encode", logger, rows=len(unique), processes=processes or 1, batch_size=batch_size):
+            fresh = encode_texts(logger, model, unique, batch_size, processes)
+        pos = {t: j for j, t in enumerate(unique)}
+        fresh = fresh[[pos[texts[i]] for i in misses]]
+        if embeddings is None:
+            embeddings = np.empty((len(texts), fresh.shape[1]), dtype="float32")
+        embeddings[misses] = fresh
+    end = time.time()
+
+    if len(misses):
+        logger.info(f"Time taken for embeddings = {end-start:.2f} ")
+        logger.info(f"Throughput: {len(misses) / (end - start):.2f} verses/sec")
+        incr("verses_embedded", len(misses))
+        gauge("embed_verses_per_sec", round(len(misses) / (end - start), 2))
+    incr("embed_cache_hits", len(texts) - len(misses))
+
+    if cache is not None:
+        rate = len(misses) / (end - start) if len(misses) else cache.throughput()
+        if len(misses):
+            cache.put_many([keys[i] for i in misses], fresh)
+            cache.record_throughput(rate)
+        hits = len(texts) - len(misses)
+        saved = hits / rate if rate else 0.0
+        logger.info(f"Embedding cache: {hits} hits, {len(misses)} misses, ~{saved:.1f} sec of encoding saved")
+    return embeddings, keys
+
+@timeit
+def embed_text(logger, df, book, batch_size, cache=None, processes=None):
+    logger.info(f"Embedding {book}")
+    embeddings, keys = embed_chunk(logger, df["clean_text"].to_list(), batch_size, cache, processes)
+
+    logger.info(f"Saving embeddings to {book}_embeddings.npy")
+    save_npy(os.path.join(os.path.join(DATA_ROOT, book), f"{book}_embeddings.npy"), embeddings)
+    save_npy(os.path.join(os.path.join(DATA_ROOT, book), f"{book}_keys.npy"), np.array(keys, dtype=KEY_DTYPE))
+    logger.info(f"Writing metadata to {book}_metadata.parquet")
+    df.write_parquet(os.path.join(os.path.join(DATA_ROOT, book), f"{book}_metadata.parquet"))
+
+@timeit
+def clean_and_embed_text(logger, df, book, cache=None, batch_size=64, processes=None):
+    df = clean_text(logger, df)
+    embed_text(logger, df, book, batch_size, cache, processes)
@@ -0,0 +1,63 @@
+import glob, os, platform, re
+from ethics_bot.utils.constants import *
+from ethics_bot.utils.instrument import gauge, span
+
+def encoder_backend(backend=None):
+    backend = backend or os.environ.get("ETHICS_BOT_ENCODER") or EMBED_BACKEND
+    if backend not in ENCODER_BACKENDS:
+        raise ValueError(f"Unknown encoder backend {backend!r}, expected one of {ENCODER_BACKENDS}")
+    return backend
+
+def encoder_name(model_name=EMBED_MODEL, backend=None):
+    # Identity used for embedding cache keys. ONNX fp32 reproduces torch
+    # embeddings, int8 does not, so quantized vectors get their own keys.
+    backend = encoder_backend(backend)
+    return f"{model_name}@{backend}" if backend == "onnx-int8" else model_name
+
+def quantization_target():
+    # Best int8 kernel set this CPU supports, named as ONNX Runtime's quantizer expects
+    if platform.machine().lower() in ("arm64", "aarch64"):
+        return "arm64"
+    try:
+        with open("/proc/cpuinfo") as f:
+            flags = f.read()
+    except OSError:
+        flags = ""
+    if "avx512_vnni" in flags:
+        return "avx512_vnni"
+    if "avx512f" in flags:
+        return "avx512"
+    return "avx2"
+
+def export_dir(model_name):
+    return os.path.join(ENCODER_PATH, re.sub(r"[^A-Za-z0-9_.-]", "_", model_name))
+
+def load_encoder(model_name=EMBED_MODEL, backend=None, **kwargs):
+    # Drop-in SentenceTransformer for every encode path. ONNX variants are
+    # exported once on first use and loaded from disk after that.
+    backend = encoder_backend(backend)
+    with span("model_load", model=model_name, backend=backend) as s:
+        model = _load_encoder(model_name, backend, **kwargs)
+    gauge("model_load_seconds", round(s.seconds, 4))
+    return model
+
+def _load_encoder(model_name, backend, **kwargs):
+    from sentence_transformers import SentenceTransformer
+    if backend == "torch":
+        return SentenceTransformer(model_name, **kwargs)
+
+    local = export_dir(model_name)
+    if not os.path.exists(os.path.join(local, "onnx", "model.onnx")):
+        SentenceTransformer(model_name, backend="onnx").save(local)
+    if backend == "onnx":
+        return SentenceTransformer(local, backend="onnx", model_kwargs={"file_name": "onnx/model.onnx"}, **kwargs)
+
+    target = quantization_target()
+    found = glob.glob(os.path.join(local, "onnx", f"model_*_{target}.onnx"))
+    if not found:
+        from sentence_transformers import export_dynamic_quantized_onnx_model
+        fp32 = SentenceTransformer(local, backend="onnx", model_kwargs={"file_name": "onnx/model.onnx"})
+        export_dynamic_quantized_onnx_model(fp32, target, local)
+        found = glob.glob(os.path.join(local, "onnx", f"model_*_{target}.onnx"))
+    file_name = os.path.relpath(found[0], local)
+    return SentenceTransformer(local, backend="onnx", model_kwargs={"file_name": file_name}, **kwargs)
@@ -0,0 +1,190 @@
+import hashlib, json, os
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import polars as pl
+from ethics_bot.utils.constants import *
+from ethics_bot.utils.embed_cache import text_key
+from ethics_bot.utils.encoder import encoder_name
+from ethics_bot.utils.log import timeit
+
+@timeit
+def clean_text(logger, df):
+    df = df.with_columns(
+    pl.col("text")
+      # 1. Remove bracketed content
+      .str.replace_all(r"\[[^\]]+\]", "")
+      # 2. Remove non-ASCII chars
+      .str.replace_all(r"[^\x00-\x7F]+", " ")
+      # 3. Collapse multiple spaces/newlines
+      .str.replace_all(r"\s+", " ")
+      # 4. Trim edges
+      .str.strip_chars()
+      .alias("clean_text")
+    )
+    return df
+
+_ANALYZER = None
+
+def get_analyzer():
+    # VADER reads its lexicon on construction: build it on first use, once per process
+    global _ANALYZER
+    if _ANALYZER is None:
+        from vaderSentiment.vaderSentiment import SentimentIntensityAnalyzer
+        _ANALYZER = SentimentIntensityAnalyzer()
+    return _ANALYZER
+
+def get_sentiment_row(text):
+    if not text or not isinstance(text, str):
+        return (0.0, 0.0, 0.0, 0.0)
+    s = get_analyzer().polarity_scores(text)
+    return (s["neg"], s["neu"], s["pos"], s["compound"])
+
+def get_sentiment_rows(texts):
+    return [get_sentiment_row(t) for t in texts]
+
+def chunked(items, size):
+    return [items[i:i + size] for i in range(0, len(items), size)]
+
+@timeit
+def add_sentiments(logger, df, processes=1, chunk_size=2000, pool=None):
+    # pool: a ProcessPoolExecutor kept by the caller across calls, so its
+    # workers start and load the VADER lexicon once, not once per call
+    logger.info("Adding sentiments to cleansed text")
+    texts = df["clean_text"].to_list()
+    processes = processes or 1
+    if pool is not None and len(texts) > chunk_size:
+        sent_list = [row for rows in pool.map(get_sentiment_rows, chunked(texts, chunk_size)) for row in rows]
+    elif processes > 1 and len(texts) > chunk_size:
+        # VADER is pure Python, so fan chunks out over processes, not threads
+        with ProcessPoolExecutor(max_workers=processes) as pool:
+            sent_list = [row for rows in pool.map(get_sentiment_rows, chunked(texts, chunk_size)) for row in rows]
+    else:
+        sent_list = get_sentiment_rows(texts)
+    neg, neu, pos, comp = zip(*sent_list) if sent_list else ([], [], [], [])
+
+    df = df.with_columns([
+        pl.Series("sent_neg",  neg, dtype=pl.Float64),
+        pl.Series("sent_neu",  neu, dtype=pl.Float64),
+        pl.Series("sent_pos",  pos, dtype=pl.Float64),
+        pl.Series("sent_comp", comp, dtype=pl.Float64)
+    ])
+
+    return df
+
+def extract_ner(nlp, text):
+    if not text or not isinstance(text, str):
+        return []
+    doc = nlp(text)
+    return [ent.text for ent in doc.ents]
+
+@timeit
+def enrichment_NER(logger, nlp, df, batch_size=256, n_process=1):
+    logger.info(f"extaracting NER using spacy (batch_size={batch_size}, n_process={n_process})")
+    texts = [t if isinstance(t, str) else "" for t in df['clean_text'].to_list()]
+    # nlp.pipe batches the pipeline and can fan out over processes
+    ner_list = [[ent.text for ent in doc.ents] for doc in nlp.pipe(texts, batch_size=batch_size, n_process=n_process)]
+
+    logger.info("NER extraction complete")
+    return df.with_columns(
+        pl.Series("ner", ner_list, dtype=pl.List(pl.String))
+    )
+
+def extract_keywords(kw_model, text):
+    try:
+        kw = kw_model.extract_keywords(
+                text,
+                keyphrase_ngram_range=(1, 2),
+                top_n=5
+        )
+        return [k[0] for k in kw]
+    except:
+        return []
+
+def extract_keywords_batch(kw_model, texts, doc_embeddings=None, vectorizer=None, word_embeddings=None,
+                           ngram_range=(1, 2), top_n=5):
+    # KeyBERT's list API embeds the chunk's candidate phrases once for all
+    # docs; passing the stored verse embeddings skips re-encoding the docs,
+    # and a fixed vectorizer + word_embeddings skips the phrases too.
+    try:
+        kw = kw_model.extract_keywords(
+                texts,
+                keyphrase_ngram_range=ngram_range,
+                top_n=top_n,
+                vectorizer=vectorizer,
+                doc_embeddings=doc_embeddings,
+                word_embeddings=word_embeddings
+        )
+    except ValueError as e:
+        # CountVectorizer rejects a chunk without a single candidate phrase;
+        # any other ValueError (e.g. word_embeddings not matching the
+        # vectorizer's vocabulary) is a real error, not "no keywords"
+        if "empty vocabulary" not in str(e):
+            raise
+        kw = []
+    if not kw:
+        # Whole chunk has no candidate phrases (e.g. only stop words)
+        return [[] for _ in texts]
+    if len(texts) == 1:
+        kw = [kw]
+    return [[k[0] for k in doc_kw] for doc_kw in kw]
+
+@timeit
+def keyword_vocabulary(logger, kw_model, texts, book, cache=None, ngram_range=(1, 2), stop_words="english", min_df=1):
+    # Candidate n-grams are fitted over the whole corpus and embedded once.
+    # The matrix is saved per (settings, corpus) and phrase vectors go through
+    # the embedding cache, so changing the n-gram settings only encodes the
+    # phrases that were not seen before.
+    from sklearn.feature_extraction.text import CountVectorizer
+    settings = {"model": encoder_name(), "ngram_range": list(ngram_range), "stop_words": stop_words, "min_df": min_df,
+                "corpus": hashlib.blake2b("\0".join(texts).encode("utf-8"), digest_size=8).hexdigest()}
+    key = hashlib.blake2b(json.dumps(settings, sort_keys=True).encode(), digest_size=6).hexdigest()
+    vocab_path = os.path.join(BOOK_DATA[book], f"{book}_kw_vocab_{key}.json")
+    emb_path = os.path.join(BOOK_DATA[book], f"{book}_kw_vocab_{key}.npy")
+
+    if os.path.exists(vocab_path) and os.path.exists(emb_path):
+        logger.info(f"Reusing keyword vocabulary {os.path.basename(vocab_path)}")
+        with open(vocab_path) as f:
+            vocab = json.load(f)["vocab"]
+        word_embeddings = np.load(emb_path, mmap_mode="r")
+    else:
+        vocab = CountVectorizer(ngram_range=ngram_range, stop_words=stop_words, min_df=min_df).fit(texts)
+        vocab = vocab.get_feature_names_out().tolist()
+        keys = [text_key(encoder_name(), w) for w in vocab]
+        if cache is not None and len(cache):
+            word_embeddings, hit = cache.get_many(keys)
+        else:
+            word_embeddings, hit = None, np.zeros(len(vocab), dtype=bool)
+        misses = np.flatnonzero(~hit)
+        logger.info(f"Embedding {len(misses)} of {len(vocab)} candidate phrases for {book}")
+        if len(misses):
+            fresh = np.asarray(kw_model.model.embed([vocab[i] for i in misses]), dtype="float32")
+            if word_embeddings is None:
+                word_embeddings = np.empty((len(vocab), fresh.shape[1]), dtype="float32")
+            word_embeddings[misses] = fresh
+            if cache is not None:
+                cache.put_many([keys[i] for i in misses], fresh)
+        with open(vocab_path, "w") as f:
+            json.dump({"settings": settings, "vocab": vocab}, f)
+        np.save(emb_path, word_embeddings)
+
+    vectorizer = CountVectorizer(ngram_range=ngram_range, stop_words=stop_words, vocabulary=vocab)
+    return vectorizer, word_embeddings
+
+@timeit
+def get_topics(logger, df, model, embeddings=None, batch_size=1000, book=None, cache=None, ngram_range=(1, 2), top_n=5,
+               vocabulary=None):
+    # vocabulary: (vectorizer, word_embeddings) from keyword_vocabulary, for
+    # callers that enrich a corpus chunk by chunk
+    texts = [t if isinstance(t, str) else "" for t in df["clean_text"].to_list()]
+    vectorizer, word_embeddings = vocabulary or (None, None)
+    if vocabulary is None and book is not None:
+        vectorizer, word_embeddings = keyword_vocabulary(logger, model, texts, book, cache, ngram_range)
+    keywords = []
+    for lo in range(0, len(texts), batch_size):
+        doc_embeddings = None if embeddings is None else np.asarray(embeddings[lo:lo + batch_size], dtype="float32")
+        keywords.extend(extract_keywords_batch(model, texts[lo:lo + batch_size], doc_embeddings,
+                                               vectorizer, word_embeddings, ngram_range, top_n))
+    df = df.with_columns(
+    pl.Series("keywords", keywords, dtype=pl.List(pl.String))
+    )
+    return df
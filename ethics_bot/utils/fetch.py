@@ -0,0 +1,118 @@
+import hashlib, json, logging, os, threading, time
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from ethics_bot.utils.constants import *
+
+class OfflineError(FileNotFoundError):
+    pass
+
+class Fetcher:
+    # One pooled Session with retries plus an on-disk content cache. Cached
+    # URLs are revalidated with If-None-Match / If-Modified-Since, so an
+    # unchanged source costs a 304 instead of a full download. Offline mode
+    # never touches the network: it serves RAW_MIRROR files from data/raw,
+    # then the cache.
+    def __init__(self, logger=None, cache_dir=FETCH_CACHE_PATH, offline=None, max_workers=16, timeout=30,
+                 retries=3, mirror=RAW_MIRROR):
+        self.logger = logger or logging.getLogger("fetch")
+        self.cache_dir = cache_dir
+        self.offline = os.environ.get("ETHICS_BOT_OFFLINE", "0") == "1" if offline is None else offline
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self.mirror = mirror or {}
+        os.makedirs(cache_dir, exist_ok=True)
+
+        self.session = requests.Session()
+        retry = Retry(total=retries, backoff_factor=0.5, status_forcelist=(429, 500, 502, 503, 504),
+                      allowed_methods=("GET",), respect_retry_after_header=True)
+        adapter = HTTPAdapter(pool_connections=max_workers, pool_maxsize=max_workers, max_retries=retry)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.stats = {"fetched": 0, "not_modified": 0, "offline": 0, "stale": 0}
+        self.stats_lock = threading.Lock()
+
+    def _count(self, name):
+        # get() runs on get_many's worker threads; += on a dict is not atomic
+        with self.stats_lock:
+            self.stats[name] += 1
+
+    def _paths(self, url):
+        stem = hashlib.sha1(url.encode("utf-8")).hexdigest()
+        return os.path.join(self.cache_dir, f"{stem}.body"), os.path.join(self.cache_dir, f"{stem}.json")
+
+    def _read_cache(self, url):
+        body_path, meta_path = self._paths(url)
+        if not (os.path.exists(body_path) and os.path.exists(meta_path)):
+            return None, None
+        with open(meta_path) as f:
+            meta = json.load(f)
+        with open(body_path, "rb") as f:
+            return f.read(), meta
+
+    def _write_cache(self, url, body, resp):
+        body_path, meta_path = self._paths(url)
+        meta = {"url": url, "etag": resp.headers.get("ETag"), "last_modified": resp.headers.get("Last-Modified"),
+                "fetched_at": time.time()}
+        # Body first, metadata last: an entry only counts once both exist
+        for path, data in ((body_path, body), (meta_path, json.dumps(meta).encode())):
+            tmp = f"{path}.{os.getpid()}.tmp"
+            with open(tmp, "wb") as f:
+                f.write(data)
+            os.replace(tmp, path)
+
+    def get(self, url):
+        if self.offline:
+            self._count("offline")
+            mirrored = self.mirror.get(url)
+            if mirrored and os.path.exists(mirrored):
+                with open(mirrored, "rb") as f:
+                    return f.read()
+            body, _ = self._read_cache(url)
+            if body is None:
+                raise OfflineError(f"{url} is neither mirrored in data/raw nor cached, and offline mode is on")
+            return body
+
+        body, meta = self._read_cache(url)
+        headers = {}
+        if meta:
+            if meta.get("etag"):
+                headers["If-None-Match"] = meta["etag"]
+            if meta.get("last_modified"):
+                headers["If-Modified-Since"] = meta["last_modified"]
+        try:
+            resp = self.session.get(url, headers=headers, timeout=self.timeout)
+            if resp.status_code == 304 and body is not None:
+                self._count("not_modified")
+                return body
+            resp.raise_for_status()
+        except requests.RequestException as e:
+            if body is None:
+                raise
+            self._count("stale")
+            self.logger.warning(f"Fetching {url} failed ({e}), serving cached copy")
+            return body
+        self._count("fetched")
+        self._write_cache(url, resp.content, resp)
+        return resp.content
+
+    def get_text(self, url, encoding="utf-8"):
+        return self.get(url).decode(encoding)
+
+    def get_json(self, url):
+        return json.loads(self.get(url))
+
+    def get_many(self, urls, parse=None):
+        # Bounded concurrency over the shared connection pool; results keep url order
+        parse = parse or (lambda body: body)
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            return list(pool.map(lambda url: parse(self.get(url)), urls))
+
+_FETCHER = None
+
+def get_fetcher(logger=None, **kwargs):
+    global _FETCHER
+    if _FETCHER is None:
+        _FETCHER = Fetcher(logger, **kwargs)
+    return _FETCHER
@@ -0,0 +1,170 @@
+import json, os, math, time, faiss
+import numpy as np
+from ethics_bot.utils.constants import *
+from ethics_bot.utils.atomic import replacing
+
+def resolve_spec(spec="Flat"):
+    if isinstance(spec, str):
+        spec = {"type": spec}
+    if spec["type"] not in INDEX_SPECS:
+        raise ValueError(f"Unknown index type {spec['type']!r}, expected one of {list(INDEX_SPECS)}")
+    return {**INDEX_SPECS[spec["type"]], **spec}
+
+def fit_spec(spec, n):
+    # Shrink knobs that the corpus is too small to train (FAISS wants ~39
+    # training points per centroid, for IVF lists and PQ codebooks alike).
+    spec = dict(spec)
+    if "nlist" in spec:
+        spec["nlist"] = max(1, min(spec["nlist"], n // 39))
+        spec["nprobe"] = min(spec.get("nprobe", 1), spec["nlist"])
+    if "nbits" in spec and n < 39 * 2 ** spec["nbits"]:
+        spec["nbits"] = max(1, min(spec["nbits"], int(math.log2(max(2, n // 39)))))
+    return spec
+
+def factory_string(spec):
+    kind = spec["type"]
+    if kind == "Flat":
+        return "Flat"
+    if kind == "IVFFlat":
+        return f"IVF{spec['nlist']},Flat"
+    if kind == "IVFPQ":
+        return f"IVF{spec['nlist']},PQ{spec['M']}x{spec['nbits']}"
+    if kind == "HNSW":
+        return f"HNSW{spec['M']},Flat"
+    if kind in ("SQfp16", "SQ8"):
+        return kind
+    if kind == "Binary":
+        return "BFlat"
+
+def is_binary(spec):
+    return spec["type"] == "Binary"
+
+def binarize(x):
+    # Sign bits of each dimension: 384 floats -> 48 bytes
+    return np.packbits(x > 0, axis=1)
+
+def make_index(d, spec):
+    if is_binary(spec):
+        return faiss.IndexBinaryFlat(d)
+    index = faiss.index_factory(d, factory_string(spec), faiss.METRIC_INNER_PRODUCT)
+    if spec["type"] == "HNSW":
+        index.hnsw.efConstruction = spec["efConstruction"]
+    return index
+
+def runtime_params(spec):
+    if "nprobe" in spec:
+        return f"nprobe={spec['nprobe']}"
+    if "efSearch" in spec:
+        return f"efSearch={spec['efSearch']}"
+    return ""
+
+def apply_search_params(index, spec):
+    params = runtime_params(spec)
+    if params:
+        faiss.ParameterSpace().set_index_parameters(index, params)
+
+def selector_params(spec, sel):
+    # Per-call search parameters carrying an IDSelector must also carry the
+    # index-specific knobs, otherwise FAISS falls back to its own defaults.
+    if "nprobe" in spec:
+        return faiss.SearchParametersIVF(sel=sel, nprobe=spec["nprobe"])
+    if "efSearch" in spec:
+        return faiss.SearchParametersHNSW(sel=sel, efSearch=spec["efSearch"])
+    return faiss.SearchParameters(sel=sel)
+
+def spec_path(index_path):
+    return os.path.splitext(str(index_path))[0] + ".json"
+
+def save_spec(index_path, spec):
+    with replacing(spec_path(index_path)) as tmp, open(tmp, "w") as f:
+        json.dump(spec, f, indent=2)
+
+def stamp_path(index_path):
+    return os.path.splitext(str(index_path))[0] + ".stamp"
+
+def write_stamp(index_path):
+    # Written after every other file of a build (index, spec, BM25, refs):
+    # searchers reload when it changes, never halfway through a rebuild
+    with replacing(stamp_path(index_path)) as tmp, open(tmp, "w") as f:
+        f.write(str(time.time_ns()))
+
+def built_at(index_path):
+    # Stamp mtime; books built before stamps existed fall back to the index
+    for path in (stamp_path(index_path), str(index_path)):
+        try:
+            return os.stat(path).st_mtime_ns
+        except FileNotFoundError:
+            pass
+    return None
+
+def load_spec(index_path):
+    # Indexes built before specs existed are plain IndexFlatIP
+    path = spec_path(index_path)
+    if not os.path.exists(path):
+        return resolve_spec("Flat")
+    with open(path) as f:
+        return json.load(f)
+
+def add_vectors(index, spec, x):
+    index.add(binarize(x) if is_binary(spec) else x)
+
+def write_index(index, index_path, spec):
+    # Search processes mmap the index: replace the file, never rewrite it
+    with replacing(index_path) as tmp:
+        if is_binary(spec):
+            faiss.write_index_binary(index, tmp)
+        else:
+            faiss.write_index(index, tmp)
+
+def search_index(index, spec, qvecs, k, params=None):
+    if not is_binary(spec):
+        return index.search(qvecs, k, params=params)
+    distances, indices = index.search(binarize(qvecs), k, params=params)
+    # Hamming distance -> similarity in [-1, 1], comparable in spirit to cosine
+    return (1 - 2 * distances / index.d).astype("float32"), indices
+
+def rerank(embeddings, qvecs, indices, k):
+    # Exact float32 scores for the shortlisted candidates; only the candidate
+    # rows of the (mmapped) embeddings are read.
+    n, kc = indices.shape
+    cand = np.asarray(embeddings[np.where(indices < 0, 0, indices).ravel()], dtype="float32")
+    cand = cand.reshape(n, kc, -1)
+    cand /= np.linalg.norm(cand, axis=2, keepdims=True) + 1e-12
+    scores = np.einsum("nkd,nd->nk", cand, qvecs)
+    scores[indices < 0] = -np.inf
+    top = np.argsort(-scores, axis=1, kind="stable")[:, :k]
+    return np.take_along_axis(scores, top, axis=1), np.take_along_axis(indices, top, axis=1)
+
+def mmap_flags(spec):
+    # Flat and HNSW keep vectors in IndexFlatCodes, which IO_FLAG_MMAP_IFC maps
+    # zero-copy; IVF variants map their inverted lists with IO_FLAG_MMAP.
+    if spec["type"].startswith("IVF") or is_binary(spec):
+        return faiss.IO_FLAG_MMAP
+    return getattr(faiss, "IO_FLAG_MMAP_IFC", faiss.IO_FLAG_MMAP)
+
+def read_index(index_path, spec=None, mmap=True):
+    # Mapped indexes are read-only but share the page cache across processes
+    spec = spec or load_spec(index_path)
+    reader = faiss.read_index_binary if is_binary(spec) else faiss.read_index
+    if not mmap:
+        return reader(str(index_path))
+    return reader(str(index_path), mmap_flags(spec))
+
+def unit_rows(block):
+    # No copy when the block is already contiguous, normalized float32
+    # (e.g. a slice of a mmapped .npy written by embed_text).
+    block = np.ascontiguousarray(block, dtype="float32")
+    norms = np.einsum("ij,ij->i", block, block)
+    if not np.allclose(norms, 1.0, atol=1e-3):
+        block = block.copy()
+        faiss.normalize_L2(block)
+    return block
+
+def training_sample(sources, size, seed=0):
+    rng = np.random.default_rng(seed)
+    n = sum(len(e) for e in sources)
+    sample = []
+    for emb in sources:
+        take = min(len(emb), max(1, size * len(emb) // n))
+        sample.append(unit_rows(emb[np.sort(rng.choice(len(emb), take, replace=False))]))
+    return np.concatenate(sample)
@@ -0,0 +1,162 @@
+import atexit, contextvars, json, logging, os, random, resource, sys, threading, time
+from contextlib import contextmanager
+from ethics_bot.utils.constants import *
+
+# Spans nest through a contextvar (pipeline -> stage -> batch), so a span
+# opened inside a @timeit function becomes its child in the trace. Every span
+# feeds the in-process registry (what /metrics exposes); the JSON-lines sink
+# and cProfile dumps are opt-in:
+#   ETHICS_BOT_TRACE=path.jsonl        one JSON object per finished span
+#   ETHICS_BOT_PROFILE=embed_text,...  cProfile those spans ("all" for every span)
+# Spans opened with hot=True (per-query search steps) only update the
+# registry and the trace; getrusage and the log line run for a sampled share:
+#   ETHICS_BOT_SPAN_SAMPLE=0.01        fraction of hot spans measured in full
+
+_current = contextvars.ContextVar("ethics_bot_span", default=None)
+_lock = threading.Lock()
+_quiet = logging.getLogger("ethics_bot.timings")
+_profiling = contextvars.ContextVar("ethics_bot_profiling", default=False)
+
+SPANS = {}
+COUNTERS = {}
+GAUGES = {}
+CONFIG = {
+    "trace": os.environ.get("ETHICS_BOT_TRACE") or None,
+    "profile": {s for s in os.environ.get("ETHICS_BOT_PROFILE", "").split(",") if s},
+    "profile_dir": os.path.join(LOGGER_PATH, "profiles"),
+    "sample": float(os.environ.get("ETHICS_BOT_SPAN_SAMPLE", "0")),
+}
+# Trace sink kept open between spans: (path, file object)
+_trace = [None, None]
+
+def configure(trace=None, profile=None, profile_dir=None, sample=None):
+    if trace is not None:
+        CONFIG["trace"] = str(trace) or None
+    if profile is not None:
+        CONFIG["profile"] = {profile} if isinstance(profile, str) else set(profile)
+    if profile_dir is not None:
+        CONFIG["profile_dir"] = str(profile_dir)
+    if sample is not None:
+        CONFIG["sample"] = float(sample)
+
+def _write_trace(line):
+    # Caller holds _lock. Reopens only when configure() changed the path.
+    if _trace[0] != CONFIG["trace"]:
+        _close_trace()
+        _trace[:] = [CONFIG["trace"], open(CONFIG["trace"], "a", buffering=1)]
+    _trace[1].write(line)
+
+def _close_trace():
+    if _trace[1] is not None:
+        _trace[1].close()
+    _trace[:] = [None, None]
+
+atexit.register(_close_trace)
+
+def peak_rss_bytes():
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+def incr(name, value=1):
+    with _lock:
+        COUNTERS[name] = COUNTERS.get(name, 0) + value
+
+def gauge(name, value):
+    with _lock:
+        GAUGES[name] = value
+
+class Span:
+    __slots__ = ("name", "path", "attrs", "rows", "start_ns", "cpu_ns", "duration_ns")
+
+    def __init__(self, name, path, attrs, rows):
+        self.name = name
+        self.path = path
+        self.attrs = attrs
+        self.rows = rows
+        self.start_ns = time.perf_counter_ns()
+        self.cpu_ns = time.process_time_ns()
+        self.duration_ns = None
+
+    @property
+    def seconds(self):
+        return (self.duration_ns if self.duration_ns is not None else time.perf_counter_ns() - self.start_ns) / 1e9
+
+def _profiled(name):
+    return "all" in CONFIG["profile"] or name in CONFIG["profile"]
+
+def _record(span, cpu_sec, full=True):
+    sec = span.duration_ns / 1e9
+    rss = peak_rss_bytes() if full else None
+    with _lock:
+        stats = SPANS.setdefault(span.name, {"count": 0, "sum": 0.0, "max": 0.0, "rows": 0})
+        stats["count"] += 1
+        stats["sum"] += sec
+        stats["max"] = max(stats["max"], sec)
+        stats["rows"] += span.rows or 0
+        if full:
+            GAUGES["peak_rss_bytes"] = rss
+    if CONFIG["trace"]:
+        line = {"ts": time.time(), "span": span.name, "path": span.path, "sec": round(sec, 6),
+                "cpu_sec": round(cpu_sec, 6), **span.attrs}
+        if full:
+            line["peak_rss_mb"] = round(rss / 2**20, 1)
+        if span.rows:
+            line["rows"] = span.rows
+            line["rows_per_sec"] = round(span.rows / sec, 1) if sec else None
+        line = json.dumps(line, default=str) + "\n"
+        with _lock:
+            _write_trace(line)
+
+@contextmanager
+def span(name, logger=None, rows=None, hot=False, **attrs):
+    parent = _current.get()
+    s = Span(name, f"{parent.path}/{name}" if parent else name, attrs, rows)
+    token = _current.set(s)
+    profiler = None
+    # Only one cProfile can be active; an outer profiled span already covers this one
+    if CONFIG["profile"] and _profiled(name) and not _profiling.get():
+        import cProfile
+        profiler = cProfile.Profile()
+        profiling = _profiling.set(True)
+        profiler.enable()
+    try:
+        yield s
+    finally:
+        s.duration_ns = time.perf_counter_ns() - s.start_ns
+        cpu_sec = (time.process_time_ns() - s.cpu_ns) / 1e9
+        _current.reset(token)
+        if profiler is not None:
+            profiler.disable()
+            _profiling.reset(profiling)
+            os.makedirs(CONFIG["profile_dir"], exist_ok=True)
+            out = os.path.join(CONFIG["profile_dir"], f"{name}-{os.getpid()}-{time.time_ns()}.prof")
+            profiler.dump_stats(out)
+            (logger or _quiet).info(f"cProfile for {name} written to {out}")
+        full = not hot or (CONFIG["sample"] > 0 and random.random() < CONFIG["sample"])
+        _record(s, cpu_sec, full)
+        if full:
+            rate = f" ({s.rows / s.seconds:.1f} rows/sec)" if s.rows and s.seconds else ""
+            (logger or _quiet).info(f"{name} completed in {s.seconds:.4f} sec{rate}")
+
+def snapshot():
+    with _lock:
+        return {"spans": {k: dict(v) for k, v in SPANS.items()}, "counters": dict(COUNTERS), "gauges": dict(GAUGES)}
+
+def prometheus_text(prefix="ethics_bot"):
+    # Text exposition format, no client library needed
+    snap = snapshot()
+    out = [f"# TYPE {prefix}_span_seconds summary"]
+    for name, stats in sorted(snap["spans"].items()):
+        out.append(f'{prefix}_span_seconds_count{{span="{name}"}} {stats["count"]}')
+        out.append(f'{prefix}_span_seconds_sum{{span="{name}"}} {stats["sum"]:.6f}')
+    out.append(f"# TYPE {prefix}_span_max_seconds gauge")
+    for name, stats in sorted(snap["spans"].items()):
+        out.append(f'{prefix}_span_max_seconds{{span="{name}"}} {stats["max"]:.6f}')
+    for name, value in sorted(snap["counters"].items()):
+        out.append(f"# TYPE {prefix}_{name}_total counter")
+        out.append(f"{prefix}_{name}_total {value}")
+    for name, value in sorted(snap["gauges"].items()):
+        out.append(f"# TYPE {prefix}_{name} gauge")
+        out.append(f"{prefix}_{name} {value}")
+    return "\n".join(out) + "\n"
@@ -0,0 +1,59 @@
+import logging
+from functools import wraps
+from logging.handlers import RotatingFileHandler
+from colorama import Fore, Style
+from ethics_bot.utils.instrument import span
+
+class ColorFormatter(logging.Formatter):
+    COLORS = {
+        logging.DEBUG: Fore.BLUE,
+        logging.INFO: Fore.GREEN,
+        logging.WARNING: Fore.YELLOW,
+        logging.ERROR: Fore.RED,
+        logging.CRITICAL: Fore.MAGENTA
+    }
+
+    def format(self, record):
+        log_color = self.COLORS.get(record.levelno, "")
+        level_name = f"{log_color}{record.levelname}{Style.RESET_ALL}"
+        log_fmt = f"%(asctime)s | %(name)s | {level_name} | %(message)s"
+        formatter = logging.Formatter(log_fmt, datefmt="%Y-%m-%d %H:%M:%S")
+        return formatter.format(record)
+
+def timeit(func):
+    # Every call becomes an instrument span named after the function, nested
+    # under whatever span is open. Call sites pass logger first, positionally.
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        logger = kwargs.get("logger")
+        if logger is None and args and isinstance(args[0], (logging.Logger, logging.LoggerAdapter)):
+            logger = args[0]
+        with span(func.__name__, logger):
+            return func(*args, **kwargs)
+    return wrapper
+
+def get_logger(name: str, log_file, maxBytes=5_000_000, backupCount=5, level=logging.INFO):
+    logger = logging.getLogger(name)
+    if logger.hasHandlers():  # prevent duplicate handlers
+        return logger
+
+    logger.setLevel(level)
+
+    # Console handler
+    console_handler = logging.StreamHandler()
+    console_handler.setFormatter(ColorFormatter())
+
+    # Rotating file handler (5 MB per file, 5 backups)
+    file_handler = RotatingFileHandler(log_file, maxBytes=maxBytes, backupCount=backupCount)
+    file_handler.setFormatter(logging.Formatter(
+        "%(asctime)s | %(name)s | %(levelname)s | %(message)s"
+    ))
+
+    logger.addHandler(console_handler)
+    logger.addHandler(file_handler)
+
+    return logger
+
+def print_dict(d):
+    for k,v in d.items():
+        print(f"{k}:{v}")
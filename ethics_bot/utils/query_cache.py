@@ -0,0 +1,69 @@
+import threading, time
+from collections import OrderedDict
+
+def normalize_query(query):
+    # all-MiniLM-L6-v2 is uncased, so case and spacing do not change the embedding
+    return " ".join(query.lower().split())
+
+def freeze(filters):
+    return tuple(sorted((name, tuple(value) if isinstance(value, (list, tuple)) else value)
+                        for name, value in filters.items() if value is not None))
+
+class LRUCache:
+    # Bounded, thread-safe LRU with optional TTL (seconds). maxsize=0
+    # disables it. Counters are kept so sizes can be tuned from /health.
+    def __init__(self, maxsize, ttl=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.data = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key):
+        with self.lock:
+            item = self.data.get(key)
+            if item is None:
+                self.misses += 1
+                return None
+            value, stored = item
+            if self.ttl is not None and time.monotonic() - stored > self.ttl:
+                del self.data[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self.data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        if not self.maxsize:
+            return
+        with self.lock:
+            self.data[key] = (value, time.monotonic())
+            self.data.move_to_end(key)
+            while len(self.data) > self.maxsize:
+                self.data.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self.lock:
+            self.data.clear()
+
+    def __len__(self):
+        return len(self.data)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self.data),
+            "maxsize": self.maxsize,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
@@ -0,0 +1,121 @@
+import re
+import numpy as np
+from ethics_bot.utils.constants import *
+
+# "John 3:16", "Quran 2:255", "Gita 2.47", "Psalms 23", "Genesis 1:1-5"
+REF = re.compile(r"^\s*(?P<book>.*?[^\s\d.:]\.?)\s*(?P<chapter>\d+)(?:\s*[:.]\s*(?P<verse>\d+)(?:\s*-\s*(?P<end>\d+))?)?\s*$")
+
+def parse_ref(ref):
+    # -> (book name, chapter, first verse or None, last verse or None)
+    m = REF.match(ref)
+    if not m:
+        raise ValueError(f"Cannot parse reference {ref!r}, expected e.g. 'John 3:16' or 'Quran 2:255'")
+    verse = int(m["verse"]) if m["verse"] else None
+    end = int(m["end"]) if m["end"] else verse
+    return m["book"].strip().rstrip("."), int(m["chapter"]), verse, end
+
+def normalize_book(name):
+    return re.sub(r"[\s.]+", "", str(name)).lower()
+
+class ReferenceIndex:
+    # (book, chapter, verse) -> row id for one corpus, kept as flat arrays.
+    # Rows stay in corpus (reading) order; a chapter is a run of consecutive
+    # rows sharing (book, chapter), so a verse lookup is one dict hit plus an
+    # offset and a context window is a slice clipped to the run. Source
+    # quirks (a book name reused for two books) just give a key two runs.
+    def __init__(self, books, run_book, run_chapter, run_start, run_end, row_run, verse):
+        self.books = books
+        self.run_book = run_book
+        self.run_chapter = run_chapter
+        self.run_start = run_start
+        self.run_end = run_end
+        self.row_run = row_run
+        self.verse = verse
+        self.book_codes = {normalize_book(b): i for i, b in reversed(list(enumerate(books)))}
+        self.runs = {}
+        for r, key in enumerate(zip(run_book.tolist(), run_chapter.tolist())):
+            self.runs.setdefault(key, []).append(r)
+
+    @classmethod
+    def build(cls, book_col, chapter_col, verse_col):
+        book_col = [str(b) for b in book_col]
+        books = list(dict.fromkeys(book_col))
+        codes = {b: i for i, b in enumerate(books)}
+        book_ids = np.array([codes[b] for b in book_col], dtype=np.int32)
+        chapters = np.asarray(chapter_col, dtype=np.int32)
+        n = len(chapters)
+        starts = np.flatnonzero(np.r_[True, (book_ids[1:] != book_ids[:-1]) | (chapters[1:] != chapters[:-1])]) \
+            if n else np.empty(0, dtype=np.int64)
+        ends = np.r_[starts[1:], n].astype(np.int64)
+        row_run = np.repeat(np.arange(len(starts), dtype=np.int32), ends - starts)
+        return cls(books, book_ids[starts], chapters[starts], starts.astype(np.int64), ends, row_run,
+                   np.asarray(verse_col, dtype=np.int32))
+
+    def __len__(self):
+        # Rows of the corpus the index was built from
+        return len(self.row_run)
+
+    def save(self, path):
+        np.savez(path, books=np.array(self.books, dtype=str), run_book=self.run_book, run_chapter=self.run_chapter,
+                 run_start=self.run_start, run_end=self.run_end, row_run=self.row_run, verse=self.verse)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as z:
+            return cls(z["books"].tolist(), z["run_book"], z["run_chapter"], z["run_start"], z["run_end"],
+                       z["row_run"], z["verse"])
+
+    def nbytes(self):
+        return sum(a.nbytes for a in (self.run_book, self.run_chapter, self.run_start, self.run_end, self.row_run,
+                                      self.verse))
+
+    def find_book(self, name, chapter=None, alias=False):
+        # Exact (case/space-insensitive) name, else a unique prefix ("Gen",
+        # "1 Cor"). For an alias like "Quran" or "Gita" the corpus is already
+        # known: a single-book corpus is that book, otherwise the chapter
+        # number names the book (surah n is book n).
+        key = normalize_book(name)
+        if key in self.book_codes:
+            return self.book_codes[key]
+        if alias:
+            if len(self.books) == 1:
+                return 0
+            return self.book_codes.get(str(chapter))
+        found = {code for b, code in self.book_codes.items() if b.startswith(key)}
+        return found.pop() if len(found) == 1 else None
+
+    def chapter_span(self, book_code, chapter):
+        # (start, end) row span of the chapter, end exclusive
+        runs = self.runs.get((book_code, chapter))
+        if not runs:
+            return None
+        return int(self.run_start[runs[0]]), int(self.run_end[runs[0]])
+
+    def lookup(self, book_code, chapter, verse):
+        for r in self.runs.get((book_code, chapter), ()):
+            start, end = int(self.run_start[r]), int(self.run_end[r])
+            # Verses are normally numbered 1..n without gaps: O(1) offset
+            row = start + verse - int(self.verse[start])
+            if start <= row < end and self.verse[row] == verse:
+                return row
+            found = np.flatnonzero(self.verse[start:end] == verse)
+            if len(found):
+                return start + int(found[0])
+        return None
+
+    def window(self, row, before, after=None):
+        # Row span [lo, hi) around row, clipped to its chapter
+        after = before if after is None else after
+        r = self.row_run[row]
+        return max(int(self.run_start[r]), row - before), min(int(self.run_end[r]), row + after + 1)
+
+    def passages(self, size, stride):
+        # Sliding verse windows inside each chapter; the last window of a
+        # chapter is pulled back so it still holds size verses
+        spans = []
+        for start, end in zip(self.run_start.tolist(), self.run_end.tolist()):
+            lo = list(range(start, max(start + 1, end - size + 1), stride))
+            if lo[-1] + size < end:
+                lo.append(end - size)
+            spans.extend((s, min(s + size, end)) for s in lo)
+        return spans
@@ -0,0 +1,73 @@
+import json, os
+import faiss
+import numpy as np
+from ethics_bot.utils.constants import *
+from ethics_bot.utils.indexing import unit_rows
+
+def knn_join(queries, targets, k, query_block=RELATED_BLOCK, target_block=RELATED_BLOCK, exclude_self=False):
+    # Exact top-k inner product of every query row against every target row,
+    # one (query block x target block) GEMM at a time. FAISS spreads each
+    # block over its OpenMP threads and ResultHeap keeps the running top-k,
+    # so memory stays at two blocks plus the heap however large the corpora.
+    # Yields (first query row, scores, ids) per query block.
+    k = min(k, len(targets) - (1 if exclude_self else 0))
+    fetch = k + 1 if exclude_self else k
+    for qlo in range(0, len(queries), query_block):
+        q = unit_rows(queries[qlo:qlo + query_block])
+        heap = faiss.ResultHeap(len(q), fetch, keep_max=True)
+        for tlo in range(0, len(targets), target_block):
+            t = unit_rows(targets[tlo:tlo + target_block])
+            D, I = faiss.knn(q, t, min(fetch, len(t)), metric=faiss.METRIC_INNER_PRODUCT)
+            heap.add_result(D, I + tlo)
+        heap.finalize()
+        D, I = heap.D, heap.I
+        if exclude_self:
+            # Drop each row's own id (or the weakest hit if it tied elsewhere)
+            own = I == np.arange(qlo, qlo + len(q))[:, None]
+            own[~own.any(axis=1), -1] = True
+            keep = ~own
+            D = D[keep].reshape(len(q), k)
+            I = I[keep].reshape(len(q), k)
+        yield qlo, D, I
+
+class RelatedGraph:
+    # Cross-corpus k-NN graph in CSR form over global ids (corpus offset +
+    # row, corpora in build order): indptr int64, ids int32, scores float16.
+    # Everything is memory-mapped, so a lookup is one indptr read and a slice.
+    def __init__(self, meta, indptr, ids, scores):
+        self.meta = meta
+        self.corpora = meta["corpora"]
+        self.offsets = dict(zip(self.corpora, meta["offsets"]))
+        self.bounds = np.array(meta["offsets"] + [meta["n"]], dtype=np.int64)
+        self.indptr = indptr
+        self.ids = ids
+        self.scores = scores
+
+    @staticmethod
+    def paths(root=RELATED_DATA, name="related"):
+        return {part: os.path.join(root, f"{name}_{part}") for part in ("meta.json", "indptr.npy", "ids.bin", "scores.bin")}
+
+    @classmethod
+    def load(cls, root=RELATED_DATA, name="related"):
+        paths = cls.paths(root, name)
+        with open(paths["meta.json"]) as f:
+            meta = json.load(f)
+        nnz = meta["nnz"]
+        ids = np.memmap(paths["ids.bin"], dtype=np.int32, mode="r", shape=(nnz,)) if nnz else np.empty(0, np.int32)
+        scores = np.memmap(paths["scores.bin"], dtype=np.float16, mode="r", shape=(nnz,)) if nnz else np.empty(0, np.float16)
+        return cls(meta, np.load(paths["indptr.npy"], mmap_mode="r"), ids, scores)
+
+    def nbytes(self):
+        return self.indptr.nbytes + self.ids.nbytes + self.scores.nbytes
+
+    def locate(self, gids):
+        # global ids -> (corpus index, row) arrays
+        gids = np.asarray(gids, dtype=np.int64)
+        c = np.searchsorted(self.bounds, gids, side="right") - 1
+        return c, gids - self.bounds[c]
+
+    def neighbours(self, book, row):
+        # -> (global ids, scores) of the stored neighbours, best first
+        gid = self.offsets[book] + int(row)
+        lo, hi = self.indptr[gid], self.indptr[gid + 1]
+        return self.ids[lo:hi], self.scores[lo:hi]
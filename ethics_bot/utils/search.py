@@ -0,0 +1,516 @@
+import os, threading, time, faiss
+from contextlib import contextmanager
+from functools import wraps
+import numpy as np
+import polars as pl
+from ethics_bot.utils.constants import *
+from ethics_bot.utils.indexing import (apply_search_params, built_at, load_spec, read_index, rerank, search_index,
+                                       selector_params)
+from ethics_bot.utils.bm25 import BM25Index, rrf_fuse
+from ethics_bot.utils.query_cache import LRUCache, freeze, normalize_query
+from ethics_bot.utils.encoder import encoder_backend, load_encoder
+from ethics_bot.utils.instrument import incr, span
+from ethics_bot.utils.log import timeit
+from ethics_bot.utils.references import REF_ALIASES, ReferenceIndex, parse_ref
+from ethics_bot.utils.related import RelatedGraph
+
+def value_bitsets(col):
+    values, inverse = np.unique(col.cast(pl.String).fill_null("").to_numpy(), return_inverse=True)
+    return {value: inverse == i for i, value in enumerate(values)}
+
+def any_of(bitsets, values, n):
+    mask = np.zeros(n, dtype=bool)
+    for value in values:
+        if str(value) in bitsets:
+            mask |= bitsets[str(value)]
+    return mask
+
+class ReadWriteLock:
+    # Searches share the loaded books; swapping a rebuilt book in is the only
+    # writer. A waiting writer holds back new readers but not nested reads
+    # of a thread already inside one, so reentry never deadlocks.
+    def __init__(self):
+        self.cond = threading.Condition()
+        self.readers = 0
+        self.writers_waiting = 0
+        self.writing = False
+        self.local = threading.local()
+
+    def reading(self):
+        return getattr(self.local, "depth", 0) > 0
+
+    @contextmanager
+    def read(self):
+        depth = getattr(self.local, "depth", 0)
+        if not depth:
+            with self.cond:
+                while self.writing or self.writers_waiting:
+                    self.cond.wait()
+                self.readers += 1
+        self.local.depth = depth + 1
+        try:
+            yield
+        finally:
+            self.local.depth = depth
+            if not depth:
+                with self.cond:
+                    self.readers -= 1
+                    if not self.readers:
+                        self.cond.notify_all()
+
+    @contextmanager
+    def write(self):
+        if self.reading():
+            raise RuntimeError("cannot replace loaded books from inside a search")
+        with self.cond:
+            self.writers_waiting += 1
+            while self.writing or self.readers:
+                self.cond.wait()
+            self.writers_waiting -= 1
+            self.writing = True
+        try:
+            yield
+        finally:
+            with self.cond:
+                self.writing = False
+                self.cond.notify_all()
+
+def reads(method):
+    # Engine state stays consistent for the whole call
+    @wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self.lock.read():
+            return method(self, *args, **kwargs)
+    return wrapper
+
+class SearchEngine:
+    # Long-lived holder for the encoder, FAISS indexes and metadata so that
+    # repeated queries only pay for encode + search, not for loading.
+    def __init__(self, logger=None, model_name=EMBED_MODEL, books=None, mmap=True, query_cache_size=QUERY_CACHE_SIZE,
+                 result_cache_size=RESULT_CACHE_SIZE, result_ttl=RESULT_CACHE_TTL, backend=None):
+        self.logger = logger
+        self.mmap = mmap
+        self.model_name = model_name
+        self.backend = encoder_backend(backend)
+        self._model = None
+        self.indexes = {}
+        self.metadata = {}
+        self.results = {}
+        self.bitsets = {}
+        self.specs = {}
+        self.embeddings = {}
+        self.lexical = {}
+        self.references = {}
+        self.graph = None
+        self.query_cache = LRUCache(query_cache_size)
+        self.result_cache = LRUCache(result_cache_size, result_ttl)
+        # Build stamp mtimes at load time; a rebuild changes them
+        self.mtimes = {}
+        self.checked = {}
+        self.lock = ReadWriteLock()
+        self.reloading = threading.Lock()
+        if books:
+            self.warmup(books)
+
+    def _log(self, msg):
+        if self.logger:
+            self.logger.info(msg)
+
+    @property
+    def model(self):
+        if self._model is None:
+            start = time.perf_counter()
+            self._model = load_encoder(self.model_name, self.backend)
+            self._log(f"Loaded {self.model_name} ({self.backend}) in {time.perf_counter() - start:.2f} sec")
+        return self._model
+
+    @reads
+    def load(self, book):
+        if book not in self.indexes:
+            self.install(book, self.read_book(book))
+        return self.indexes[book], self.metadata[book]
+
+    def read_book(self, book):
+        # Everything load() keeps for a book, read without touching the engine
+        start = time.perf_counter()
+        index_path = os.path.join(DATA_ROOT, f'{book}/{book}_index.faiss')
+        metadata_path = os.path.join(DATA_ROOT, f'{book}/{book}_metadata.parquet')
+        # Read before the files, so a build finishing meanwhile still triggers a reload
+        mtime = built_at(index_path)
+        if not os.path.exists(index_path):
+            raise FileNotFoundError(index_path)
+        spec = load_spec(index_path)
+        index = read_index(index_path, spec, self.mmap)
+        apply_search_params(index, spec)
+        metadata = pl.read_parquet(metadata_path)
+
+        # Narrow projection used for every result join
+        text_col = "clean_text" if "clean_text" in metadata.columns else "text"
+        results = metadata.select([
+            pl.col("tradition") if "tradition" in metadata.columns else pl.lit(TRADITIONS.get(book), dtype=pl.String).alias("tradition"),
+            pl.col("book"),
+            pl.col("chapter"),
+            pl.col("verse"),
+            pl.col(text_col).alias("text"),
+        ])
+        if "verse_end" in metadata.columns:
+            # Passage corpora carry the last verse of each window
+            results = results.with_columns(metadata["verse_end"])
+        # Per-value id bitsets so filters become a FAISS IDSelector, not a post-filter
+        bitsets = {
+            "tradition": value_bitsets(results["tradition"]),
+            "book": value_bitsets(results["book"]),
+            "chapter": results["chapter"].to_numpy().astype(np.int32),
+        }
+        self._log(f"Loaded {book} ({index.ntotal} vectors) in {time.perf_counter() - start:.2f} sec")
+        return {"mtime": mtime, "spec": spec, "index": index, "metadata": metadata, "results": results,
+                "bitsets": bitsets}
+
+    def install(self, book, state):
+        # The index goes in last: `book in self.indexes` means fully loaded
+        self.mtimes[book] = state["mtime"]
+        self.checked[book] = time.monotonic()
+        self.specs[book] = state["spec"]
+        self.results[book] = state["results"]
+        self.bitsets[book] = state["bitsets"]
+        self.metadata[book] = state["metadata"]
+        self.indexes[book] = state["index"]
+
+    def invalidate(self, book=None):
+        # Drop a book's loaded state (all books if None) plus both caches,
+        # whose entries may point at the old row ids.
+        with self.lock.write():
+            for book in [book] if book else list(self.indexes):
+                for state in (self.indexes, self.metadata, self.results, self.bitsets, self.specs, self.embeddings,
+                              self.lexical, self.references, self.mtimes):
+                    state.pop(book, None)
+            self.clear_derived()
+
+    def clear_derived(self):
+        # Graph rows are corpus row ids too; reloading it is just a re-mmap
+        self.graph = None
+        self.query_cache.clear()
+        self.result_cache.clear()
+
+    def reload(self, book):
+        # The rebuilt book is read first, then swapped in under the write
+        # lock: a search sees either the old book or the new one, never a
+        # half-replaced or missing one
+        state = self.read_book(book)
+        with self.lock.write():
+            for cache in (self.embeddings, self.lexical, self.references):
+                cache.pop(book, None)
+            self.install(book, state)
+            self.clear_derived()
+
+    def check_fresh(self, book, interval=1.0):
+        # At most one stat() per book per interval on the query path. Inside
+        # a search the book stays as it was; the next request reloads it.
+        if book not in self.indexes or self.lock.reading() or time.monotonic() - self.checked.get(book, 0) < interval:
+            return
+        self.checked[book] = time.monotonic()
+        mtime = built_at(os.path.join(DATA_ROOT, f'{book}/{book}_index.faiss'))
+        if mtime is None:
+            return
+        # One reload at a time; concurrent requests keep using the old book
+        if mtime != self.mtimes.get(book) and self.reloading.acquire(blocking=False):
+            try:
+                self._log(f"{book} index was rebuilt, reloading and clearing caches")
+                self.reload(book)
+            finally:
+                self.reloading.release()
+
+    def cache_stats(self):
+        return {"query_embeddings": self.query_cache.stats(), "results": self.result_cache.stats()}
+
+    def warmup(self, books=BOOK_DATA):
+        self.model
+        for book in books:
+            self.load(book)
+        return self
+
+    def encode(self, queries, batch_size=64):
+        # Repeated questions skip the transformer; only unseen normalized
+        # queries are encoded, in one batch.
+        keys = [normalize_query(q) for q in queries]
+        cached = [self.query_cache.get(key) for key in keys]
+        missing = list(dict.fromkeys(key for key, vec in zip(keys, cached) if vec is None))
+        if missing:
+            with span("encode", rows=len(missing), hot=True):
+                fresh = self.model.encode(missing, batch_size=batch_size).astype("float32")
+            faiss.normalize_L2(fresh)
+            for key, vec in zip(missing, fresh):
+                self.query_cache.put(key, vec)
+            fresh = dict(zip(missing, fresh))
+            cached = [fresh[key] if vec is None else vec for key, vec in zip(keys, cached)]
+        if not cached:
+            return np.empty((0, self.model.get_sentence_embedding_dimension()), dtype="float32")
+        return np.stack(cached)
+
+    def id_mask(self, book, traditions=None, books=None, chapters=None):
+        if traditions is None and books is None and chapters is None:
+            return None
+        bits = self.bitsets[book]
+        mask = np.ones(self.indexes[book].ntotal, dtype=bool)
+        if traditions is not None:
+            mask &= any_of(bits["tradition"], traditions, mask.shape[0])
+        if books is not None:
+            mask &= any_of(bits["book"], books, mask.shape[0])
+        if chapters is not None:
+            lo, hi = chapters
+            mask &= (bits["chapter"] >= lo) & (bits["chapter"] <= hi)
+        return mask
+
+    def id_filter(self, book, traditions=None, books=None, chapters=None):
+        mask = self.id_mask(book, traditions, books, chapters)
+        return None if mask is None else np.packbits(mask, bitorder="little")
+
+    def search_params(self, book, sel):
+        return selector_params(self.specs[book], sel)
+
+    def rerank_source(self, book):
+        if book not in self.embeddings:
+            path = os.path.join(DATA_ROOT, f'{book}/{book}_embeddings.npy')
+            self.embeddings[book] = np.load(path, mmap_mode="r")
+        return self.embeddings[book]
+
+    def bm25(self, book):
+        if book not in self.lexical:
+            path = os.path.join(DATA_ROOT, f'{book}/{book}_bm25.npz')
+            self.lexical[book] = BM25Index.load(path) if os.path.exists(path) else None
+            if self.lexical[book] is None:
+                self._log(f"No BM25 index for {book}, hybrid search falls back to dense only")
+        return self.lexical[book]
+
+    def refs(self, book):
+        if book not in self.references:
+            path = os.path.join(DATA_ROOT, f'{book}/{book}_refs.npz')
+            if os.path.exists(path):
+                self.references[book] = ReferenceIndex.load(path)
+            else:
+                # Index built before reference files existed: derive it from the
+                # metadata, reading only the three columns it needs
+                metadata = pl.read_parquet(os.path.join(DATA_ROOT, f'{book}/{book}_metadata.parquet'),
+                                           columns=["book", "chapter", "verse"])
+                self.references[book] = ReferenceIndex.build(metadata["book"].to_list(), metadata["chapter"].to_numpy(),
+                                                             metadata["verse"].to_numpy())
+        return self.references[book]
+
+    def resolve_ref(self, ref, book=None):
+        # -> (book, first row, end row) for a reference string
+        name, chapter, verse, end = parse_ref(ref)
+        alias = REF_ALIASES.get(" ".join(name.lower().split()))
+        books = [book] if book else [alias] if alias else [
+            b for b in BOOK_DATA if os.path.exists(os.path.join(DATA_ROOT, f'{b}/{b}_index.faiss'))]
+        for b in books:
+            refs = self.refs(b)
+            code = refs.find_book(name, chapter, alias=b == alias)
+            if code is None:
+                continue
+            if verse is None:
+                span = refs.chapter_span(code, chapter)
+                if span:
+                    return (b, *span)
+                continue
+            lo, hi = refs.lookup(code, chapter, verse), refs.lookup(code, chapter, end)
+            if lo is not None and hi is not None and hi >= lo:
+                return b, lo, hi + 1
+        raise KeyError(f"No verse matches {ref!r}")
+
+    @reads
+    def rows(self, book, lo, hi):
+        # Contiguous verse rows [lo, hi) as hit dicts, tagged with corpus and row id
+        self.load(book)
+        return self.results[book].slice(lo, hi - lo).with_columns(
+            pl.lit(book).alias("corpus"),
+            pl.int_range(lo, hi, dtype=pl.Int64).alias("row_id"),
+        ).to_dicts()
+
+    @reads
+    def get_verse(self, ref, book=None, window=0):
+        book, lo, hi = self.resolve_ref(ref, book)
+        refs = self.refs(book)
+        lo, hi = refs.window(lo, window)[0], refs.window(hi - 1, window)[1]
+        return self.rows(book, lo, hi)
+
+    def hit_rows(self, hit, book=None):
+        # hit: a get_verse row, a search_many row (has row_id) or a search()
+        # hit plus its book -> (book, first row, last row). Passage hits map
+        # to their source verses.
+        book = book or hit.get("corpus")
+        if book is None:
+            raise ValueError("the hit has no corpus: pass book= for search() hits")
+        if book.endswith(PASSAGE_SUFFIX):
+            book = book[:-len(PASSAGE_SUFFIX)]
+            hit = {k: v for k, v in hit.items() if k != "row_id"}
+        refs = self.refs(book)
+        if hit.get("row_id") is not None:
+            lo = hi = int(hit["row_id"])
+        else:
+            code = refs.find_book(str(hit["book"]))
+            lo = None if code is None else refs.lookup(code, int(hit["chapter"]), int(hit["verse"]))
+            hi = lo if hit.get("verse_end") is None or lo is None else refs.lookup(code, int(hit["chapter"]), int(hit["verse_end"]))
+            if lo is None or hi is None:
+                raise KeyError(f"{hit['book']} {hit['chapter']}:{hit['verse']} is not in {book}")
+        return book, lo, hi
+
+    @reads
+    def expand(self, hit, window=2, book=None):
+        book, lo, hi = self.hit_rows(hit, book)
+        refs = self.refs(book)
+        return self.rows(book, refs.window(lo, window)[0], refs.window(hi, window)[1])
+
+    def related_graph(self):
+        if self.graph is None:
+            start = time.perf_counter()
+            self.graph = RelatedGraph.load()
+            self._log(f"Loaded related graph ({self.graph.meta['nnz']} edges) in {time.perf_counter() - start:.2f} sec")
+        return self.graph
+
+    @reads
+    def related(self, hit, book=None, k=5, corpora=None):
+        # Precomputed nearest verses of a hit in the other corpora, best first
+        book, row, _ = self.hit_rows(hit, book)
+        graph = self.related_graph()
+        if book not in graph.offsets:
+            raise KeyError(f"{book} is not in the related graph (built for {', '.join(graph.corpora)})")
+        # The graph is keyed by row id, so a corpus rebuilt since is stale.
+        # The reference index holds the row count; no FAISS index is loaded.
+        for b, n in zip(graph.corpora, graph.meta["rows"]):
+            if len(self.refs(b)) != n:
+                raise RuntimeError(f"Related graph is older than the {b} index, rerun build_related")
+        ids, scores = graph.neighbours(book, row)
+        hits = []
+        for c, r, score in zip(*graph.locate(ids), scores.tolist()):
+            corpus = graph.corpora[c]
+            if corpora and corpus not in corpora:
+                continue
+            hits.extend(dict(h, score=score) for h in self.rows(corpus, int(r), int(r) + 1))
+            if len(hits) == k:
+                break
+        return hits
+
+    @reads
+    def search_vectors(self, qvecs, book, k=5, traditions=None, books=None, chapters=None, queries=None,
+                       hybrid=False, boost=0.0):
+        index, _ = self.load(book)
+        if hybrid and self.bm25(book) is not None:
+            return self.search_hybrid(queries, qvecs, book, k, traditions, books, chapters, boost)
+        spec = self.specs[book]
+        # Compact codes shortlist rerank*k candidates, exact scores pick the top k
+        fetch = k * spec["rerank"] if spec.get("rerank") else k
+        bitmap = self.id_filter(book, traditions, books, chapters)
+        params = None
+        if bitmap is not None:
+            params = self.search_params(book, faiss.IDSelectorBitmap(index.ntotal, faiss.swig_ptr(bitmap)))
+        with span("index_search", rows=len(qvecs), book=book, hot=True):
+            distances, indices = search_index(index, spec, qvecs, fetch, params)
+            if spec.get("rerank"):
+                return rerank(self.rerank_source(book), qvecs, indices, k)
+        return distances, indices
+
+    def search_hybrid(self, queries, qvecs, book, k=5, traditions=None, books=None, chapters=None, boost=0.0):
+        # Dense and BM25 each shortlist HYBRID_FETCH ids; reciprocal-rank
+        # fusion merges them, so neither score scale has to be calibrated.
+        fetch = max(k, HYBRID_FETCH)
+        _, dense = self.search_vectors(qvecs, book, fetch, traditions, books, chapters)
+        lexical = self.bm25(book)
+        _, sparse = lexical.search(queries, fetch, self.id_mask(book, traditions, books, chapters))
+        distances = np.empty((len(queries), k), dtype=np.float32)
+        indices = np.empty((len(queries), k), dtype=np.int64)
+        for qi, query in enumerate(queries):
+            boost_ids = lexical.entity_matches(query) if boost else None
+            distances[qi], indices[qi] = rrf_fuse([dense[qi], sparse[qi]], k, RRF_K, boost_ids, boost)
+        return distances, indices
+
+    @reads
+    def join_results(self, queries, book, distances, indices):
+        # One gather over all hit ids instead of a metadata.row() per hit
+        n, k = indices.shape
+        ids = indices.ravel()
+        keep = ids != -1  # FAISS returns -1 when fewer than k hits exist
+        query_ids = np.repeat(np.arange(n, dtype=np.int32), k)[keep]
+        ids = ids[keep]
+
+        with span("join", rows=len(ids), hot=True):
+            hits = pl.DataFrame({
+                "query_id": query_ids,
+                "query": pl.Series(list(queries), dtype=pl.String).gather(query_ids),
+                "rank": np.tile(np.arange(k, dtype=np.int32), n)[keep],
+                "row_id": ids,
+                "score": distances.ravel()[keep],
+            })
+            return pl.concat([hits, self.results[book].select(pl.all().gather(ids))], how="horizontal")
+
+    def search_many(self, queries, book, k=5, traditions=None, books=None, chapters=None, hybrid=False, boost=0.0):
+        # hybrid=True fuses BM25 over clean_text with the dense ranking (score
+        # is then the RRF score); boost > 0 favours NER/keyword matches.
+        queries = list(queries)
+        self.check_fresh(book)
+        incr("queries", len(queries))
+        with self.lock.read(), span("search", rows=len(queries), book=book, hybrid=hybrid, hot=True):
+            index, _ = self.load(book)
+            # Whole batch goes through one encode and one index.search
+            qvecs = self.encode(queries) if queries else np.empty((0, index.d), dtype="float32")
+            distances, indices = self.search_vectors(qvecs, book, k, traditions, books, chapters, queries, hybrid, boost)
+            return self.join_results(queries, book, distances, indices)
+
+    def hit_columns(self, book):
+        return self.results[book].columns + ["score"]
+
+    def result_key(self, query, book, k, filters):
+        return (normalize_query(query), book, k, freeze(filters))
+
+    def cached_results(self, query, book, k, filters):
+        # Pure cache lookup, safe on an event loop; callers run check_fresh
+        hits = self.result_cache.get(self.result_key(query, book, k, filters))
+        return None if hits is None else [dict(hit) for hit in hits]
+
+    def store_results(self, query, book, k, filters, hits):
+        self.result_cache.put(self.result_key(query, book, k, filters), [dict(hit) for hit in hits])
+
+    def search(self, query, book, k=5, traditions=None, books=None, chapters=None, hybrid=False, boost=0.0):
+        filters = {"traditions": traditions, "books": books, "chapters": chapters, "hybrid": hybrid, "boost": boost}
+        self.check_fresh(book)
+        hits = self.cached_results(query, book, k, filters)
+        if hits is None:
+            # Stored under the read lock, so a reload cannot clear the cache
+            # between the search and the store and leave pre-rebuild hits in it
+            with self.lock.read():
+                df = self.search_many([query], book, k, traditions, books, chapters, hybrid, boost)
+                hits = df.select(self.hit_columns(book)).to_dicts()
+                self.store_results(query, book, k, filters, hits)
+        return hits
+
+_ENGINE = None
+
+def get_engine(logger=None, **kwargs):
+    global _ENGINE
+    if _ENGINE is None:
+        _ENGINE = SearchEngine(logger, **kwargs)
+    return _ENGINE
+
+@timeit
+def search_faiss(query, book, k=5, **filters):
+    # Reuses the process-wide SearchEngine so only the first call pays for
+    # loading the model, index and metadata.
+    return get_engine().search(query, book, k, **filters)
+
+@timeit
+def search_many(queries, book, k=5, **filters):
+    # Batched variant of search_faiss: one encode, one index.search and one
+    # gather for all queries. Returns a DataFrame with a row per hit.
+    return get_engine().search_many(queries, book, k, **filters)
+
+def get_verse(ref, book=None, window=0):
+    # "John 3:16", "Quran 2:255", "Genesis 1:1-5" -> verse rows, plus
+    # `window` neighbouring verses on each side within the chapter
+    return get_engine().get_verse(ref, book, window)
+
+def expand(hit, window=2, book=None):
+    # Context around a search hit or verse: the contiguous chapter slice
+    return get_engine().expand(hit, window, book)
+
+def related(hit, book=None, k=5, corpora=None):
+    # Precomputed parallels of a verse in other corpora (build_related)
+    return get_engine().related(hit, book, k, corpora)
@@ -0,0 +1,320 @@
+import heapq, itertools, os, re, threading
+import multiprocessing as mp
+from concurrent.futures import Future, wait
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Client, Listener
+from ethics_bot.utils.constants import *
+from ethics_bot.utils.instrument import incr, span
+
+# "<book>_part<i>of<n>" books written by build_partitions
+PARTITION = re.compile(rf"^(?P<book>.+){PARTITION_INFIX}(?P<part>\d+)of(?P<parts>\d+)$")
+
+def corpus_of(book):
+    m = PARTITION.match(book)
+    return m["book"] if m else book
+
+def has_index(book):
+    return os.path.exists(os.path.join(DATA_ROOT, book, f'{book}_index.faiss'))
+
+def shard_books(books=None):
+    # Corpora to shard, each replaced by its hash partitions when a complete
+    # set exists (the largest one if several partition counts were built)
+    out = []
+    for book in books or BOOK_DATA:
+        sets = {}
+        for name in os.listdir(DATA_ROOT):
+            m = PARTITION.match(name)
+            if m and m["book"] == book and has_index(name):
+                sets.setdefault(int(m["parts"]), []).append(name)
+        complete = [n for n, names in sets.items() if len(names) == n]
+        if complete:
+            out.extend(sorted(sets[max(complete)], key=lambda b: int(PARTITION.match(b)["part"])))
+        elif has_index(book):
+            out.append(book)
+    return out
+
+def check_filters(filters):
+    # Hybrid scores are per-book RRF ranks (~1/60), not cosines, so they
+    # cannot be merged with the dense scores of other books or shards
+    if filters and filters.get("hybrid"):
+        raise ValueError("hybrid search is not supported across shards, search one book instead")
+
+def shard_plan(books, shards):
+    # Longest-processing-time assignment: biggest index first onto the least
+    # loaded shard, with the index file size standing in for search cost
+    sizes = {b: os.path.getsize(os.path.join(DATA_ROOT, b, f'{b}_index.faiss')) for b in books}
+    plan = [[] for _ in range(max(1, min(shards, len(books))))]
+    load = [0] * len(plan)
+    for book in sorted(books, key=lambda b: -sizes[b]):
+        i = load.index(min(load))
+        plan[i].append(book)
+        load[i] += sizes[book]
+    return plan
+
+class ShardServer:
+    # Search side of one shard: a SearchEngine holding only this shard's
+    # books. It never loads the encoder, queries arrive as vectors.
+    def __init__(self, books, mmap=True, threads=None, logger=None):
+        import faiss
+        from ethics_bot.utils.search import SearchEngine
+        if threads:
+            faiss.omp_set_num_threads(threads)
+        self.books = list(books)
+        self.engine = SearchEngine(logger, mmap=mmap)
+        for book in self.books:
+            self.engine.load(book)
+
+    def info(self):
+        return {book: self.engine.indexes[book].ntotal for book in self.books}
+
+    def search(self, queries, qvecs, k, corpora=None, filters=None):
+        # -> per query, this shard's top k hits over all its books, best first.
+        # Candidates from every book are merged as (score, book, row) before
+        # any metadata is touched, so only the k survivors are gathered.
+        # Partition rows are mapped back to their corpus and source row id.
+        check_filters(filters)
+        # Same freshness check as the single-process service: a long-lived
+        # shard picks up rebuilt books instead of serving its startup index
+        for book in self.books:
+            self.engine.check_fresh(book)
+        with self.engine.lock.read():
+            return self._search(queries, qvecs, k, corpora, filters)
+
+    def _search(self, queries, qvecs, k, corpora, filters):
+        candidates = [[] for _ in queries]
+        for book in self.books:
+            if corpora and corpus_of(book) not in corpora:
+                continue
+            distances, indices = self.engine.search_vectors(qvecs, book, k, queries=queries, **(filters or {}))
+            for found, scores, ids in zip(candidates, distances.tolist(), indices.tolist()):
+                found.extend((score, book, i) for score, i in zip(scores, ids) if i != -1)
+        results = []
+        for found in candidates:
+            hits = []
+            for score, book, i in heapq.nlargest(k, found):
+                metadata = self.engine.metadata[book]
+                row_id = int(metadata["source_row"][i]) if "source_row" in metadata.columns else i
+                hits.append(dict(self.engine.results[book].row(i, named=True), score=score, corpus=corpus_of(book),
+                                 row_id=row_id))
+            results.append(hits)
+        return results
+
+def serve(conn, server):
+    # Request loop for one coordinator connection:
+    # (request id, queries, vectors, k, corpora, filters) in,
+    # (request id, hits per query, error) out; None closes the connection
+    while True:
+        try:
+            msg = conn.recv()
+        except (EOFError, OSError):
+            return
+        if msg is None:
+            conn.close()
+            return
+        req_id, queries, qvecs, k, corpora, filters = msg
+        try:
+            with span("shard_search", rows=len(queries), hot=True):
+                reply = (req_id, server.search(queries, qvecs, k, corpora, filters), None)
+        except Exception as e:
+            reply = (req_id, None, f"{type(e).__name__}: {e}")
+        try:
+            conn.send(reply)
+        except OSError:
+            return
+
+def run_shard(conn, books, mmap=True, threads=None):
+    # Entry point of a local shard process
+    server = ShardServer(books, mmap, threads)
+    conn.send(("ready", server.info()))
+    serve(conn, server)
+
+def listen(server, address, authkey, logger=None):
+    # Remote shard: one serve() thread per coordinator connection. The
+    # transport pickles, so only bind it where every peer is trusted; the
+    # authkey handshake keeps out anyone without the shared key.
+    with Listener(address, authkey=authkey) as listener:
+        while True:
+            try:
+                conn = listener.accept()
+            except (AuthenticationError, OSError) as e:
+                if logger:
+                    logger.warning(f"Rejected connection: {e}")
+                continue
+            if logger:
+                logger.info(f"Coordinator connected from {listener.last_accepted}")
+            conn.send(("ready", server.info()))
+            threading.Thread(target=serve, args=(conn, server), daemon=True).start()
+
+class Shard:
+    # Coordinator-side handle: one connection, a send lock and a reader
+    # thread that resolves the futures of in-flight requests
+    def __init__(self, name, conn, process=None):
+        self.name = name
+        self.conn = conn
+        self.process = process
+        self.info = {}
+        self.pending = {}
+        self.lock = threading.Lock()
+        self.alive = True
+
+    @property
+    def corpora(self):
+        return {corpus_of(book) for book in self.info}
+
+    def handshake(self, timeout):
+        if not self.conn.poll(timeout):
+            raise TimeoutError(f"Shard {self.name} did not come up within {timeout} sec")
+        try:
+            _, self.info = self.conn.recv()
+        except (EOFError, OSError):
+            raise RuntimeError(f"Shard {self.name} exited while loading its books")
+        threading.Thread(target=self._read, name=f"shard-{self.name}", daemon=True).start()
+
+    def _read(self):
+        while True:
+            try:
+                req_id, hits, error = self.conn.recv()
+            except (EOFError, OSError):
+                break
+            fut = self.pending.pop(req_id, None)
+            if fut is None:
+                continue  # answered after the coordinator gave up on it
+            if error:
+                fut.set_exception(RuntimeError(error))
+            else:
+                fut.set_result(hits)
+        self.alive = False
+        for req_id in list(self.pending):
+            fut = self.pending.pop(req_id, None)
+            if fut is not None:
+                fut.set_exception(ConnectionError(f"shard {self.name} went away"))
+
+    def submit(self, req_id, request):
+        fut = Future()
+        if not self.alive:
+            fut.set_exception(ConnectionError(f"shard {self.name} is down"))
+            return fut
+        self.pending[req_id] = fut
+        try:
+            with self.lock:
+                self.conn.send((req_id, *request))
+        except OSError as e:
+            self.pending.pop(req_id, None)
+            fut.set_exception(ConnectionError(f"shard {self.name}: {e}"))
+        return fut
+
+    def close(self, timeout=5):
+        try:
+            with self.lock:
+                self.conn.send(None)
+        except OSError:
+            pass
+        self.conn.close()
+        if self.process is not None:
+            self.process.join(timeout)
+            if self.process.is_alive():
+                self.process.terminate()
+
+class ShardedSearch:
+    # Scatter-gather over shard workers. The query is encoded once here, the
+    # vectors go to every shard holding a requested corpus in parallel, and
+    # the per-shard top-k lists are merged with a heap. A shard that errors
+    # or misses the timeout is left out of that answer and reported, never
+    # waited for. shards: lists of books, each served by a local worker
+    # process, or "host:port" addresses of running shard_worker processes.
+    def __init__(self, shards, logger=None, timeout=SHARD_TIMEOUT, engine=None, mmap=True, threads=None,
+                 authkey=None, start_timeout=300):
+        self.logger = logger
+        self.timeout = timeout
+        self.engine = engine
+        self.ids = itertools.count()
+        self.shards = []
+        authkey = authkey or os.environ.get("ETHICS_BOT_SHARD_KEY", "").encode() or None
+        local = [spec for spec in shards if not isinstance(spec, str)]
+        # Local shards split the cores instead of each running all FAISS threads
+        threads = threads or max(1, (os.cpu_count() or 1) // max(1, len(local)))
+        ctx = mp.get_context("spawn")
+        for i, spec in enumerate(shards):
+            if isinstance(spec, str):
+                host, port = spec.rsplit(":", 1)
+                self.shards.append(Shard(spec, Client((host, int(port)), authkey=authkey)))
+            else:
+                conn, child = ctx.Pipe()
+                process = ctx.Process(target=run_shard, args=(child, list(spec), mmap, threads), daemon=True)
+                process.start()
+                child.close()
+                self.shards.append(Shard(f"local{i}", conn, process))
+        # Shards load their indexes in parallel; wait for all of them here
+        try:
+            for shard in self.shards:
+                shard.handshake(start_timeout)
+                self._log(f"Shard {shard.name}: {', '.join(f'{b} ({n})' for b, n in shard.info.items())}")
+        except Exception:
+            self.close()
+            raise
+
+    @classmethod
+    def local(cls, n, books=None, logger=None, **kwargs):
+        # n local worker processes over shard_books(books)
+        return cls(shard_plan(shard_books(books), n), logger, **kwargs)
+
+    def _log(self, msg):
+        if self.logger:
+            self.logger.info(msg)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        for shard in self.shards:
+            shard.close()
+
+    @property
+    def encoder(self):
+        if self.engine is None:
+            from ethics_bot.utils.search import get_engine
+            self.engine = get_engine(self.logger)
+        return self.engine
+
+    def stats(self):
+        return {shard.name: {"alive": shard.alive, "books": shard.info, "in_flight": len(shard.pending)}
+                for shard in self.shards}
+
+    def search_vectors(self, queries, qvecs, k=5, corpora=None, **filters):
+        # -> (per query merged hits, names of the shards left out)
+        check_filters(filters)
+        req_id = next(self.ids)
+        queries = list(queries)
+        targets = [s for s in self.shards if not corpora or s.corpora & set(corpora)]
+        with span("scatter_gather", rows=len(queries), shards=len(targets), hot=True):
+            futures = [(s, s.submit(req_id, (queries, qvecs, k, corpora, filters))) for s in targets]
+            done, _ = wait([fut for _, fut in futures], timeout=self.timeout)
+        lists, missing = [], []
+        for shard, fut in futures:
+            if fut in done and fut.exception() is None:
+                lists.append(fut.result())
+                continue
+            shard.pending.pop(req_id, None)
+            incr("shard_timeouts" if fut not in done else "shard_errors")
+            missing.append(shard.name)
+            reason = f"no answer within {self.timeout} sec" if fut not in done else fut.exception()
+            self._log(f"Shard {shard.name} left out of request {req_id}: {reason}")
+        with span("merge", rows=len(queries), hot=True):
+            # Every shard list is sorted best first, so a k-way heap merge
+            # stops after k pops per query
+            merged = [list(itertools.islice(heapq.merge(*(hits[qi] for hits in lists), key=lambda h: -h["score"]), k))
+                      for qi in range(len(queries))]
+        return merged, missing
+
+    def search_many(self, queries, k=5, corpora=None, **filters):
+        check_filters(filters)  # before paying for the encode
+        queries = list(queries)
+        incr("queries", len(queries))
+        return self.search_vectors(queries, self.encoder.encode(queries), k, corpora, **filters)
+
+    def search(self, query, k=5, corpora=None, **filters):
+        results, missing = self.search_many([query], k, corpora, **filters)
+        return results[0], missing
@@ -0,0 +1,41 @@
+import hashlib, json, threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import unquote, urlparse
+import pytest
+
+@pytest.fixture
+def standin():
+    # Local stand-in for the Sefaria texts API: synthetic chapters with an
+    # ETag, 304 on a matching If-None-Match. Yields the url template (two {}
+    # slots) and the server's hit counts by status.
+    hits = {"200": 0, "304": 0}
+    lock = threading.Lock()
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            ref = unquote(urlparse(self.path).path.rsplit("/", 1)[-1])
+            body = json.dumps({"ref": ref, "text": [f"{ref}:{v} <i>verse</i> text" for v in range(1, 26)]}).encode()
+            etag = '"' + hashlib.md5(body).hexdigest() + '"'
+            status = "304" if self.headers.get("If-None-Match") == etag else "200"
+            # One handler thread per request
+            with lock:
+                hits[status] += 1
+            self.send_response(int(status))
+            self.send_header("ETag", etag)
+            if status == "304":
+                self.end_headers()
+                return
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_address[1]}/api/texts/{{}}.{{}}?context=0&commentary=0&lang=en", hits
+    server.shutdown()
+    server.server_close()
@@ -0,0 +1,40 @@
+import os
+import numpy as np
+import polars as pl
+import pytest
+from ethics_bot.utils.constants import *
+from ethics_bot.scripts.benchmark_encoder import MIN_COSINE
+from ethics_bot.scripts.benchmark_search import QUERIES
+
+# ONNX and int8 ONNX encoders must reproduce the torch embeddings within
+# MIN_COSINE per text. Needs the model in the local Hugging Face cache and
+# ONNX Runtime installed; skipped otherwise, never downloads.
+
+pytest.importorskip("onnxruntime")
+pytest.importorskip("sentence_transformers")
+
+def model_cached():
+    from huggingface_hub import try_to_load_from_cache
+    return isinstance(try_to_load_from_cache(f"sentence-transformers/{EMBED_MODEL}", "config.json"), str)
+
+pytestmark = pytest.mark.skipif(not model_cached(), reason=f"{EMBED_MODEL} is not in the Hugging Face cache")
+
+@pytest.fixture(scope="module")
+def texts():
+    path = os.path.join(GITA_DATA, "gita_english_metadata.parquet")
+    verses = pl.read_parquet(path, columns=["clean_text"])["clean_text"].fill_null("").to_list()[:200]
+    return QUERIES + verses
+
+@pytest.fixture(scope="module")
+def reference(texts):
+    from ethics_bot.utils.encoder import load_encoder
+    os.environ.setdefault("HF_HUB_OFFLINE", "1")
+    return load_encoder(backend="torch").encode(texts, batch_size=64, normalize_embeddings=True)
+
+@pytest.mark.parametrize("backend", ["onnx", "onnx-int8"])
+def test_onnx_matches_torch(backend, texts, reference):
+    from ethics_bot.utils.encoder import load_encoder
+    embeddings = load_encoder(backend=backend).encode(texts, batch_size=64, normalize_embeddings=True)
+    assert embeddings.shape == reference.shape
+    cosine = np.sum(reference * embeddings, axis=1)
+    assert cosine.min() >= MIN_COSINE[backend], f"{backend}: min cosine {cosine.min():.4f} vs torch"
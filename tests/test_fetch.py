@@ -0,0 +1,57 @@
+import json
+import pytest
+from ethics_bot.utils.fetch import Fetcher, OfflineError
+
+def test_cold_then_revalidated(standin, tmp_path):
+    url, hits = standin
+    fetcher = Fetcher(cache_dir=tmp_path, offline=False)
+    first = fetcher.get_json(url.format("Genesis", 1))
+    assert first["ref"] == "Genesis.1"
+    assert fetcher.stats["fetched"] == 1 and hits == {"200": 1, "304": 0}
+
+    # The cached ETag goes out as If-None-Match and the 304 serves the cached body
+    again = Fetcher(cache_dir=tmp_path, offline=False).get_json(url.format("Genesis", 1))
+    assert again == first
+    assert hits == {"200": 1, "304": 1}
+
+def test_not_modified_counted(standin, tmp_path):
+    url, hits = standin
+    fetcher = Fetcher(cache_dir=tmp_path, offline=False)
+    fetcher.get(url.format("Exodus", 2))
+    fetcher.get(url.format("Exodus", 2))
+    assert fetcher.stats == {"fetched": 1, "not_modified": 1, "offline": 0, "stale": 0}
+
+def test_offline_serves_cache_without_network(standin, tmp_path):
+    url, hits = standin
+    body = Fetcher(cache_dir=tmp_path, offline=False).get(url.format("Ruth", 1))
+    offline = Fetcher(cache_dir=tmp_path, offline=True)
+    assert offline.get(url.format("Ruth", 1)) == body
+    assert offline.stats["offline"] == 1
+    assert hits == {"200": 1, "304": 0}
+
+def test_offline_prefers_mirror(standin, tmp_path):
+    url, hits = standin
+    mirrored = tmp_path / "raw.json"
+    mirrored.write_text(json.dumps({"ref": "mirror"}))
+    fetcher = Fetcher(cache_dir=tmp_path / "cache", offline=True, mirror={url.format("Job", 1): mirrored})
+    assert fetcher.get_json(url.format("Job", 1)) == {"ref": "mirror"}
+    assert sum(hits.values()) == 0
+
+def test_offline_without_copy_raises(standin, tmp_path):
+    url, hits = standin
+    fetcher = Fetcher(cache_dir=tmp_path, offline=True, mirror={})
+    with pytest.raises(OfflineError):
+        fetcher.get(url.format("Esther", 1))
+    assert sum(hits.values()) == 0
+
+def test_get_many_keeps_order_and_counts(standin, tmp_path):
+    url, hits = standin
+    urls = [url.format("Psalms", ch) for ch in range(1, 151)]
+    fetcher = Fetcher(cache_dir=tmp_path, offline=False, max_workers=16)
+    refs = fetcher.get_many(urls, parse=lambda body: json.loads(body)["ref"])
+    assert refs == [f"Psalms.{ch}" for ch in range(1, 151)]
+    assert fetcher.stats["fetched"] == 150 and hits["200"] == 150
+
+    # Second pass from the same fetcher: all revalidated, counters stay exact
+    assert fetcher.get_many(urls, parse=lambda body: json.loads(body)["ref"]) == refs
+    assert fetcher.stats["not_modified"] == 150 and hits["304"] == 150
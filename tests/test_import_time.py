@@ -0,0 +1,13 @@
+import logging, os
+import pytest
+from ethics_bot.scripts.check_import_time import BUDGETS, check
+
+# Every entry point within its cold-import budget and free of the heavy
+# packages it must not load. ETHICS_BOT_IMPORT_SCALE loosens the budgets
+# on slow machines, as --scale does for the script.
+
+@pytest.mark.parametrize("module", list(BUDGETS))
+def test_import_budget(module):
+    scale = float(os.environ.get("ETHICS_BOT_IMPORT_SCALE", "1.0"))
+    assert check(logging.getLogger("check_import_time"), module, *BUDGETS[module], scale=scale), \
+        f"{module} is over its import budget or imports a forbidden package (see the log)"